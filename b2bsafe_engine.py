@@ -0,0 +1,3838 @@
+"""
+B2BSAFE - motor de processamento (sem interface).
+
+Toda a lógica das automações fica aqui: leitura/escrita de planilhas,
+normalização de telefones/CNPJ, índices de blocklist e os pipelines
+(limpeza, limpeza WhatsApp, manipulação, robô C6). O script.py (Tkinter) é
+só um chamador destas funções; o mesmo vale para a linha de comando:
+
+    python b2bsafe_engine.py --help
+"""
+
+import os
+import sys
+import re
+import math
+import platform
+import subprocess
+import json
+import time
+import shutil
+import hashlib
+import io
+import csv
+import codecs
+import threading
+import tempfile
+import sqlite3
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from typing import List, Tuple, Optional, Dict
+
+from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.styles import Font
+
+
+# -------------------- CONSTANTES LIMPEZA --------------------
+PHONE_MIN_LEN = 8
+
+# (NOVO) Motivos de exclusão como bits (uma coluna uint8 por linha; vários motivos = OR).
+# O texto só é montado na hora de gravar o arquivo de excluídas.
+MOTIVO_TEL_INVALIDO = 1
+MOTIVO_DUPLICADO = 2
+MOTIVO_CNPJ_INVALIDO = 4
+MOTIVO_BLOCKLIST = 8
+MOTIVO_HISTORICO = 16
+MOTIVO_LABELS: Dict[int, str] = {
+    MOTIVO_TEL_INVALIDO: "Telefone inválido",
+    MOTIVO_CNPJ_INVALIDO: "CNPJ inválido",
+    MOTIVO_DUPLICADO: "Telefone duplicado",
+    MOTIVO_BLOCKLIST: "Blocklist/Não Perturbe",
+    MOTIVO_HISTORICO: "Já entregue (histórico)",
+}
+MOTIVO_SEM = "(sem motivo)"
+
+# (NOVO) DDD por Estado (map invertido para lookup rápido)
+DDD_ESTADOS: Dict[str, List[str]] = {
+    "AC": ["68"],
+    "AL": ["82"],
+    "AP": ["96"],
+    "AM": ["92", "97"],
+    "BA": ["71", "73", "74", "75", "77"],
+    "CE": ["85", "88"],
+    "DF": ["61"],
+    "ES": ["27", "28"],
+    "GO": ["62", "64"],
+    "MA": ["98", "99"],
+    "MT": ["65", "66"],
+    "MS": ["67"],
+    "MG": ["31", "32", "33", "34", "35", "37", "38"],
+    "PA": ["91", "93", "94"],
+    "PB": ["83"],
+    "PR": ["41", "42", "43", "44", "45", "46"],
+    "PE": ["81", "87"],
+    "PI": ["86", "89"],
+    "RJ": ["21", "22", "24"],
+    "RN": ["84"],
+    "RS": ["51", "53", "54", "55"],
+    "RO": ["69"],
+    "RR": ["95"],
+    "SC": ["47", "48", "49"],
+    "SP": ["11", "12", "13", "14", "15", "16", "17", "18", "19"],
+    "SE": ["79"],
+    "TO": ["63"],
+}
+DDD_TO_UF: Dict[str, str] = {}
+for uf, ddds in DDD_ESTADOS.items():
+    for ddd in ddds:
+        DDD_TO_UF[ddd] = uf
+
+# (NOVO) Mesma tabela como array de 100 posições (DDD inteiro -> código da UF),
+# para o lookup vetorizado. Código 0 = "??" (DDD desconhecido).
+UF_CODES: List[str] = ["??"] + sorted(DDD_ESTADOS)
+DDD_UF_CODE = np.zeros(100, dtype=np.int8)
+for ddd, uf in DDD_TO_UF.items():
+    DDD_UF_CODE[int(ddd)] = UF_CODES.index(uf)
+
+
+# =======================================================================
+#           FUNÇÕES COMPARTILHADAS / UTILITÁRIOS (LÓGICA)
+# =======================================================================
+
+def normalize_col_name(name: str) -> str:
+    return re.sub(r"[^0-9a-zA-Z]+", "", str(name)).strip().lower()
+
+# ---------------- (NOVO) cache colunar das planilhas lidas ----------------
+# Cada arquivo lido pelo read_table é guardado em Parquet (chave: caminho +
+# tamanho + mtime). Reabrir o mesmo arquivo (escanear colunas, reexecutar com
+# outra opção) passa a ler o Parquet em vez de reprocessar CSV/XLSX.
+# O diretório é limitado por tamanho; os arquivos menos usados saem primeiro (LRU).
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".b2bsafe", "cache")
+CACHE_MAX_BYTES = 4 * 1024 ** 3
+CACHE_ENABLED = True
+
+def cache_enabled() -> bool:
+    return CACHE_ENABLED and pq is not None
+
+def _cache_file(path: str) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return os.path.join(CACHE_DIR, hashlib.sha1(raw.encode("utf-8")).hexdigest() + ".parquet")
+
+def cache_lookup(path: str) -> Optional[str]:
+    """Retorna o Parquet do arquivo se estiver no cache (e marca como usado)."""
+    if not cache_enabled():
+        return None
+    target = _cache_file(path)
+    if not target or not os.path.isfile(target):
+        return None
+    try:
+        os.utime(target, None)
+    except OSError:
+        pass
+    return target
+
+def cache_evict(max_bytes: int = None, *, directory: str = None, suffix: str = ".parquet"):
+    """Remove os arquivos menos usados até o cache caber em max_bytes."""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    directory = CACHE_DIR if directory is None else directory
+    try:
+        entries = []
+        for f in os.listdir(directory):
+            if not f.endswith(suffix):
+                continue
+            full = os.path.join(directory, f)
+            st = os.stat(full)
+            entries.append((st.st_mtime, st.st_size, full))
+    except OSError:
+        return
+    total = sum(e[1] for e in entries)
+    for _, size, full in sorted(entries):
+        if total <= max_bytes:
+            break
+        safe_remove_file(full)
+        total -= size
+
+def cache_clear():
+    cache_evict(0)
+
+class _ParquetCacheWriter:
+    """Grava os blocos lidos num Parquet temporário; só publica se a leitura terminar."""
+
+    def __init__(self, path: str):
+        self.target = _cache_file(path)
+        self.tmp = f"{self.target}.{os.getpid()}.{threading.get_ident()}.tmp" if self.target else None
+        self.writer = None
+        self.schema = None
+        self.failed = self.target is None
+
+    def write(self, chunk: pd.DataFrame):
+        if self.failed:
+            return
+        try:
+            if self.writer is None:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                self.schema = pa.schema([(str(c), pa.string()) for c in chunk.columns])
+                self.writer = pq.ParquetWriter(self.tmp, self.schema)
+            self.writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+        except Exception:
+            self.failed = True
+
+    def finish(self, completed: bool):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                self.failed = True
+        if self.tmp and os.path.isfile(self.tmp):
+            if completed and not self.failed:
+                os.replace(self.tmp, self.target)
+                cache_evict()
+            else:
+                safe_remove_file(self.tmp)
+
+def cache_store(df: pd.DataFrame, path: str):
+    if not cache_enabled() or len(df.columns) == 0:
+        return
+    w = _ParquetCacheWriter(path)
+    w.write(df)
+    w.finish(True)
+
+# ---------------- (NOVO) detecção de dialeto CSV/TXT ----------------
+# Detecta separador, encoding, aspas e cabeçalho uma vez por arquivo (amostra
+# pequena) e lê com o parser C do pandas, bem mais rápido que o engine='python'
+# com sep=None. O resultado fica guardado por arquivo (caminho+tamanho+mtime)
+# para todas as abas usarem o mesmo dialeto.
+
+SNIFF_SAMPLE_BYTES = 64 * 1024
+CSV_DELIMITERS = ";,\t|"
+CSV_ENCODINGS = ["utf-8", "cp1252", "latin-1"]
+_csv_dialects: Dict[str, dict] = {}
+
+def _sniff_encoding(raw: bytes) -> str:
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for enc in CSV_ENCODINGS:
+        try:
+            raw.decode(enc)
+            return enc
+        except UnicodeDecodeError as e:
+            # amostra pode cortar um caractere multibyte no final
+            if enc == "utf-8" and e.start >= len(raw) - 3:
+                return enc
+    return "latin-1"
+
+def _looks_like_data_row(fields: List[str]) -> bool:
+    values = [f.strip() for f in fields if f and f.strip()]
+    return bool(values) and all(re.fullmatch(r"[\d\s\-\+\(\)\./]+", v) for v in values)
+
+def sniff_csv_dialect(path: str) -> dict:
+    """
+    Retorna {"sep", "encoding", "quotechar", "header", "names"}
+    prontos para o pd.read_csv. Arquivos sem cabeçalho (ex.: lista só de
+    telefones) recebem nomes "Coluna1", "Coluna2"...
+    """
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    if key in _csv_dialects:
+        return _csv_dialects[key]
+
+    with open(path, "rb") as fh:
+        raw = fh.read(SNIFF_SAMPLE_BYTES)
+    encoding = _sniff_encoding(raw)
+    text = raw.decode(encoding, errors="ignore")
+    lines = text.splitlines()
+    if len(raw) == SNIFF_SAMPLE_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # última linha da amostra pode estar incompleta
+    lines = [ln for ln in lines if ln.strip()][:200]
+    sample = "\n".join(lines)
+
+    # doublequote do Sniffer não é confiável (vira False sem evidência); fica o padrão CSV ("" dentro de aspas)
+    sep, quotechar = None, '"'
+    try:
+        d = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        sep, quotechar = d.delimiter, d.quotechar or '"'
+    except csv.Error:
+        first = lines[0] if lines else ""
+        counts = {c: first.count(c) for c in CSV_DELIMITERS}
+        best = max(counts, key=counts.get)
+        sep = best if counts[best] else ","
+
+    first_row = next(csv.reader([lines[0]], delimiter=sep, quotechar=quotechar), []) if lines else []
+    has_header = not _looks_like_data_row(first_row)
+
+    dialect = {
+        "sep": sep,
+        "encoding": encoding,
+        "quotechar": quotechar,
+        "header": 0 if has_header else None,
+        "names": None if has_header else [f"Coluna{i + 1}" for i in range(max(len(first_row), 1))],
+    }
+    _csv_dialects[key] = dialect
+    return dialect
+
+def read_csv_sniffed(path_or_buf, dialect: dict, **kwargs):
+    """pd.read_csv com o dialeto detectado, parser C e tudo como texto."""
+    return pd.read_csv(
+        path_or_buf,
+        dtype=str,
+        engine="c",
+        sep=dialect["sep"],
+        encoding=dialect["encoding"],
+        encoding_errors="replace",
+        quotechar=dialect["quotechar"],
+        header=dialect["header"],
+        names=dialect["names"],
+        **kwargs
+    )
+
+def _read_table_source(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ['.xls', '.xlsx']:
+        return pd.read_excel(path, dtype=str)
+    elif ext in ['.csv', '.txt']:
+        return read_csv_sniffed(path, sniff_csv_dialect(path))
+    else:
+        raise ValueError('Formato não suportado: ' + ext)
+
+def read_table(path: str, *, use_cache: bool = True) -> pd.DataFrame:
+    if use_cache:
+        cached = cache_lookup(path)
+        if cached:
+            try:
+                return pd.read_parquet(cached)
+            except Exception:
+                safe_remove_file(cached)
+    df = _read_table_source(path)
+    if use_cache:
+        cache_store(df, path)
+    return df
+
+# ---------------- (NOVO) leitura em blocos (streaming) ----------------
+
+READ_CHUNK_ROWS = 50000
+
+def _mangle_header(values) -> List[str]:
+    """
+    Gera nomes de colunas como o pandas faria: vazios viram "Unnamed: i"
+    e repetidos recebem sufixo ".1", ".2"...
+    """
+    cols = []
+    seen: Dict[str, int] = {}
+    for i, v in enumerate(values):
+        name = f"Unnamed: {i}" if v is None or str(v).strip() == "" else str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        cols.append(name)
+    return cols
+
+def _xlsx_cell_to_str(v):
+    if v is None:
+        return None
+    # mesmo critério do pandas: float inteiro sai sem ".0"
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v)
+
+def _iter_xlsx_chunks(path: str, chunk_rows: int, usecols, progress):
+    total_bytes = os.path.getsize(path)
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        max_row = ws.max_row or 0
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        cols = _mangle_header(header)
+        ncols = len(cols)
+        if usecols is not None:
+            missing = [c for c in usecols if c not in cols]
+            if missing:
+                raise ValueError(f"Colunas não encontradas: {missing}")
+            keep = [cols.index(c) for c in dict.fromkeys(usecols)]
+        else:
+            keep = list(range(ncols))
+        out_cols = [cols[i] for i in keep]
+
+        buf = []
+        offset = 0
+        lidas = 1
+        for row in rows:
+            lidas += 1
+            # linhas totalmente vazias (comuns no fim da planilha) são ignoradas
+            if row is None or all(v is None for v in row):
+                continue
+            row = tuple(row[:ncols]) + (None,) * (ncols - len(row))
+            buf.append([_xlsx_cell_to_str(row[i]) for i in keep])
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=out_cols, index=pd.RangeIndex(offset, offset + len(buf)))
+                offset += len(buf)
+                buf = []
+                if progress and max_row:
+                    # XLSX é compactado: estimamos os bytes pela fração de linhas lidas
+                    progress(min(total_bytes, int(total_bytes * lidas / max_row)), total_bytes)
+        if buf or offset == 0:
+            # planilha só com cabeçalho ainda devolve 1 bloco vazio (com as colunas)
+            yield pd.DataFrame(buf, columns=out_cols, index=pd.RangeIndex(offset, offset + len(buf)))
+        if progress:
+            progress(total_bytes, total_bytes)
+    finally:
+        wb.close()
+
+def _iter_source_chunks(path: str, chunk_rows: int, usecols, progress):
+    ext = os.path.splitext(path)[1].lower()
+    total_bytes = os.path.getsize(path)
+    if ext == '.xlsx':
+        yield from _iter_xlsx_chunks(path, chunk_rows, usecols, progress)
+    elif ext == '.xls':
+        df = pd.read_excel(path, dtype=str, usecols=usecols)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        if progress:
+            progress(total_bytes, total_bytes)
+    elif ext in ['.csv', '.txt']:
+        dialect = sniff_csv_dialect(path)
+        with open(path, 'rb') as fh:
+            reader = read_csv_sniffed(fh, dialect, usecols=usecols, chunksize=chunk_rows)
+            for chunk in reader:
+                if progress:
+                    progress(min(fh.tell(), total_bytes), total_bytes)
+                yield chunk
+    else:
+        raise ValueError('Formato não suportado: ' + ext)
+
+def _iter_parquet_chunks(pf, chunk_rows: int, usecols, progress, total_bytes: int):
+    total_rows = max(pf.metadata.num_rows, 1)
+    offset = 0
+    for batch in pf.iter_batches(batch_size=chunk_rows, columns=usecols):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        if progress:
+            progress(int(total_bytes * offset / total_rows), total_bytes)
+        yield chunk
+
+def read_table_chunks(path: str, *, chunk_rows: int = READ_CHUNK_ROWS, usecols: Optional[List[str]] = None, progress=None, use_cache: bool = True):
+    """
+    Versão em streaming do read_table: devolve DataFrames (dtype=str) de até
+    chunk_rows linhas, sem materializar o arquivo inteiro.
+
+    - CSV/TXT: pandas em modo chunksize.
+    - XLSX: openpyxl em modo read-only (linha a linha).
+    - XLS: formato antigo não permite streaming; lê tudo e fatia.
+
+    usecols limita as colunas lidas (economiza memória nos pipelines que só usam
+    algumas colunas). progress(bytes_lidos, bytes_totais) é chamado a cada bloco.
+    O índice continua de um bloco para o outro (0..n-1), como no read_table.
+
+    Com cache ativo, um arquivo já visto é lido do Parquet; na primeira leitura
+    os blocos completos são gravados no cache enquanto passam.
+    """
+    if usecols is not None:
+        usecols = list(dict.fromkeys(usecols))
+    total_bytes = os.path.getsize(path)
+
+    cached = cache_lookup(path) if use_cache else None
+    if cached:
+        try:
+            pf = pq.ParquetFile(cached)
+        except Exception:
+            safe_remove_file(cached)
+            pf = None
+        if pf is not None:
+            missing = [c for c in (usecols or []) if c not in pf.schema_arrow.names]
+            if missing:
+                raise ValueError(f"Colunas não encontradas: {missing}")
+            yield from _iter_parquet_chunks(pf, chunk_rows, usecols, progress, total_bytes)
+            return
+
+    writer = _ParquetCacheWriter(path) if use_cache and cache_enabled() else None
+    completed = False
+    try:
+        # com cache, lê todas as colunas (o Parquet guarda o arquivo inteiro) e projeta aqui
+        for chunk in _iter_source_chunks(path, chunk_rows, None if writer else usecols, progress):
+            if writer is not None:
+                writer.write(chunk)
+                if usecols is not None:
+                    missing = [c for c in usecols if c not in chunk.columns]
+                    if missing:
+                        raise ValueError(f"Colunas não encontradas: {missing}")
+                    chunk = chunk[usecols]
+            yield chunk
+        completed = True
+    finally:
+        if writer is not None:
+            writer.finish(completed)
+
+def read_table_columns(path: str, usecols: List[str], *, progress=None) -> pd.DataFrame:
+    """Lê só as colunas pedidas (em blocos) e devolve um DataFrame único."""
+    usecols = list(dict.fromkeys(usecols))
+    if not usecols:
+        return pd.DataFrame()
+    chunks = list(read_table_chunks(path, usecols=usecols, progress=progress))
+    if not chunks:
+        return pd.DataFrame(columns=usecols, dtype=str)
+    return pd.concat(chunks, ignore_index=True)
+
+# ---------------- (NOVO) prévia: cabeçalho + primeiras linhas ----------------
+
+PREVIEW_ROWS = 50
+
+def read_table_header(path: str, nrows: int = PREVIEW_ROWS) -> pd.DataFrame:
+    """
+    Lê apenas o cabeçalho e as primeiras nrows linhas (dtype=str).
+    Usado para escanear colunas/sugerir mapeamento sem abrir a base inteira.
+    """
+    nrows = max(int(nrows), 1)
+    cached = cache_lookup(path)
+    if cached:
+        try:
+            pf = pq.ParquetFile(cached)
+            batch = next(pf.iter_batches(batch_size=nrows), None)
+            if batch is not None:
+                return batch.to_pandas()
+            return pf.schema_arrow.empty_table().to_pandas()
+        except Exception:
+            safe_remove_file(cached)
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.xlsx':
+        it = _iter_xlsx_chunks(path, nrows, None, None)
+        try:
+            return next(it, pd.DataFrame())
+        finally:
+            it.close()
+    elif ext == '.xls':
+        return pd.read_excel(path, dtype=str, nrows=nrows)
+    elif ext in ['.csv', '.txt']:
+        return read_csv_sniffed(path, sniff_csv_dialect(path), nrows=nrows)
+    else:
+        raise ValueError('Formato não suportado: ' + ext)
+
+def suggest_col(cols: List[str], keys: List[str], contains: Optional[List[str]] = None) -> str:
+    """
+    Sugere a coluna para um campo: primeiro nome exato (normalizado),
+    depois a primeira coluna que contenha alguma das chaves de `contains`
+    (por padrão, as próprias keys).
+    """
+    normals = {normalize_col_name(c): c for c in cols}
+    for k in keys:
+        kk = normalize_col_name(k)
+        if kk in normals:
+            return normals[kk]
+    parts = [normalize_col_name(k) for k in (contains if contains is not None else keys)]
+    for c in cols:
+        cn = normalize_col_name(c)
+        if any(k in cn for k in parts):
+            return c
+    return ""
+
+# ---------------- (NOVO) escrita XLSX em streaming ----------------
+
+EXCEL_MAX_COL_WIDTH = 60
+EXCEL_WIDTH_SAMPLE_ROWS = 1000
+EXCEL_WRITE_CHUNK_ROWS = 20000
+
+class StreamingExcelWriter:
+    """
+    Escreve XLSX em modo write-only do openpyxl: cada linha vai direto para o
+    arquivo, então a memória fica constante independente do total de linhas.
+
+    Mesmo layout do save_to_excel antigo (aba "Dados", cabeçalho em negrito,
+    largura limitada a 60), mas a largura das colunas é estimada pelas primeiras
+    EXCEL_WIDTH_SAMPLE_ROWS linhas em vez de varrer a planilha inteira.
+
+    Uso:
+        with StreamingExcelWriter(path) as w:
+            for chunk in chunks:
+                w.write(chunk)
+    """
+
+    def __init__(self, path: str, sheet_title: str = 'Dados'):
+        self.path = path
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(title=sheet_title)
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+
+    def _start(self, df: pd.DataFrame):
+        self.columns = [str(c) for c in df.columns]
+        sample = df.head(EXCEL_WIDTH_SAMPLE_ROWS)
+        for i, col in enumerate(self.columns, start=1):
+            max_len = len(col)
+            if len(sample):
+                values = sample.iloc[:, i - 1]
+                lens = values.astype(object).where(values.notna(), '').astype(str).str.len()
+                max_len = max(max_len, int(lens.max()))
+            self.ws.column_dimensions[get_column_letter(i)].width = min(max_len + 2, EXCEL_MAX_COL_WIDTH)
+
+        header = []
+        for col in self.columns:
+            cell = WriteOnlyCell(self.ws, value=col)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        self.ws.append(header)
+
+    def write(self, df: pd.DataFrame):
+        if self.columns is None:
+            self._start(df)
+        elif [str(c) for c in df.columns] != self.columns:
+            df = df.reindex(columns=self.columns)
+        for start in range(0, len(df), EXCEL_WRITE_CHUNK_ROWS):
+            block = df.iloc[start:start + EXCEL_WRITE_CHUNK_ROWS].astype(object)
+            block = block.where(block.notna(), None)
+            for row in block.itertuples(index=False, name=None):
+                self.ws.append(row)
+            self.rows += len(block)
+
+    def close(self):
+        self.wb.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.wb.close()
+        return False
+
+def save_to_excel(df: pd.DataFrame, path: str):
+    with StreamingExcelWriter(path) as w:
+        w.write(df)
+
+# Regra de "só dígitos" compartilhada pelo escalar e pela versão em coluna:
+# - None/NaN/NA viram "" (0 continua "0");
+# - dígitos Unicode (árabe-índicos, largura total...) viram ASCII. O re do Python
+#   trata esses caracteres como dígito, o RE2 do Arrow não; convertendo antes,
+#   os dois caminhos dão o mesmo resultado.
+_UNICODE_DIGITS: Optional[Dict[int, str]] = None
+
+def _unicode_digit_table() -> Dict[int, str]:
+    """Tabela do str.translate: dígito Unicode não ASCII -> "0".."9" (montada no 1º uso)."""
+    global _UNICODE_DIGITS
+    if _UNICODE_DIGITS is None:
+        _UNICODE_DIGITS = {c: str(int(chr(c))) for c in range(0x80, sys.maxunicode + 1) if chr(c).isdecimal()}
+    return _UNICODE_DIGITS
+
+def _scalar_text(value) -> str:
+    """Texto do valor; None/NaN/NA viram "" (mesma regra do _as_text)."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    return str(value)
+
+def _digits(value) -> str:
+    """Só os dígitos do valor, em ASCII."""
+    digits = re.sub(r'\D', '', _scalar_text(value))
+    return digits if digits.isascii() else digits.translate(_unicode_digit_table())
+
+def normalize_cnpj(c):
+    digits = _digits(c)
+    if len(digits) > 14:
+        digits = digits[-14:]
+    return digits.zfill(14) if digits else None
+
+PHONE_SPLIT_PATTERN = r'[;,/\|\s]+'
+
+def split_telefones_field(field: str) -> Tuple[Optional[str], Optional[str]]:
+    if pd.isna(field):
+        return (None, None)
+    phones = [d for d in map(_digits, re.split(PHONE_SPLIT_PATTERN, str(field))) if d]
+    return (phones + [None, None])[:2]
+
+def normalize_phone(num: str, *, strip55: bool = False, add9: bool = False, add55: bool = False) -> str:
+    """
+    Normaliza telefone para somente dígitos e aplica regras opcionais:
+
+    - strip55=True: se começar com '55' (código país), remove.
+    - add9=True: se tiver 10 dígitos (DD + 8), insere '9' após o DDD -> 11 dígitos.
+      (Ex.: 1999659233 -> 19999659233)
+    - add55=True: se NÃO começar com '55', adiciona '55' no início.
+    """
+    digits = _digits(num)
+
+    if strip55 and digits.startswith('55') and len(digits) >= 12:
+        digits = digits[2:]
+
+    # adiciona 9 após DDD quando formato for DD + 8
+    if add9 and len(digits) == 10:
+        digits = digits[:2] + '9' + digits[2:]
+
+    if add55 and digits and not digits.startswith('55'):
+        digits = '55' + digits
+
+    return digits
+
+
+def is_invalid_phone(num: str) -> bool:
+    digits = _digits(num)
+    if len(digits) < PHONE_MIN_LEN:
+        return True
+    if len(set(digits)) == 1:
+        return True
+    return False
+
+# ---------------- (NOVO) normalização vetorizada (coluna inteira) ----------------
+# Mesmas regras de normalize_phone / is_invalid_phone, mas aplicadas à coluna
+# de uma vez com operações de string do pandas. Com pyarrow instalado a coluna
+# vira string[pyarrow] e as operações rodam em C++ (Arrow compute).
+
+TEXT_DTYPE = pd.StringDtype("pyarrow") if pa is not None else object
+
+def _as_text(values) -> pd.Series:
+    """Converte para texto; vazio/NaN/None viram "" (como o _scalar_text do escalar)."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    s = s.astype(object).where(s.notna(), "").astype(str)
+    return s if TEXT_DTYPE is object else s.astype(TEXT_DTYPE)
+
+def digits_only_series(values) -> pd.Series:
+    text = _as_text(values)
+    # dígitos Unicode -> ASCII antes do \D (só nas linhas com algum caractere não ASCII)
+    m = text.str.contains(r'[^\x00-\x7f]', regex=True)
+    if m.any():
+        text.loc[m] = text.loc[m].str.translate(_unicode_digit_table())
+    return text.str.replace(r'\D', '', regex=True)
+
+def normalize_phone_series(values, *, strip55: bool = False, add9: bool = False, add55: bool = False) -> pd.Series:
+    """
+    Versão vetorizada do normalize_phone (mesmo resultado, valor a valor).
+    Preserva o índice quando recebe uma Series.
+    """
+    digits = digits_only_series(values)
+
+    if strip55:
+        m = digits.str.startswith('55') & (digits.str.len() >= 12)
+        if m.any():
+            digits.loc[m] = digits.loc[m].str[2:]
+
+    # adiciona 9 após DDD quando formato for DD + 8
+    if add9:
+        m = digits.str.len() == 10
+        if m.any():
+            sub = digits.loc[m]
+            digits.loc[m] = sub.str[:2] + '9' + sub.str[2:]
+
+    if add55:
+        m = (digits != '') & ~digits.str.startswith('55')
+        if m.any():
+            digits.loc[m] = '55' + digits.loc[m]
+
+    return digits
+
+def invalid_phone_mask(values) -> pd.Series:
+    """
+    Versão vetorizada do is_invalid_phone: vazio, menos de PHONE_MIN_LEN dígitos
+    ou todos os dígitos iguais (s[1:] == s[:-1] só vale quando todos são iguais).
+    """
+    if is_phone_key_series(values):
+        return pd.Series(_invalid_phone_keys(phone_keys(values)), index=values.index)
+    digits = digits_only_series(values)
+    lens = digits.str.len()
+    same = digits.str[1:] == digits.str[:-1]
+    return ((lens < PHONE_MIN_LEN) | same).astype(bool)
+
+# ---------------- (NOVO) CNPJ em lote + dígitos verificadores ----------------
+# Normaliza a coluna inteira (só dígitos, últimos 14, zeros à esquerda) e valida
+# os dois dígitos verificadores com aritmética de arrays NumPy (uma linha por CNPJ).
+
+CNPJ_DV1_WEIGHTS = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.int64)
+CNPJ_DV2_WEIGHTS = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.int64)
+
+def normalize_cnpj_series(values) -> pd.Series:
+    """
+    Versão vetorizada do normalize_cnpj (mesmo resultado, valor a valor):
+    14 dígitos com zeros à esquerda, ou None quando não há dígito nenhum.
+    """
+    digits = digits_only_series(values)
+    out = digits.str[-14:].str.zfill(14).astype(object)
+    return out.where(digits != '', None)
+
+def _cnpj_dv(digits: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    r = (digits[:, :len(weights)] * weights).sum(axis=1) % 11
+    return np.where(r < 2, 0, 11 - r)
+
+def cnpj_valid_mask(values) -> pd.Series:
+    """
+    True onde o CNPJ (já normalizado ou não) tem 14 dígitos com os dois
+    verificadores corretos. Vazio e todos os dígitos iguais contam como inválidos.
+    """
+    norm = normalize_cnpj_series(values)
+    present = norm.notna().to_numpy()
+    valid = np.zeros(len(norm), dtype=bool)
+    if present.any():
+        txt = "".join(norm[present].tolist()).encode("ascii")
+        d = (np.frombuffer(txt, dtype=np.uint8).reshape(-1, 14) - ord("0")).astype(np.int64)
+        ok = (d[:, 12] == _cnpj_dv(d, CNPJ_DV1_WEIGHTS)) & (d[:, 13] == _cnpj_dv(d, CNPJ_DV2_WEIGHTS))
+        ok &= ~(d == d[:, :1]).all(axis=1)
+        valid[present] = ok
+    return pd.Series(valid, index=norm.index)
+
+# ---------------- (NOVO) separação vetorizada de telefones ----------------
+
+def split_telefones_long(values) -> pd.DataFrame:
+    """
+    Versão vetorizada do split_telefones_field que mantém TODOS os números do campo.
+    Devolve uma tabela longa com as colunas:
+      - row: rótulo do índice original
+      - pos: posição do número no campo (1, 2, 3...)
+      - phone: só dígitos
+    Mesma regra de separação (; , / | espaço) e de limpeza de cada pedaço.
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    labels = s.index.to_numpy()
+    tokens = _as_text(s.reset_index(drop=True)).str.split(PHONE_SPLIT_PATTERN, regex=True).explode()
+    digits = digits_only_series(tokens)
+    digits = digits[digits != '']
+    pos = digits.groupby(level=0, sort=False).cumcount() + 1
+    return pd.DataFrame({
+        "row": labels[digits.index.to_numpy()],
+        "pos": pos.to_numpy(),
+        "phone": digits.to_numpy(),
+    })
+
+def split_telefones_wide(values, n: int = 2, prefix: str = "Telefone") -> pd.DataFrame:
+    """
+    Os n primeiros números de cada linha em colunas Telefone1..Telefonen
+    (None quando a linha tem menos números), mesmo índice da entrada.
+    Com n=2 reproduz o split_telefones_field.
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    long = split_telefones_long(s)
+    out = pd.DataFrame(index=s.index)
+    for i in range(1, n + 1):
+        sel = long[long["pos"] == i]
+        col = pd.Series(sel["phone"].to_numpy(dtype=object), index=sel["row"].to_numpy())
+        out[f"{prefix}{i}"] = col.reindex(s.index).astype(object).where(lambda x: x.notna(), None)
+    return out
+
+# Caracteres removidos da Razão Social, compilados uma vez só:
+# tabela do str.translate (escalar) e classe de regex (coluna inteira).
+RAZAO_REMOVE_CHARS = "0123456789-='\",.;[]:{}!@#$%&()_+"
+RAZAO_TRANSLATE = str.maketrans("", "", RAZAO_REMOVE_CHARS)
+RAZAO_REMOVE_PATTERN = "[" + re.escape(RAZAO_REMOVE_CHARS) + "]"
+COMBINING_MARKS_PATTERN = "[\u0300-\u036f]"
+
+def clean_razao_social(s: str) -> str:
+    """
+    Remove da Razao Social:
+    0-9 - = ' " , . ; [ ] : { } ! @ # $ % & ( ) _ +
+    Mantém letras e espaços.
+    """
+    if pd.isna(s):
+        return ''
+    return str(s).translate(RAZAO_TRANSLATE)
+
+def clean_razao_social_series(values, *, fold_accents: bool = False, collapse_ws: bool = False, upper: bool = False) -> pd.Series:
+    """
+    Versão vetorizada do clean_razao_social (sem opções, mesmo resultado valor a valor).
+    Opcionais:
+    - fold_accents=True: remove acentos (NFKD + descarta marcas combinantes)
+    - collapse_ws=True: espaços repetidos viram um só, sem espaço nas pontas
+    - upper=True: caixa alta
+    """
+    out = _as_text(values).str.replace(RAZAO_REMOVE_PATTERN, "", regex=True)
+    if fold_accents:
+        out = out.str.normalize("NFKD").str.replace(COMBINING_MARKS_PATTERN, "", regex=True)
+    if collapse_ws:
+        out = out.str.replace(r"\s+", " ", regex=True).str.strip()
+    if upper:
+        out = out.str.upper()
+    return out
+
+def razao_social_key(values) -> pd.Series:
+    """Chave normalizada de Razão Social para cruzamentos (sem acento, espaço único, caixa alta)."""
+    return clean_razao_social_series(values, fold_accents=True, collapse_ws=True, upper=True)
+
+def pick_col(normals: dict, candidates: list):
+    for cand in candidates:
+        key = normalize_col_name(cand)
+        if key in normals:
+            return normals[key]
+        for norm, orig in normals.items():
+            if key in norm:
+                return orig
+    return None
+
+def safe_remove_file(path: str):
+    try:
+        if os.path.isfile(path):
+            os.remove(path)
+    except:
+        pass
+
+def _extract_ddd_from_phone(phone: str) -> Optional[str]:
+    """
+    Regra: DDD são os 2 primeiros dígitos do telefone (conforme seu pedido).
+    """
+    p = normalize_phone(phone)
+    if p.startswith('55') and len(p) >= 4:
+        p = p[2:]
+    if not p or len(p) < 2:
+        return None
+    return p[:2]
+
+def uf_from_phone(tel1: str, tel2: str) -> str:
+    """
+    Define UF usando primeiro DDD disponível (Telefone1, senão Telefone2).
+    Se não achar, retorna "??".
+    """
+    ddd = _extract_ddd_from_phone(tel1) or _extract_ddd_from_phone(tel2)
+    if not ddd:
+        return "??"
+    return DDD_TO_UF.get(ddd, "??")
+
+def ddd_array(values) -> np.ndarray:
+    """
+    Versão vetorizada do _extract_ddd_from_phone: DDD inteiro (0..99) por valor,
+    ou -1 quando não há DDD.
+    """
+    if is_phone_key_series(values):
+        return _ddd_from_keys(phone_keys(values))
+    digits = digits_only_series(values)
+    m = digits.str.startswith('55') & (digits.str.len() >= 4)
+    if m.any():
+        digits.loc[m] = digits.loc[m].str[2:]
+    head = digits.str[:2]
+    ddd = pd.to_numeric(head.where(head.str.len() == 2, None), errors="coerce")
+    return ddd.fillna(-1).to_numpy(dtype=np.int64)
+
+def uf_codes_from_phones(tel1, tel2=None) -> np.ndarray:
+    """
+    Versão vetorizada do uf_from_phone: código em UF_CODES por linha
+    (DDD do Telefone1, senão do Telefone2; 0 = "??").
+    """
+    ddd = ddd_array(tel1)
+    if tel2 is not None:
+        ddd = np.where(ddd >= 0, ddd, ddd_array(tel2))
+    return np.where(ddd >= 0, DDD_UF_CODE[np.clip(ddd, 0, 99)], 0).astype(np.int8)
+
+def uf_counts_from_codes(codes: np.ndarray) -> Dict[str, int]:
+    """Contagem por UF (maior primeiro, só UFs presentes) a partir dos códigos."""
+    return uf_counts_from_bincount(np.bincount(codes, minlength=len(UF_CODES)))
+
+def uf_counts_from_bincount(counts: np.ndarray) -> Dict[str, int]:
+    """Mesmo que uf_counts_from_codes, a partir de contagens já somadas (bloco a bloco)."""
+    order = np.argsort(-counts, kind="stable")
+    return {UF_CODES[i]: int(counts[i]) for i in order if counts[i] > 0}
+
+MOTIVO_BINS = 1 << max(MOTIVO_LABELS).bit_length()
+
+def _motivo_text_table() -> np.ndarray:
+    """Texto de cada combinação de bits (índice = valor da máscara), na ordem do MOTIVO_LABELS."""
+    table = np.empty(MOTIVO_BINS, dtype=object)
+    for bits in range(MOTIVO_BINS):
+        table[bits] = " | ".join(lbl for bit, lbl in MOTIVO_LABELS.items() if bits & bit)
+    return table
+
+def render_motivos(bits) -> np.ndarray:
+    """Máscara de motivos -> texto "A | B" (só usado na gravação)."""
+    return _motivo_text_table()[np.asarray(bits, dtype=np.int64)]
+
+def motivo_counts(bits) -> Dict[str, int]:
+    """Contagem por motivo (uma linha com 2 motivos conta nos 2); máscara 0 = "(sem motivo)"."""
+    return motivo_counts_from_bincount(np.bincount(np.asarray(bits, dtype=np.int64), minlength=MOTIVO_BINS))
+
+def motivo_counts_from_bincount(hist: np.ndarray) -> Dict[str, int]:
+    """Mesmo que motivo_counts, a partir do histograma das máscaras (somado bloco a bloco)."""
+    values = np.arange(len(hist))
+    counts: Dict[str, int] = {}
+    for bit, lbl in MOTIVO_LABELS.items():
+        n = int(hist[(values & bit) != 0].sum())
+        if n:
+            counts[lbl] = n
+    if hist[0]:
+        counts[MOTIVO_SEM] = int(hist[0])
+    return counts
+
+# ---------------- (NOVO) índice compilado de telefones (blocklist / não perturbe) ----------------
+# Cada lista é compilada uma vez num array int64 ordenado e sem repetição, gravado
+# em .npy e aberto com mmap na hora de usar (só as páginas tocadas vão pra RAM).
+# Pertinência de uma coluna inteira = np.searchsorted. O arquivo compilado é
+# reaproveitado enquanto o original não mudar (caminho+tamanho+mtime+strip55).
+#
+# Chave do telefone: int("1" + dígitos) = int(dígitos) + 10**len(dígitos). O "1"
+# na frente preserva zeros à esquerda e o tamanho. Acima de 18 dígitos não cabe
+# em int64 e a chave vira -1 (nunca casa).
+
+INDEX_DIR = os.path.join(os.path.expanduser("~"), ".b2bsafe", "blocklists")
+INDEX_MAX_BYTES = 2 * 1024 ** 3
+PHONE_KEY_MAX_DIGITS = 18
+_POW10 = 10 ** np.arange(PHONE_KEY_MAX_DIGITS + 1, dtype=np.int64)
+
+def phone_keys(values) -> np.ndarray:
+    """Telefones (texto ou coluna Int64 de chaves) -> chaves int64; vazio ou grande demais = -1."""
+    if is_phone_key_series(values):
+        return values.to_numpy(dtype=np.int64, na_value=-1)
+    digits = digits_only_series(values)
+    lens = digits.str.len().to_numpy(dtype=np.int64)
+    ok = (lens > 0) & (lens <= PHONE_KEY_MAX_DIGITS)
+    keys = np.full(len(digits), -1, dtype=np.int64)
+    if ok.any():
+        keys[ok] = digits[ok].astype("int64").to_numpy(dtype=np.int64) + _POW10[lens[ok]]
+    return keys
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    """Ordena e tira repetidos (sort + diff; bem mais rápido que np.unique em arrays grandes)."""
+    values = np.sort(np.asarray(values))
+    if len(values) < 2:
+        return values
+    return values[np.r_[True, values[1:] != values[:-1]]]
+
+def phone_keys_to_str(keys) -> np.ndarray:
+    """Inverso do phone_keys (chave -1 vira "")."""
+    keys = np.asarray(keys, dtype=np.int64)
+    out = keys.astype(str).astype(object)
+    out[keys >= 0] = [k[1:] for k in out[keys >= 0]]
+    out[keys < 0] = ""
+    return out
+
+# ---------------- (NOVO) quadro de trabalho compacto ----------------
+# Na limpeza em memória as colunas não ficam como str do Python (~60 bytes por
+# célula). Representação do quadro de trabalho:
+#   - Telefone1..N: Int64 (nullable) com a chave do telefone (phone_keys); <NA> = vazio
+#   - Cnpj: Int64 com o valor dos 14 dígitos; <NA> = sem CNPJ
+#   - Razão Social / E-mail: string[pyarrow] (texto no buffer Arrow)
+#   - motivo: máscara uint8 (MOTIVO_*); UF: código int8 (UF_CODES)
+# phone_keys, invalid_phone_mask e ddd_array aceitam as duas formas do telefone
+# (texto ou chave), então o resto da limpeza não muda. O texto volta só na
+# gravação, bloco a bloco (write_working_frame); o motivo sai como Categorical.
+# A codificação também anda em blocos de WORK_BLOCK_ROWS linhas: o texto
+# intermediário (split, regex, normalização) nunca existe para a base inteira.
+
+WORK_BLOCK_ROWS = 250_000
+
+_REPDIGIT = np.array([0] + [(10 ** n - 1) // 9 for n in range(1, PHONE_KEY_MAX_DIGITS + 1)], dtype=np.int64)
+
+def is_phone_key_series(values) -> bool:
+    return isinstance(values, pd.Series) and isinstance(values.dtype, pd.Int64Dtype)
+
+def _key_lens(keys: np.ndarray) -> np.ndarray:
+    """Quantidade de dígitos de cada chave (10**len <= chave < 2 * 10**len); -1 se chave < 0."""
+    return np.searchsorted(_POW10, keys, side="right") - 1
+
+def _invalid_phone_keys(keys: np.ndarray) -> np.ndarray:
+    """invalid_phone_mask sobre as chaves: sem número, curto demais ou todos os dígitos iguais."""
+    lens = _key_lens(keys)
+    ok = (keys >= 0) & (lens >= PHONE_MIN_LEN)
+    invalid = ~ok
+    if ok.any():
+        v = keys[ok] - _POW10[lens[ok]]
+        invalid[ok] = v % _REPDIGIT[lens[ok]] == 0
+    return invalid
+
+def _ddd_from_keys(keys: np.ndarray) -> np.ndarray:
+    """ddd_array sobre as chaves (mesma regra: tira o 55 da frente quando há 4+ dígitos)."""
+    lens = _key_lens(keys)
+    ddd = np.full(len(keys), -1, dtype=np.int64)
+    ok = (keys >= 0) & (lens >= 2)
+    if ok.any():
+        n = lens[ok]
+        v = keys[ok] - _POW10[n]
+        head = v // _POW10[n - 2]
+        tira55 = (head == 55) & (n >= 4)
+        head[tira55] = (v[tira55] // _POW10[n[tira55] - 4]) % 100
+        ddd[ok] = head
+    return ddd
+
+def compact_text(values) -> pd.Series:
+    """Texto livre -> string[pyarrow] (vazio/NaN continuam vazios, não viram "nan")."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    return s if TEXT_DTYPE is object else s.astype(TEXT_DTYPE)
+
+def encode_phone_column(values) -> pd.Series:
+    """
+    Telefone já normalizado -> Int64 com a chave (vazio = <NA>). Se algum número
+    não couber na chave (mais de PHONE_KEY_MAX_DIGITS dígitos) a coluna fica em
+    texto, para a saída mostrar o número como veio.
+    """
+    text = _as_text(values)
+    keys = phone_keys(text)
+    vazio = (text == "").to_numpy(dtype=bool)
+    if ((keys < 0) & ~vazio).any():
+        return text
+    return pd.Series(pd.arrays.IntegerArray(keys, vazio), index=text.index)
+
+def phone_columns_from_field(values, n: int = 2, *, strip55: bool = False, add9: bool = False,
+                             add55: bool = False, prefix: str = "Telefone") -> pd.DataFrame:
+    """
+    split_telefones_wide + normalize_phone_series + encode_phone_column, em blocos
+    de WORK_BLOCK_ROWS linhas. Mesmo índice da entrada.
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    cols = [f"{prefix}{i}" for i in range(1, n + 1)]
+    parts: Dict[str, List[pd.Series]] = {c: [] for c in cols}
+    for start in range(0, max(len(s), 1), WORK_BLOCK_ROWS):
+        wide = split_telefones_wide(s.iloc[start:start + WORK_BLOCK_ROWS], n=n, prefix=prefix)
+        for c in cols:
+            parts[c].append(encode_phone_column(normalize_phone_series(wide[c], strip55=strip55, add9=add9, add55=add55)))
+        del wide
+    out = pd.DataFrame(index=s.index)
+    for c in cols:
+        if all(is_phone_key_series(p) for p in parts[c]):
+            out[c] = pd.concat(parts[c])
+        else:
+            # algum bloco ficou em texto (número que não cabe na chave): a coluna toda vira texto
+            out[c] = _as_text(pd.concat([decode_phone_column(p) for p in parts[c]]))
+    return out
+
+def decode_phone_column(values) -> pd.Series:
+    if not is_phone_key_series(values):
+        return values
+    return pd.Series(phone_keys_to_str(values.to_numpy(dtype=np.int64, na_value=-1)), index=values.index)
+
+def encode_cnpj_column(values) -> pd.Series:
+    """Mesmo resultado do normalize_cnpj_series, guardado como Int64 (<NA> = sem CNPJ)."""
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    out = np.zeros(len(s), dtype=np.int64)
+    vazio = np.ones(len(s), dtype=bool)
+    for start in range(0, len(s), WORK_BLOCK_ROWS):
+        digits = digits_only_series(s.iloc[start:start + WORK_BLOCK_ROWS])
+        ok = (digits != "").to_numpy(dtype=bool)
+        vazio[start:start + len(ok)] = ~ok
+        if ok.any():
+            out[start:start + len(ok)][ok] = digits[ok].str[-14:].astype("int64").to_numpy(dtype=np.int64)
+    return pd.Series(pd.arrays.IntegerArray(out, vazio), index=s.index)
+
+def decode_cnpj_column(values) -> pd.Series:
+    if not isinstance(values.dtype, pd.Int64Dtype):
+        return values
+    out = values.astype(object)
+    present = values.notna().to_numpy()
+    out[present] = pd.Series(values[present].to_numpy(dtype=np.int64)).astype(str).str.zfill(14).to_numpy(dtype=object)
+    return out.where(present, None)
+
+def decode_working_frame(df: pd.DataFrame, *, motivo_col: Optional[str] = None) -> pd.DataFrame:
+    """Quadro compacto -> texto para gravar (só as colunas que precisam mudar)."""
+    out = df.copy(deep=False)
+    for c in out.columns:
+        if c == motivo_col:
+            out[c] = pd.Categorical.from_codes(out[c].to_numpy(dtype=np.int64), categories=_motivo_text_table())
+        elif c == "Cnpj":
+            out[c] = decode_cnpj_column(out[c])
+        elif is_phone_key_series(out[c]):
+            out[c] = decode_phone_column(out[c])
+    return out
+
+def write_working_frame(w: "StreamingExcelWriter", df: pd.DataFrame, cols: List[str], *,
+                        rows: Optional[np.ndarray] = None, motivo: Optional[np.ndarray] = None,
+                        motivo_col: str = "Motivo Exclusao"):
+    """
+    Grava as linhas `rows` (posições; None = todas) do quadro compacto, só com as
+    colunas `cols`, decodificando um bloco de EXCEL_WRITE_CHUNK_ROWS linhas por
+    vez: nunca existe cópia filtrada do quadro inteiro. `motivo` (máscara uint8
+    do tamanho do quadro) vira a coluna motivo_col.
+    """
+    rows = np.arange(len(df)) if rows is None else np.asarray(rows)
+    col_idx = [df.columns.get_loc(c) for c in cols if not (motivo is not None and c == motivo_col)]
+    # range com pelo menos uma volta: quadro vazio ainda grava o cabeçalho
+    for start in range(0, max(len(rows), 1), EXCEL_WRITE_CHUNK_ROWS):
+        pos = rows[start:start + EXCEL_WRITE_CHUNK_ROWS]
+        block = df.iloc[pos, col_idx]
+        if motivo is not None:
+            block = block.assign(**{motivo_col: motivo[pos]})[cols]
+        w.write(decode_working_frame(block, motivo_col=motivo_col if motivo is not None else None))
+
+def frame_mb(df: pd.DataFrame) -> float:
+    """memory_usage(deep=True) em MB (conta o texto de verdade, não só os ponteiros)."""
+    return float(df.memory_usage(deep=True).sum()) / 1024 ** 2
+
+def _index_file(path: str, strip55: bool) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{int(bool(strip55))}"
+    return os.path.join(INDEX_DIR, hashlib.sha1(raw.encode("utf-8")).hexdigest() + ".npy")
+
+def _phone_col_of(path: str) -> str:
+    """Mesma regra de sempre: primeira coluna com "tel" no nome, senão a primeira."""
+    cols = list(read_table_header(path, nrows=1).columns)
+    if not cols:
+        raise ValueError("Arquivo sem colunas.")
+    return next((c for c in cols if "tel" in normalize_col_name(c)), cols[0])
+
+def compile_phone_index(path: str, *, strip55: bool = False, progress=None) -> str:
+    """
+    Lê a lista em blocos, normaliza os telefones e grava o array ordenado de
+    chaves. Retorna o caminho do .npy (reaproveita se já estiver compilado).
+    """
+    target = _index_file(path, strip55)
+    if not target:
+        raise FileNotFoundError(path)
+    if os.path.isfile(target):
+        os.utime(target, None)
+        return target
+
+    keys = read_phone_keys(path, strip55=strip55, progress=progress)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    _save_keys(keys, target)
+    cache_evict(INDEX_MAX_BYTES, directory=INDEX_DIR, suffix=".npy")
+    cache_evict(INDEX_MAX_BYTES // 4, directory=INDEX_DIR, suffix=".bloom")
+    return target
+
+def read_phone_keys(path: str, *, strip55: bool = False, progress=None) -> np.ndarray:
+    """Lê a lista em blocos e devolve as chaves ordenadas e sem repetição."""
+    tel_col = _phone_col_of(path)
+    parts = []
+    for chunk in read_table_chunks(path, usecols=[tel_col], progress=progress):
+        keys = phone_keys(normalize_phone_series(chunk[tel_col], strip55=strip55))
+        parts.append(sorted_unique(keys[keys >= 0]))
+    return sorted_unique(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+
+def _save_array(arr: np.ndarray, target: str):
+    """Grava o array em formato .npy de forma atômica (tmp + replace)."""
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as fh:
+        np.save(fh, arr)
+    os.replace(tmp, target)
+
+def _save_keys(keys: np.ndarray, target: str):
+    _save_array(np.asarray(keys, dtype=np.int64), target)
+
+class PhoneIndex:
+    """Conjunto de telefones como array int64 ordenado (normalmente mmap de um .npy)."""
+
+    def __init__(self, keys: np.ndarray, source: str = "", path: Optional[str] = None):
+        self.keys = keys
+        self.source = source
+        self.path = path
+
+    @classmethod
+    def load(cls, npy_path: str, source: str = "") -> "PhoneIndex":
+        return cls(np.load(npy_path, mmap_mode="r"), source or npy_path, path=npy_path)
+
+    @classmethod
+    def from_phones(cls, values, source: str = "") -> "PhoneIndex":
+        keys = phone_keys(values)
+        return cls(sorted_unique(keys[keys >= 0]), source)
+
+    def __len__(self) -> int:
+        return int(self.keys.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes)
+
+    def contains_keys(self, keys: np.ndarray) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self) == 0 or len(keys) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.searchsorted(self.keys, keys)
+        pos[pos >= len(self)] = len(self) - 1
+        return (np.asarray(self.keys[pos]) == keys) & (keys >= 0)
+
+    def contains(self, values) -> np.ndarray:
+        """Máscara booleana: telefone (texto) está no índice?"""
+        return self.contains_keys(phone_keys(values))
+
+def load_phone_index(path: str, *, strip55: bool = False, progress=None) -> PhoneIndex:
+    """Abre o índice compilado da lista (compila antes se for a primeira vez)."""
+    return PhoneIndex.load(compile_phone_index(path, strip55=strip55, progress=progress), source=path)
+
+# ---------------- (NOVO) store de blocklist com deltas ----------------
+# Para listas que crescem com deltas diários (Procon Não Perturbe, C6): um
+# diretório com manifest.json, uma base compilada e deltas ordenados de inclusão
+# (add) e exclusão (remove). A consulta aplica os deltas na ordem por cima da
+# base, sem reconstruir nada; a compactação (job em segundo plano) funde tudo numa base
+# nova. Cada alteração sobe a versão e o watermark, que a limpeza registra no log.
+
+STORE_MANIFEST = "manifest.json"
+STORE_FORMAT = 1
+STORE_COMPACT_MAX_DELTAS = 8
+STORE_COMPACT_RATIO = 0.10
+_store_locks: Dict[str, threading.Lock] = {}
+_store_locks_guard = threading.Lock()
+
+def _store_lock(directory: str) -> threading.Lock:
+    key = os.path.normcase(os.path.abspath(directory))
+    with _store_locks_guard:
+        return _store_locks.setdefault(key, threading.Lock())
+
+class LayeredPhoneIndex:
+    """Base + deltas na ordem: add liga o telefone, remove desliga."""
+
+    def __init__(self, base: PhoneIndex, deltas: List[Tuple[str, PhoneIndex]], count: int, source: str = ""):
+        self.base = base
+        self.deltas = deltas
+        self.count = count
+        self.source = source
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    @property
+    def nbytes(self) -> int:
+        return self.base.nbytes + sum(d.nbytes for _, d in self.deltas)
+
+    def contains_keys(self, keys: np.ndarray) -> np.ndarray:
+        hit = self.base.contains_keys(keys)
+        for op, d in self.deltas:
+            if op == "add":
+                hit |= d.contains_keys(keys)
+            else:
+                hit &= ~d.contains_keys(keys)
+        return hit
+
+    def contains(self, values) -> np.ndarray:
+        return self.contains_keys(phone_keys(values))
+
+    def materialize(self) -> np.ndarray:
+        """Array ordenado final (base com os deltas aplicados)."""
+        keys = np.asarray(self.base.keys)
+        for op, d in self.deltas:
+            if op == "add":
+                keys = sorted_unique(np.concatenate([keys, np.asarray(d.keys)]))
+            else:
+                keys = keys[~d.contains_keys(keys)]
+        return keys.astype(np.int64, copy=False)
+
+class BlocklistStore:
+    """Diretório de blocklist incremental (manifest.json + base.npy + deltas)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, STORE_MANIFEST)
+        if not os.path.isfile(self.manifest_path):
+            raise FileNotFoundError(f"Store de blocklist não encontrado: {directory}")
+
+    @staticmethod
+    def locate(path: str) -> Optional[str]:
+        """Diretório do store se `path` for a pasta dele ou o manifest.json; senão None."""
+        path = (path or "").strip()
+        if os.path.isdir(path) and os.path.isfile(os.path.join(path, STORE_MANIFEST)):
+            return path
+        if os.path.basename(path) == STORE_MANIFEST and os.path.isfile(path):
+            return os.path.dirname(path) or "."
+        return None
+
+    @classmethod
+    def create(cls, directory: str, *, strip55: bool = False) -> "BlocklistStore":
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, STORE_MANIFEST)
+        if os.path.isfile(manifest_path):
+            raise ValueError(f"Já existe um store em {directory}")
+        _write_json_atomic(manifest_path, {
+            "format": STORE_FORMAT,
+            "version": 0,
+            "watermark": None,
+            "strip55": bool(strip55),
+            "base": None,
+            "count": 0,
+            "deltas": [],
+        })
+        return cls(directory)
+
+    def read_manifest(self) -> dict:
+        with open(self.manifest_path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    @property
+    def strip55(self) -> bool:
+        return bool(self.read_manifest().get("strip55"))
+
+    def describe(self, manifest: Optional[dict] = None) -> str:
+        m = manifest or self.read_manifest()
+        return f"v{m['version']} | watermark {m.get('watermark') or '-'} | {m['count']} telefones | {len(m['deltas'])} delta(s)"
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self, m: dict) -> LayeredPhoneIndex:
+        base = PhoneIndex.load(self._file(m["base"])) if m.get("base") else PhoneIndex(np.array([], dtype=np.int64))
+        deltas = [(d["op"], PhoneIndex.load(self._file(d["file"]))) for d in m["deltas"]]
+        return LayeredPhoneIndex(base, deltas, m["count"], source=self.directory)
+
+    def load(self) -> Tuple[LayeredPhoneIndex, dict]:
+        """Índice pronto para consulta + o manifest (versão/watermark) usado."""
+        m = self.read_manifest()
+        return self._load(m), m
+
+    def _bump(self, m: dict):
+        m["version"] += 1
+        m["watermark"] = datetime.now().isoformat(timespec="seconds")
+
+    def set_base(self, path: str, *, progress=None) -> dict:
+        """Recompila a base a partir de uma exportação completa (descarta os deltas)."""
+        keys = read_phone_keys(path, strip55=self.strip55, progress=progress)
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            self._bump(m)
+            name = f"base_{m['version']:06d}.npy"
+            _save_keys(keys, self._file(name))
+            m.update(base=name, count=int(len(keys)), deltas=[])
+            _write_json_atomic(self.manifest_path, m)
+        self._remove_orphans()
+        return m
+
+    def _apply_delta(self, op: str, path: str, progress=None) -> dict:
+        keys = read_phone_keys(path, strip55=self.strip55, progress=progress)
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            current = self._load(m)
+            hit = current.contains_keys(keys)
+            self._bump(m)
+            name = f"delta_{m['version']:06d}_{op}.npy"
+            _save_keys(keys, self._file(name))
+            m["count"] += int((~hit).sum()) if op == "add" else -int(hit.sum())
+            m["deltas"].append({
+                "op": op,
+                "file": name,
+                "source": os.path.basename(path),
+                "rows": int(len(keys)),
+                "version": m["version"],
+                "at": m["watermark"],
+            })
+            _write_json_atomic(self.manifest_path, m)
+        return m
+
+    def add(self, path: str, *, progress=None) -> dict:
+        """Delta de inclusão (telefones novos na lista)."""
+        return self._apply_delta("add", path, progress)
+
+    def remove(self, path: str, *, progress=None) -> dict:
+        """Delta de exclusão (telefones que saíram da lista)."""
+        return self._apply_delta("remove", path, progress)
+
+    def needs_compaction(self, manifest: Optional[dict] = None) -> bool:
+        m = manifest or self.read_manifest()
+        if not m["deltas"]:
+            return False
+        if len(m["deltas"]) >= STORE_COMPACT_MAX_DELTAS:
+            return True
+        base_bytes = os.path.getsize(self._file(m["base"])) if m.get("base") else 0
+        delta_bytes = sum(os.path.getsize(self._file(d["file"])) for d in m["deltas"])
+        return delta_bytes >= base_bytes * STORE_COMPACT_RATIO
+
+    def compact(self) -> bool:
+        """
+        Funde base + deltas numa base nova. A versão não muda (conteúdo igual).
+        Deltas que chegarem durante a compactação ficam para a próxima.
+        """
+        with _store_lock(self.directory):
+            snap = self.read_manifest()
+        if not snap["deltas"]:
+            return False
+        keys = self._load(snap).materialize()
+        name = f"base_{snap['version']:06d}_c.npy"
+        _save_keys(keys, self._file(name))
+
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            merged = len(snap["deltas"])
+            if m.get("base") != snap.get("base") or m["deltas"][:merged] != snap["deltas"]:
+                safe_remove_file(self._file(name))
+                return False
+            m["base"] = name
+            m["deltas"] = m["deltas"][merged:]
+            if not m["deltas"]:
+                m["count"] = int(len(keys))
+            _write_json_atomic(self.manifest_path, m)
+        self._remove_orphans()
+        return True
+
+    def _remove_orphans(self):
+        """
+        Apaga .npy que o manifest não referencia mais, e os .bloom deles
+        (em uso/mmap no Windows: fica pra depois).
+        """
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            used = {m.get("base")} | {d["file"] for d in m["deltas"]}
+            for f in os.listdir(self.directory):
+                npy = f.split(".npy.", 1)[0] + ".npy" if f.endswith(".bloom") else f
+                if npy.endswith(".npy") and npy not in used:
+                    safe_remove_file(self._file(f))
+
+def _write_json_atomic(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+# ---------------- (NOVO) pré-filtro Bloom (listas muito grandes) ----------------
+# Filtro probabilístico na frente do índice exato: ~10 bits por telefone com 1% de
+# falso positivo (o índice exato usa 64). Quem passa no Bloom é confirmado no
+# índice exato (mmap, só as páginas tocadas); quem não passa nunca está na lista.
+# Hash duplo (splitmix64) sobre a chave int64; bits num array uint8 do NumPy.
+# O filtro de cada .npy compilado fica salvo ao lado dele ("<arquivo>.npy.<fp>.bloom").
+
+BLOOM_DEFAULT_FP = 0.01
+BLOOM_BATCH = 1_000_000
+_SM64_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_SM64_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_SM64_M2 = np.uint64(0x94D049BB133111EB)
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + _SM64_GAMMA
+    x = (x ^ (x >> np.uint64(30))) * _SM64_M1
+    x = (x ^ (x >> np.uint64(27))) * _SM64_M2
+    return x ^ (x >> np.uint64(31))
+
+class PhoneBloomFilter:
+    """Bloom filter de chaves de telefone (m bits, k hashes) dimensionado por n e fp_rate."""
+
+    def __init__(self, n: int, fp_rate: float = BLOOM_DEFAULT_FP, bits: Optional[np.ndarray] = None):
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"Taxa de falso positivo inválida: {fp_rate}")
+        n = max(int(n), 1)
+        self.n = n
+        self.fp_rate = fp_rate
+        self.m = max(64, int(math.ceil(-n * math.log(fp_rate) / math.log(2) ** 2)))
+        self.k = max(1, int(round(self.m / n * math.log(2))))
+        self.bits = np.zeros((self.m + 7) // 8, dtype=np.uint8) if bits is None else bits
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.bits.nbytes)
+
+    def _positions(self, keys: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            h1 = _splitmix64(np.asarray(keys, dtype=np.int64).astype(np.uint64))
+            h2 = _splitmix64(h1) | np.uint64(1)
+            i = np.arange(self.k, dtype=np.uint64)[:, None]
+            return (h1[None, :] + i * h2[None, :]) % np.uint64(self.m)
+
+    def add_keys(self, keys: np.ndarray):
+        for start in range(0, len(keys), BLOOM_BATCH):
+            pos = np.sort(self._positions(keys[start:start + BLOOM_BATCH]).ravel())
+            if not len(pos):
+                continue
+            byte = (pos >> np.uint64(3)).astype(np.int64)
+            val = np.left_shift(1, (pos & np.uint64(7)).astype(np.uint8)).astype(np.uint8)
+            starts = np.flatnonzero(np.r_[True, byte[1:] != byte[:-1]])
+            self.bits[byte[starts]] |= np.bitwise_or.reduceat(val, starts)
+
+    def contains_keys(self, keys: np.ndarray) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        out = keys >= 0
+        for start in range(0, len(keys), BLOOM_BATCH):
+            sl = slice(start, start + BLOOM_BATCH)
+            for pos in self._positions(keys[sl]):
+                bit = (self.bits[(pos >> np.uint64(3)).astype(np.int64)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+                out[sl] &= bit.astype(bool)
+        return out
+
+    def save(self, path: str):
+        _save_array(self.bits, path)
+
+    @classmethod
+    def load(cls, path: str, n: int, fp_rate: float) -> "PhoneBloomFilter":
+        bits = np.load(path)
+        bloom = cls(n, fp_rate, bits=bits)
+        if bits.dtype != np.uint8 or len(bits) != (bloom.m + 7) // 8:
+            raise ValueError(f"Bloom incompatível: {path}")
+        return bloom
+
+def _cached_bloom(cache: Optional[str], n: int, fp_rate: float, key_arrays) -> PhoneBloomFilter:
+    if cache and os.path.isfile(cache):
+        try:
+            return PhoneBloomFilter.load(cache, n, fp_rate)
+        except Exception:
+            safe_remove_file(cache)
+    bloom = PhoneBloomFilter(n, fp_rate)
+    for keys in key_arrays:
+        bloom.add_keys(keys)
+    if cache:
+        try:
+            bloom.save(cache)
+        except OSError:
+            pass
+    return bloom
+
+def _bloom_for_phone_index(idx: PhoneIndex, fp_rate: float) -> PhoneBloomFilter:
+    cache = f"{idx.path}.{fp_rate:g}.bloom" if idx.path else None
+    return _cached_bloom(cache, len(idx), fp_rate, [idx.keys])
+
+def bloom_for_index(idx, fp_rate: float = BLOOM_DEFAULT_FP) -> PhoneBloomFilter:
+    """
+    Bloom de um PhoneIndex (salvo ao lado do .npy) ou de um store. No store o
+    filtro é dimensionado para base + deltas de inclusão (o falso positivo fica
+    no alvo mesmo com deltas acumulados); deltas de exclusão só geram falso
+    positivo, que o índice exato descarta.
+    """
+    if isinstance(idx, LayeredPhoneIndex):
+        adds = [d for op, d in idx.deltas if op == "add"]
+        if not adds:
+            return _bloom_for_phone_index(idx.base, fp_rate)
+        n = len(idx.base) + sum(len(d) for d in adds)
+        cache = None
+        if idx.base.path:
+            # deltas só são acrescentados e cada base tem nome próprio: base + total
+            # identifica o conteúdo. Só o Bloom do conjunto atual fica no disco.
+            prefix = f"{idx.base.path}.{fp_rate:g}.deltas-"
+            cache = f"{prefix}{n}.bloom"
+            folder, head = os.path.split(prefix)
+            for f in os.listdir(folder or "."):
+                if f.startswith(head) and f.endswith(".bloom") and os.path.join(folder, f) != cache:
+                    safe_remove_file(os.path.join(folder, f))
+        return _cached_bloom(cache, n, fp_rate, [idx.base.keys] + [d.keys for d in adds])
+    return _bloom_for_phone_index(idx, fp_rate)
+
+# ---------------- (NOVO) carga paralela das listas de filtro ----------------
+# As listas (Blocklist C6 + Não Perturbe 1..4) abrem ao mesmo tempo em threads:
+# leitura/compilação é quase toda em C (parser do pandas, NumPy, Arrow) e solta o
+# GIL. O resultado não é mesclado: o PhoneIndexSet consulta cada índice e faz OR.
+
+FILTER_LOAD_WORKERS = 5
+
+def open_phone_filter(path: str, *, strip55: bool = False) -> Tuple[object, dict]:
+    """
+    Abre uma lista de filtro (arquivo -> índice compilado, ou store incremental).
+    Não loga nada (pode rodar em thread); devolve (índice, info com tempos/versão).
+    """
+    t0 = time.perf_counter()
+    store_dir = BlocklistStore.locate(path)
+    if store_dir:
+        store = BlocklistStore(store_dir)
+        idx, m = store.load()
+        info = {
+            "tipo": "store",
+            "descricao": f"store {os.path.basename(os.path.abspath(store_dir))} {store.describe(m)}",
+            "version": m["version"],
+            "watermark": m.get("watermark"),
+            "strip55": bool(m.get("strip55")),
+        }
+    else:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"arquivo não encontrado: {path}")
+        idx = load_phone_index(path, strip55=strip55)
+        info = {
+            "tipo": "arquivo",
+            "descricao": f"{len(idx)} telefones carregados ({os.path.basename(path)})",
+            "strip55": bool(strip55),
+        }
+    info.update(telefones=len(idx), mb=idx.nbytes / 1024 ** 2, ms=(time.perf_counter() - t0) * 1000)
+    return idx, info
+
+class PhoneIndexSet:
+    """Várias listas consultadas juntas (OR das buscas); nada é copiado nem unido."""
+
+    def __init__(self, members: Optional[List[Tuple[str, object]]] = None):
+        self.members = members or []
+
+    def __bool__(self) -> bool:
+        return bool(self.members)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(idx.nbytes for _, idx in self.members)
+
+    def contains_keys(self, keys: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(keys), dtype=bool)
+        for _, idx in self.members:
+            hit |= idx.contains_keys(keys)
+        return hit
+
+    def contains(self, values) -> np.ndarray:
+        return self.contains_keys(phone_keys(values))
+
+def load_phone_filters(sources: List[Tuple[str, str]], *, strip55: bool = False,
+                       max_workers: int = FILTER_LOAD_WORKERS) -> Tuple[PhoneIndexSet, List[Tuple[str, str, Optional[dict], Optional[Exception]]]]:
+    """
+    Abre as listas (label, caminho) em paralelo. Caminho vazio = lista não usada.
+    Retorna o PhoneIndexSet e, na ordem de entrada, (label, caminho, info, erro).
+    """
+    ativos = [(label, (path or "").strip()) for label, path in sources if (path or "").strip()]
+    if not ativos:
+        return PhoneIndexSet(), []
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ativos)))) as ex:
+        futs = [(label, path, ex.submit(open_phone_filter, path, strip55=strip55)) for label, path in ativos]
+        for label, path, fut in futs:
+            try:
+                idx, info = fut.result()
+                results.append((label, path, idx, info, None))
+            except Exception as e:
+                results.append((label, path, None, None, e))
+    members = [(label, idx) for label, _, idx, _, _ in results if idx is not None and len(idx)]
+    return PhoneIndexSet(members), [(label, path, info, err) for label, path, _, info, err in results]
+
+def contains_with_prefilter(idx, bloom: Optional[PhoneBloomFilter], keys: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Pertinência exata; com Bloom, só os acertos do Bloom vão pro índice. Retorna (máscara, acertos do Bloom)."""
+    if bloom is None:
+        hit = idx.contains_keys(keys)
+        return hit, int(hit.sum())
+    cand = bloom.contains_keys(keys)
+    hit = np.zeros(len(keys), dtype=bool)
+    if cand.any():
+        hit[cand] = idx.contains_keys(keys[cand])
+    return hit, int(cand.sum())
+
+
+# ---------------- (NOVO) deduplicação robusta ----------------
+
+def duplicate_pairs(rows: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pares (linha, chave) em ordem de linha -> (dup, primeiro), por par e na
+    ordem de entrada: dup = o número já apareceu numa linha anterior; primeiro =
+    o par é a primeira ocorrência do número (um por número). O mesmo número
+    repetido na MESMA linha não conta como duplicado.
+    Regra única da duplicidade: serial, shards e modo em disco usam esta função.
+    """
+    dup = np.zeros(len(keys), dtype=bool)
+    primeiro = np.zeros(len(keys), dtype=bool)
+    if not len(keys):
+        return dup, primeiro
+    # ordena por chave (estável: dentro do número, ordem das linhas) e compara
+    # cada par com a primeira linha do número
+    order = np.argsort(keys, kind="stable")
+    k = keys[order]
+    r = rows[order]
+    inicio = np.r_[True, k[1:] != k[:-1]]
+    del k
+    primeira = r[np.flatnonzero(inicio)[np.cumsum(inicio) - 1]]
+    dup[order] = r > primeira
+    primeiro[order[inicio]] = True
+    return dup, primeiro
+
+def duplicate_rows(pos: np.ndarray, keys: np.ndarray, n_rows: int) -> np.ndarray:
+    """
+    Pares (posição, chave) na ordem da planilha (phone_pairs) -> máscara das
+    linhas que repetem um número já visto numa linha anterior.
+    """
+    mask_dup = np.zeros(n_rows, dtype=bool)
+    if len(keys):
+        mask_dup[pos[duplicate_pairs(pos, keys)[0]]] = True
+    return mask_dup
+
+def mark_and_exclude_duplicate_phones(df_base: pd.DataFrame, *, reason_col: Optional[str] = None, phone_cols: Optional[List[str]] = None) -> pd.Series:
+    """
+    Regra (conforme pedido): se um número aparecer mais de uma vez na planilha,
+    excluir TODAS as ocorrências, mantendo apenas 1 (a primeira).
+    Considera Telefone1 e Telefone2 (ou todas as phone_cols) juntos (como um universo único).
+    Os telefones já chegam normalizados (etapa 4); aqui não se normaliza de novo.
+    Retorna máscara booleana de exclusão por duplicidade; se reason_col (máscara de
+    motivos) for informado, liga o bit MOTIVO_DUPLICADO nele.
+    """
+    df = df_base
+    phone_cols = phone_cols or ["Telefone1", "Telefone2"]
+    if df.empty:
+        return pd.Series(False, index=df.index)
+
+    # tabela "long" (pos, chave) empilhada linha a linha / coluna a coluna,
+    # só com telefones válidos -> a ordem é a ordem de aparição na planilha.
+    # (phone_pairs aceita as colunas em texto ou já compactas, em chave Int64)
+    mask_dup = duplicate_rows(*phone_pairs(df, phone_cols), len(df))
+    if reason_col and reason_col in df.columns and mask_dup.any():
+        df.loc[mask_dup, reason_col] = df.loc[mask_dup, reason_col] | MOTIVO_DUPLICADO
+    return pd.Series(mask_dup, index=df.index)
+
+
+# ---------------- (NOVO) limpeza paralela (partição por hash do telefone) ----------------
+# Duplicidade e blocklist só dependem do número: cada par (linha, telefone) vai
+# para o shard hash(telefone) % n, e todas as ocorrências de um número caem no
+# mesmo shard. Dentro do shard, "primeira ocorrência" = MENOR linha do arquivo
+# original (não a primeira do shard), então o resultado é o mesmo da versão serial.
+# Os shards vão para .npy num diretório temporário; os workers abrem com mmap.
+# As listas de filtro (índice compilado/store, também mmap) abrem uma vez por
+# worker, no initializer do pool, e não a cada shard.
+
+LIMPEZA_PARALELA_MIN_ROWS = 500_000
+LIMPEZA_SHARDS_POR_PROCESSO = 2
+LIMPEZA_PROCESSOS_AUTO_MAX = 4
+
+def limpeza_processos(n_rows: int, processos: Optional[int] = None) -> int:
+    """
+    processos=None/0 -> automático: a partir de LIMPEZA_PARALELA_MIN_ROWS linhas,
+    um núcleo a menos que a máquina (fica um livre para a interface), no máximo
+    LIMPEZA_PROCESSOS_AUTO_MAX. Mais que isso só pedindo explicitamente.
+    """
+    if processos:
+        return max(1, int(processos))
+    if n_rows < LIMPEZA_PARALELA_MIN_ROWS:
+        return 1
+    return max(1, min(LIMPEZA_PROCESSOS_AUTO_MAX, (os.cpu_count() or 1) - 1))
+
+def phone_pairs(df: pd.DataFrame, phone_cols: List[str], *, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pares (posição da linha, chave do telefone) dos telefones válidos, na ordem
+    da planilha (linha a linha, coluna a coluna). Telefone válido sem chave
+    (mais de PHONE_KEY_MAX_DIGITS dígitos) ganha chave negativa (< -1) tirada
+    de um hash de 62 bits do texto: a mesma em qualquer bloco/processo, e nunca
+    bate em lista de filtro. `rows` (posições em ordem) restringe às linhas
+    ainda em jogo sem copiar o quadro.
+    """
+    sel = np.arange(len(df), dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+    keys = np.column_stack([phone_keys(df[c])[sel] for c in phone_cols]).ravel()
+    oks = np.column_stack([(~invalid_phone_mask(df[c])).to_numpy()[sel] for c in phone_cols]).ravel()
+    sem_chave = oks & (keys < 0)
+    if sem_chave.any():
+        phones = np.column_stack([_as_text(df[c]).to_numpy(dtype=object)[sel] for c in phone_cols]).ravel()
+        keys[sem_chave] = [-2 - (int.from_bytes(hashlib.blake2b(str(p).encode(), digest_size=8).digest(), "little") >> 2)
+                           for p in phones[sem_chave]]
+    return np.repeat(sel, len(phone_cols))[oks], keys[oks]
+
+def filter_pairs(df: pd.DataFrame, phone_cols: List[str], *, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pares (posição da linha, chave) de TODOS os telefones com chave (>= 0),
+    válidos ou não: a mesma entrada da etapa de filtros serial e da em disco,
+    que testam o phone_keys de cada coluna nas linhas candidatas. (Um número
+    inválido que está na lista também exclui a linha.)
+    """
+    sel = np.arange(len(df), dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+    keys = np.column_stack([phone_keys(df[c])[sel] for c in phone_cols]).ravel()
+    ok = keys >= 0
+    return np.repeat(sel, len(phone_cols))[ok], keys[ok]
+
+# listas de filtro do worker: abertas uma vez por processo (initializer do pool)
+_SHARD_FILTROS: Optional[PhoneIndexSet] = None
+_SHARD_BLOOMS: List[Optional["PhoneBloomFilter"]] = []
+_SHARD_ERROS: List[str] = []
+
+def _limpeza_shard_init(filter_sources: List[Tuple[str, str]], strip55: bool, bloom_fp: Optional[float] = None):
+    """
+    Initializer do pool: abre as listas (mmap) uma vez por worker e guarda as falhas.
+    Com bloom_fp, monta o Bloom de cada lista (o processo principal já deixou o
+    filtro no cache em disco; aqui ele só é lido).
+    """
+    global _SHARD_FILTROS, _SHARD_BLOOMS, _SHARD_ERROS
+    _SHARD_FILTROS, cargas = load_phone_filters(filter_sources, strip55=strip55, max_workers=1)
+    _SHARD_ERROS = [f"{label} ({path}): {err}" for label, path, _, err in cargas if err is not None]
+    _SHARD_BLOOMS = [bloom_for_index(idx, bloom_fp) if bloom_fp else None for _, idx in _SHARD_FILTROS.members]
+
+def _load_shard(path: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+    if path is None:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    data = np.load(path, mmap_mode="r")
+    return np.asarray(data[0]), np.asarray(data[1])
+
+def _limpeza_shard(dup_path: Optional[str], filtro_path: Optional[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Worker: devolve (linhas duplicadas, linhas que bateram em alguma lista,
+    contagens) do shard; contagens = [acertos do Bloom, acertos exatos] por lista.
+    dup_path = pares dos telefones válidos (duplicidade); filtro_path = pares de
+    todos os telefones com chave (filtros). Lista que abriu no processo principal
+    e falhou aqui derruba a execução (RuntimeError): seguir sem ela deixaria
+    passar números bloqueados.
+    """
+    if _SHARD_ERROS:
+        raise RuntimeError("Falha ao abrir lista de filtro no processo de limpeza: " + "; ".join(_SHARD_ERROS))
+    rows, keys = _load_shard(dup_path)
+    # primeira ocorrência = menor linha do número (a do arquivo original)
+    dup_rows = sorted_unique(rows[duplicate_pairs(rows, keys)[0]])
+
+    block_rows = np.array([], dtype=np.int64)
+    contagens = np.zeros((len(_SHARD_FILTROS.members) if _SHARD_FILTROS else 0, 2), dtype=np.int64)
+    if _SHARD_FILTROS:
+        rows, keys = _load_shard(filtro_path)
+        hit = np.zeros(len(keys), dtype=bool)
+        for i, (_, idx) in enumerate(_SHARD_FILTROS.members):
+            h, n_bloom = contains_with_prefilter(idx, _SHARD_BLOOMS[i], keys)
+            contagens[i] = (n_bloom, int(h.sum()))
+            hit |= h
+        block_rows = sorted_unique(rows[hit])
+    return dup_rows, block_rows, contagens
+
+@contextmanager
+def _spawn_main_guard():
+    """
+    Com spawn, cada worker reimporta o __main__ de quem criou o pool. Se quem
+    chamou for a interface (script.py), isso abriria uma janela por processo;
+    enquanto o pool sobe, o __main__ aponta para este módulo (importar não faz nada).
+    """
+    main = sys.modules.get("__main__")
+    this = sys.modules[__name__]
+    if main is None or main is this or getattr(main, "__spec__", None) is not None or this.__spec__ is None:
+        yield
+        return
+    main.__spec__ = this.__spec__
+    try:
+        yield
+    finally:
+        main.__spec__ = None
+
+def _save_shards(tmp_dir: str, prefix: str, rows: np.ndarray, keys: np.ndarray, n_shards: int) -> List[Optional[str]]:
+    """Pares (linha, chave) -> um .npy por shard (hash da chave); None = shard vazio."""
+    shard = (_splitmix64(keys.view(np.uint64)) % np.uint64(n_shards)).astype(np.int64)
+    order = np.argsort(shard, kind="stable")   # estável: cada shard continua em ordem de linha
+    bounds = np.searchsorted(shard[order], np.arange(n_shards + 1))
+    paths: List[Optional[str]] = []
+    for i in range(n_shards):
+        sel = order[bounds[i]:bounds[i + 1]]
+        path = None
+        if len(sel):
+            path = os.path.join(tmp_dir, f"{prefix}_{i:03d}.npy")
+            np.save(path, np.vstack([rows[sel], keys[sel]]))
+        paths.append(path)
+    return paths
+
+def dedup_and_filter_sharded(rows: np.ndarray, keys: np.ndarray, n_rows: int, *,
+                             filter_rows: Optional[np.ndarray] = None, filter_keys: Optional[np.ndarray] = None,
+                             filter_sources: List[Tuple[str, str]], strip55: bool = False,
+                             bloom_fp: Optional[float] = None, processos: int = 2,
+                             cancel: Optional[threading.Event] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Duplicidade (mantém a menor linha de cada número) + filtros, em `processos`
+    processos. (rows, keys) = pares da duplicidade (phone_pairs); (filter_rows,
+    filter_keys) = pares dos filtros (filter_pairs; padrão: os mesmos da
+    duplicidade). bloom_fp liga o pré-filtro Bloom em cada processo.
+    Retorna máscaras (n_rows,) de duplicadas e de linhas que bateram em alguma
+    lista (sem descontar as duplicadas) e, por lista (na ordem do PhoneIndexSet),
+    [acertos do Bloom, acertos exatos] somados de todos os shards.
+    """
+    if filter_rows is None or filter_keys is None:
+        filter_rows, filter_keys = rows, keys
+    n_shards = max(1, processos * LIMPEZA_SHARDS_POR_PROCESSO)
+
+    dup_mask = np.zeros(n_rows, dtype=bool)
+    block_mask = np.zeros(n_rows, dtype=bool)
+    contagens = np.zeros((0, 2), dtype=np.int64)
+    tmp_dir = tempfile.mkdtemp(prefix="b2bsafe_shards_")
+    try:
+        # mesmo hash nos dois conjuntos: o número cai no mesmo shard nos dois
+        shards = [(d, f) for d, f in zip(_save_shards(tmp_dir, "shard", rows, keys, n_shards),
+                                         _save_shards(tmp_dir, "filtro", filter_rows, filter_keys, n_shards))
+                  if d is not None or (f is not None and filter_sources)]
+
+        ctx = multiprocessing.get_context("spawn")
+        with _spawn_main_guard(), ProcessPoolExecutor(max_workers=processos, mp_context=ctx, initializer=_limpeza_shard_init,
+                                                      initargs=(filter_sources, strip55, bloom_fp)) as ex:
+            futs = [ex.submit(_limpeza_shard, d, f) for d, f in shards]
+            try:
+                for fut in as_completed(futs):
+                    check_cancel(cancel)
+                    dup_rows, block_rows, c = fut.result()
+                    dup_mask[dup_rows] = True
+                    block_mask[block_rows] = True
+                    contagens = c if not len(contagens) else contagens + c
+            except BaseException:
+                for f in futs:
+                    f.cancel()
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return dup_mask, block_mask, contagens
+
+
+# ---------------- (NOVO) duplicidade em disco (bases maiores que a RAM) ----------------
+# A base é lida em blocos e nunca fica inteira na memória. O "já vi este número?"
+# fica numa tabela SQLite temporária first_seen(phone PRIMARY KEY, row): como os
+# blocos chegam na ordem do arquivo, um número que já está na tabela apareceu numa
+# linha anterior -> mesma regra "fica a primeira ocorrência" do
+# mark_and_exclude_duplicate_phones.
+
+LIMPEZA_DISCO_MIN_BYTES = 1024 ** 3      # arquivo de entrada a partir de 1 GB
+LIMPEZA_DISCO_MIN_ROWS = 20_000_000      # ou linhas (quando já se sabe, pelo cache Parquet)
+SPILL_SQLITE_CACHE_KB = 256 * 1024
+
+def limpeza_em_disco_auto(path: str, *, min_bytes: int = LIMPEZA_DISCO_MIN_BYTES, min_rows: int = LIMPEZA_DISCO_MIN_ROWS) -> bool:
+    """Decide o modo em disco pelo tamanho do arquivo ou pelo nº de linhas do cache."""
+    try:
+        if os.path.getsize(path) >= min_bytes:
+            return True
+    except OSError:
+        return False
+    cached = cache_lookup(path) if cache_enabled() else None
+    if cached:
+        try:
+            return pq.ParquetFile(cached).metadata.num_rows >= min_rows
+        except Exception:
+            return False
+    return False
+
+class SpillDedup:
+    """first_seen em SQLite: telefone -> primeira linha (linha = posição no arquivo)."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, "first_seen.sqlite")
+        self.con = sqlite3.connect(self.path, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=OFF")
+        self.con.execute("PRAGMA synchronous=OFF")
+        self.con.execute(f"PRAGMA cache_size=-{SPILL_SQLITE_CACHE_KB}")
+        self.con.execute("CREATE TABLE first_seen(phone INTEGER PRIMARY KEY, row INTEGER NOT NULL)")
+        self.con.execute("CREATE TEMP TABLE lote(phone INTEGER PRIMARY KEY, row INTEGER NOT NULL)")
+        self.phones = 0
+
+    def mark(self, rows: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """
+        Pares (linha, chave) de UM bloco, em ordem de linha. Retorna, por par, se o
+        número já tinha aparecido numa linha anterior (deste bloco ou de blocos
+        anteriores). Registra a primeira linha dos números novos.
+        """
+        if not len(keys):
+            return np.zeros(0, dtype=bool)
+        # dentro do bloco: mesma regra da versão serial e dos shards
+        dup, primeiro = duplicate_pairs(rows, keys)
+
+        # entre blocos: números que já estão no first_seen
+        cur = self.con.cursor()
+        cur.execute("DELETE FROM lote")
+        cur.executemany("INSERT INTO lote(phone, row) VALUES (?, ?)", zip(keys[primeiro].tolist(), rows[primeiro].tolist()))
+        vistos = [p for (p,) in cur.execute("SELECT phone FROM lote JOIN first_seen USING (phone)")]
+        cur.execute("INSERT OR IGNORE INTO first_seen(phone, row) SELECT phone, row FROM lote")
+        self.con.commit()
+        self.phones += int(primeiro.sum()) - len(vistos)
+        if vistos:
+            vistos = np.sort(np.array(vistos, dtype=np.int64))
+            at = np.minimum(np.searchsorted(vistos, keys), len(vistos) - 1)
+            dup |= vistos[at] == keys
+        return dup
+
+    @property
+    def nbytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def close(self):
+        self.con.close()
+
+
+# ---------------- (NOVO) histórico de entregas (contatos já entregues) ----------------
+# Telefones e CNPJs que já saíram em "empresas_filtradas" de execuções anteriores,
+# com o dia da entrega. Mesmo formato dos índices de blocklist: segmentos com um
+# array int64 ordenado de chaves (.npy, aberto com mmap) + o dia da entrega em
+# int32 (dias desde 1970-01-01). Cada execução grava um segmento novo, com todas
+# as chaves no mesmo dia (o dia fica só no manifest, sem array). A compactação
+# funde os segmentos num só, com o dia mais recente de cada chave; como cada
+# segmento já vem ordenado, o argsort estável (timsort) só intercala os trechos.
+# Consulta = np.searchsorted em cada segmento: centenas de milhões de entradas
+# custam algumas páginas do mmap por telefone consultado.
+#
+# Chave do CNPJ: -(10**14 + cnpj), negativa para não colidir com a do telefone.
+
+HISTORICO_MANIFEST = "historico.json"
+HISTORICO_FORMAT = 1
+HISTORICO_JANELA_DIAS = 90
+HISTORICO_COMPACT_MAX_SEGMENTS = 8
+HISTORICO_NUNCA = -1
+CNPJ_KEY_BASE = 10 ** 14
+
+def cnpj_keys(values) -> np.ndarray:
+    """CNPJs -> chaves int64 negativas (ver acima); vazio = -1."""
+    norm = normalize_cnpj_series(values)
+    ok = norm.notna().to_numpy()
+    keys = np.full(len(norm), -1, dtype=np.int64)
+    if ok.any():
+        keys[ok] = -(norm[ok].astype("int64").to_numpy(dtype=np.int64) + CNPJ_KEY_BASE)
+    return keys
+
+def dia_numero(dia=None) -> int:
+    """Data (date, datetime, "AAAA-MM-DD" ou None = hoje) -> dias desde 1970-01-01."""
+    if dia is None:
+        dia = datetime.now().date()
+    elif isinstance(dia, datetime):
+        dia = dia.date()
+    return int(np.datetime64(dia, "D").astype(np.int64))
+
+def dia_texto(n: Optional[int]) -> str:
+    return str(np.datetime64(int(n), "D")) if n is not None and n != HISTORICO_NUNCA else "-"
+
+def delivery_keys(df: pd.DataFrame, tel_cols: List[str], col_cnpj: Optional[str] = "Cnpj", *,
+                  rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Chaves (telefones + CNPJ) das linhas entregues (`rows` = posições; None = todas), ordenadas e sem repetição."""
+    sel = slice(None) if rows is None else rows
+    parts = [phone_keys(df[c])[sel] for c in tel_cols]
+    if col_cnpj and col_cnpj in df:
+        parts.append(cnpj_keys(df[col_cnpj])[sel])
+    keys = np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+    return sorted_unique(keys[keys != -1])
+
+class DeliveryHistory:
+    """Diretório do histórico de entregas (historico.json + segmentos .npy)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, HISTORICO_MANIFEST)
+        if not os.path.isfile(self.manifest_path):
+            raise FileNotFoundError(f"Histórico de entregas não encontrado: {directory}")
+
+    @classmethod
+    def create(cls, directory: str) -> "DeliveryHistory":
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, HISTORICO_MANIFEST)
+        if os.path.isfile(manifest_path):
+            raise ValueError(f"Já existe um histórico em {directory}")
+        _write_json_atomic(manifest_path, {
+            "format": HISTORICO_FORMAT,
+            "version": 0,
+            "ultima_entrega": None,
+            "entradas": 0,
+            "segments": [],
+        })
+        return cls(directory)
+
+    @classmethod
+    def open(cls, directory: str) -> "DeliveryHistory":
+        """Abre o histórico da pasta (cria vazio se ainda não existir)."""
+        if os.path.isfile(os.path.join(directory, HISTORICO_MANIFEST)):
+            return cls(directory)
+        return cls.create(directory)
+
+    def read_manifest(self) -> dict:
+        with open(self.manifest_path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def describe(self, manifest: Optional[dict] = None) -> str:
+        m = manifest or self.read_manifest()
+        return (f"v{m['version']} | {m['entradas']} entradas | {len(m['segments'])} segmento(s) | "
+                f"última entrega {dia_texto(m.get('ultima_entrega'))}")
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segments(self, m: dict) -> List[Tuple[np.ndarray, np.ndarray, Optional[int]]]:
+        """(chaves, dias ou None, dia fixo ou None) de cada segmento, em mmap."""
+        out = []
+        for s in m["segments"]:
+            keys = np.load(self._file(s["file"]), mmap_mode="r")
+            dias = np.load(self._file(s["dias"]), mmap_mode="r") if s.get("dias") else None
+            out.append((keys, dias, s.get("dia")))
+        return out
+
+    def last_delivery(self, keys: np.ndarray) -> np.ndarray:
+        """Dia da entrega mais recente de cada chave (HISTORICO_NUNCA se nunca entregue)."""
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.full(len(keys), HISTORICO_NUNCA, dtype=np.int32)
+        pos_ok = np.flatnonzero(keys != -1)
+        if not len(pos_ok):
+            return out
+        # consulta com as chaves ordenadas e sem repetição: o searchsorted anda
+        # pra frente no mmap; o resultado volta pra ordem original pelo argsort
+        order = pos_ok[np.argsort(keys[pos_ok])]
+        k = keys[order]
+        inicio = np.r_[True, k[1:] != k[:-1]]
+        uq = k[inicio]
+        best = np.full(len(uq), HISTORICO_NUNCA, dtype=np.int32)
+        for seg_keys, seg_dias, dia in self._segments(self.read_manifest()):
+            if not len(seg_keys):
+                continue
+            pos = np.minimum(np.searchsorted(seg_keys, uq), len(seg_keys) - 1)
+            hit = np.asarray(seg_keys[pos]) == uq
+            if not hit.any():
+                continue
+            d = np.asarray(seg_dias[pos[hit]]) if seg_dias is not None else np.int32(dia)
+            best[hit] = np.maximum(best[hit], d)
+        out[order] = best[np.cumsum(inicio) - 1]
+        return out
+
+    def delivered_within(self, keys: np.ndarray, janela_dias: int = HISTORICO_JANELA_DIAS, *, hoje=None) -> np.ndarray:
+        """Máscara: chave entregue há no máximo `janela_dias` dias."""
+        last = self.last_delivery(keys)
+        return (last != HISTORICO_NUNCA) & (last >= dia_numero(hoje) - int(janela_dias))
+
+    def record(self, keys: np.ndarray, *, dia=None, origem: str = "") -> dict:
+        """Grava um segmento novo com as chaves entregues no dia (hoje por padrão)."""
+        keys = sorted_unique(np.asarray(keys, dtype=np.int64))
+        keys = keys[keys != -1]
+        n_dia = dia_numero(dia)
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            if not len(keys):
+                return m
+            m["version"] += 1
+            name = f"seg_{m['version']:06d}.npy"
+            _save_keys(keys, self._file(name))
+            m["segments"].append({
+                "file": name,
+                "dias": None,
+                "dia": n_dia,
+                "count": int(len(keys)),
+                "origem": origem,
+                "at": datetime.now().isoformat(timespec="seconds"),
+            })
+            m["entradas"] += int(len(keys))
+            m["ultima_entrega"] = max(m.get("ultima_entrega") or n_dia, n_dia)
+            _write_json_atomic(self.manifest_path, m)
+        return m
+
+    def importar(self, path: str, *, dia=None, strip55: bool = False, progress=None) -> dict:
+        """Registra uma planilha já entregue (coluna de telefone + CNPJ, quando houver)."""
+        cols = list(read_table_header(path, nrows=1).columns)
+        if not cols:
+            raise ValueError("Arquivo sem colunas.")
+        tel_cols = [c for c in cols if "tel" in normalize_col_name(c)] or cols[:1]
+        col_cnpj = next((c for c in cols if "cnpj" in normalize_col_name(c)), None)
+        parts = []
+        for chunk in read_table_chunks(path, usecols=tel_cols + ([col_cnpj] if col_cnpj else []), progress=progress):
+            # campo com vários números ("a; b"): todos contam como entregues
+            for c in tel_cols:
+                phones = split_telefones_long(chunk[c])["phone"]
+                parts.append(phone_keys(normalize_phone_series(phones, strip55=strip55)))
+            if col_cnpj:
+                parts.append(cnpj_keys(chunk[col_cnpj]))
+        keys = sorted_unique(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+        return self.record(keys, dia=dia, origem=os.path.basename(path))
+
+    def needs_compaction(self, manifest: Optional[dict] = None) -> bool:
+        m = manifest or self.read_manifest()
+        return len(m["segments"]) >= HISTORICO_COMPACT_MAX_SEGMENTS
+
+    def compact(self, *, max_idade_dias: Optional[int] = None) -> bool:
+        """
+        Funde os segmentos num só (dia mais recente por chave). Com max_idade_dias,
+        descarta o que foi entregue há mais tempo que isso. Segmentos gravados
+        durante a compactação ficam para a próxima.
+        """
+        with _store_lock(self.directory):
+            snap = self.read_manifest()
+        if not snap["segments"] or (len(snap["segments"]) == 1 and max_idade_dias is None):
+            return False
+
+        segs = self._segments(snap)
+        keys = np.concatenate([np.asarray(k) for k, _, _ in segs])
+        dias = np.concatenate([np.asarray(d) if d is not None else np.full(len(k), dia, dtype=np.int32)
+                               for k, d, dia in segs])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        dias = dias[order]
+        del order, segs
+        if len(keys):
+            grupos = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            dias = np.maximum.reduceat(dias, grupos)
+            keys = keys[grupos]
+        if max_idade_dias is not None:
+            keep = dias >= dia_numero() - int(max_idade_dias)
+            keys = keys[keep]
+            dias = dias[keep]
+
+        name = f"seg_{snap['version']:06d}_c.npy"
+        name_dias = f"seg_{snap['version']:06d}_c_dias.npy"
+        _save_keys(keys, self._file(name))
+        _save_array(dias.astype(np.int32, copy=False), self._file(name_dias))
+
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            merged = len(snap["segments"])
+            if m["segments"][:merged] != snap["segments"]:
+                safe_remove_file(self._file(name))
+                safe_remove_file(self._file(name_dias))
+                return False
+            novo = {
+                "file": name,
+                "dias": name_dias,
+                "dia": None,
+                "count": int(len(keys)),
+                "origem": "compactação",
+                "at": datetime.now().isoformat(timespec="seconds"),
+            }
+            m["segments"] = [novo] + m["segments"][merged:]
+            m["entradas"] = sum(s["count"] for s in m["segments"])
+            _write_json_atomic(self.manifest_path, m)
+        self._remove_orphans()
+        return True
+
+    def _remove_orphans(self):
+        """Apaga .npy que o manifest não referencia mais (em uso/mmap no Windows: fica pra depois)."""
+        with _store_lock(self.directory):
+            m = self.read_manifest()
+            used = {s["file"] for s in m["segments"]} | {s["dias"] for s in m["segments"] if s.get("dias")}
+            for f in os.listdir(self.directory):
+                if f.endswith(".npy") and f not in used:
+                    safe_remove_file(self._file(f))
+
+def historico_hit_mask(hist: DeliveryHistory, df: pd.DataFrame, tel_cols: List[str], *,
+                       rows: Optional[np.ndarray] = None, janela_dias: int = HISTORICO_JANELA_DIAS,
+                       cnpj: bool = True) -> np.ndarray:
+    """Linhas (`rows` = posições; None = todas) com algum telefone (ou o CNPJ, se cnpj=True) entregue dentro da janela."""
+    sel = slice(None) if rows is None else rows
+    n = len(df) if rows is None else len(rows)
+    if not n:
+        return np.zeros(0, dtype=bool)
+    parts = [phone_keys(df[c])[sel] for c in tel_cols]
+    if cnpj and "Cnpj" in df:
+        parts.append(cnpj_keys(df["Cnpj"])[sel])
+    # uma consulta só para todas as colunas (as chaves se repetem muito entre elas)
+    within = hist.delivered_within(np.concatenate(parts), janela_dias)
+    return within.reshape(len(parts), n).any(axis=0)
+
+
+# ---------------- (NOVO) validação WhatsApp (phonenumbers) ----------------
+try:
+    import phonenumbers
+    from phonenumbers import PhoneNumberType
+except Exception:
+    phonenumbers = None
+    PhoneNumberType = None
+
+def _digits_only(s: str) -> str:
+    return re.sub(r"\D", "", str(s or ""))
+
+def _apply_has55_rule(digits: str, has55: str) -> str:
+    # Se usuário disse "Sim", removemos 55 somente se estiver no começo.
+    if has55 == "Sim" and digits.startswith("55"):
+        return digits[2:]
+    return digits
+
+def _ensure_add55(digits_local: str) -> str:
+    # Adiciona 55 se estiver ausente e parecer BR (10 ou 11 dígitos)
+    if digits_local.startswith("55"):
+        return digits_local
+    if len(digits_local) in (10, 11):
+        return "55" + digits_local
+    return digits_local
+
+def _ensure_add9_local(digits_local: str, has9: str) -> str:
+    # has9 == "Não" => se for 10 dígitos (DD + 8), vira 11 (DD + 9 + 8)
+    if has9 == "Não" and len(digits_local) == 10:
+        ddd = digits_local[:2]
+        rest = digits_local[2:]
+        return ddd + "9" + rest
+    return digits_local
+
+def _format_e164(digits: str) -> str:
+    # Retorna no formato +5511999999999 quando possível
+    digits = _digits_only(digits)
+    if digits.startswith("55") and len(digits) in (12, 13):
+        return "+" + digits
+    if len(digits) in (10, 11):
+        return "+55" + digits
+    if digits.startswith("+"):
+        return digits
+    return "+" + digits if digits else ""
+
+def _phonenumbers_validate_br(digits_e164: str):
+    """
+    Retorna: (is_valid, is_mobile, tipo_str, motivo)
+    """
+    if not phonenumbers:
+        return (False, False, "Indisponível", "Biblioteca phonenumbers não instalada")
+    if not digits_e164:
+        return (False, False, "Inválido", "Telefone vazio")
+    try:
+        # parse aceita +E164
+        p = phonenumbers.parse(digits_e164, None)
+        if not phonenumbers.is_valid_number(p):
+            return (False, False, "Inválido", "Número inválido (phonenumbers)")
+        t = phonenumbers.number_type(p)
+        # Para evitar falsos negativos: BR às vezes vem como FIXED_LINE_OR_MOBILE
+        is_mobile = t in (PhoneNumberType.MOBILE, PhoneNumberType.FIXED_LINE_OR_MOBILE)
+        tipo_str = "Móvel" if is_mobile else "Não móvel"
+        return (True, is_mobile, tipo_str, "" if is_mobile else "Não é móvel")
+    except Exception as e:
+        return (False, False, "Inválido", f"Erro ao validar: {e}")
+
+def _wpp_processa_telefone(raw_tel: str, has55: str, has9: str) -> dict:
+    digits = _digits_only(raw_tel)
+    motivo = ""
+
+    if not digits:
+        return {
+            "Telefone_original": raw_tel,
+            "Telefone_normalizado": "",
+            "Telefone_E164": "",
+            "Valido": "Não",
+            "Tipo": "Inválido",
+            "Motivo": "Telefone vazio"
+        }
+
+    # 1) remove 55 se usuário disse que já tem
+    local = _apply_has55_rule(digits, has55)
+
+    # 2) adiciona 9 se necessário
+    local = _ensure_add9_local(local, has9)
+
+    # 3) garante 55 (para E.164) — aqui sempre padronizamos em +55...
+    full = _ensure_add55(local)
+    e164 = _format_e164(full)
+
+    # 4) valida e filtra móvel
+    is_valid, is_mobile, tipo_str, motivo_v = _phonenumbers_validate_br(e164)
+    if not is_valid:
+        motivo = motivo_v or "Inválido"
+    elif not is_mobile:
+        motivo = motivo_v or "Não é móvel"
+
+    return {
+        "Telefone_original": raw_tel,
+        "Telefone_normalizado": full,
+        "Telefone_E164": e164,
+        "Valido": "Sim" if (is_valid and is_mobile) else "Não",
+        "Tipo": tipo_str,
+        "Motivo": motivo
+    }
+
+# colunas do resultado da limpeza WhatsApp (mesmas chaves de _wpp_processa_telefone)
+WPP_OUT_COLS = ["Telefone_original", "Telefone_normalizado", "Telefone_E164", "Valido", "Tipo", "Motivo"]
+
+# ---------------- (NOVO) gráficos da limpeza (Agg, fora da thread do Tk) ----------------
+# Uma Figure persistente com as barras já criadas (todos os motivos, todas as UFs);
+# a cada etapa só mudam as alturas. O desenho é feito num buffer Agg na thread do
+# job e sai como PNG: a interface só troca a imagem, e o mesmo PNG é o que vai pro
+# disco ao lado das planilhas (sem desenhar de novo).
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+except Exception:
+    Figure = None
+    FigureCanvasAgg = None
+
+GRAFICOS_PNG = "graficos_limpeza.png"
+GRAFICOS_INTERVALO_S = 1.0   # no máximo 1 desenho intermediário por segundo (o final sempre sai)
+
+class LimpezaCharts:
+    """
+    Gráficos da aba limpeza: excluídos por motivo e distribuição por UF (via DDD).
+    feed() recebe os histogramas parciais (bincount dos bits de motivo / códigos de UF)
+    e, respeitando min_interval_s, desenha e entrega o PNG em on_png(bytes).
+    """
+
+    def __init__(self, *, figsize=(7.5, 5.2), dpi: int = 100, min_interval_s: float = GRAFICOS_INTERVALO_S):
+        if Figure is None:
+            raise RuntimeError("matplotlib não está instalado (necessário para os gráficos).")
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.min_interval_s = min_interval_s
+        self.png: Optional[bytes] = None
+        self._last = 0.0
+
+        self.motivos = list(MOTIVO_LABELS.values())
+        self.ufs = UF_CODES[1:] + UF_CODES[:1]   # "??" por último
+        self._uf_order = np.array([UF_CODES.index(uf) for uf in self.ufs])
+
+        ax1 = self.fig.add_subplot(211)
+        self.bars_motivo = ax1.bar(self.motivos, np.zeros(len(self.motivos)))
+        ax1.set_title("Excluídos por motivo")
+        ax1.set_ylabel("Qtd")
+        ax1.tick_params(axis="x", rotation=25, labelsize=8)
+        self.vazio_motivo = ax1.text(0.5, 0.5, "Sem exclusões (motivos)", ha="center", va="center",
+                                     transform=ax1.transAxes)
+
+        ax2 = self.fig.add_subplot(212)
+        self.bars_uf = ax2.bar(self.ufs, np.zeros(len(self.ufs)))
+        ax2.set_title("Distribuição por UF (via DDD)")
+        ax2.set_ylabel("Qtd")
+        ax2.tick_params(axis="x", rotation=0, labelsize=7)
+        self.vazio_uf = ax2.text(0.5, 0.5, "Sem dados de UF", ha="center", va="center",
+                                 transform=ax2.transAxes)
+        self.axes = (ax1, ax2)
+        self.fig.tight_layout()
+
+    @staticmethod
+    def _set_heights(ax, bars, values, vazio):
+        for rect, v in zip(bars, values):
+            rect.set_height(v)
+        top = max(values) if len(values) else 0
+        ax.set_ylim(0, max(top, 1) * 1.1)
+        vazio.set_visible(top == 0)
+
+    def update(self, motivo_hist: np.ndarray, uf_hist: np.ndarray):
+        """Alturas novas a partir dos histogramas (mesmas contagens de reason_counts / uf_counts)."""
+        reasons = motivo_counts_from_bincount(motivo_hist)
+        self._set_heights(self.axes[0], self.bars_motivo, [reasons.get(lbl, 0) for lbl in self.motivos],
+                          self.vazio_motivo)
+        uf = np.zeros(len(UF_CODES), dtype=np.int64)
+        uf[:len(uf_hist)] = uf_hist
+        self._set_heights(self.axes[1], self.bars_uf, uf[self._uf_order].tolist(), self.vazio_uf)
+
+    def render(self) -> bytes:
+        """Desenha no buffer Agg e devolve o PNG (guardado em self.png)."""
+        buf = io.BytesIO()
+        self.canvas.print_png(buf)
+        self.png = buf.getvalue()
+        self._last = time.perf_counter()
+        return self.png
+
+    def feed(self, motivo_hist: np.ndarray, uf_hist: np.ndarray, *, on_png=None, final: bool = False):
+        """Atualiza as barras; desenha se for o final ou se já passou min_interval_s do último desenho."""
+        self.update(motivo_hist, uf_hist)
+        if final or (on_png is not None and time.perf_counter() - self._last >= self.min_interval_s):
+            png = self.render()
+            if on_png is not None:
+                on_png(png)
+
+    def save_png(self, path: str) -> str:
+        """Grava o último PNG desenhado (não desenha de novo)."""
+        if self.png is None:
+            self.render()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.png)
+        os.replace(tmp, path)
+        return path
+
+def _abre_graficos(graficos, log) -> Optional[LimpezaCharts]:
+    """graficos = True (cria), um LimpezaCharts (reaproveita) ou False/None (sem gráficos)."""
+    if isinstance(graficos, LimpezaCharts):
+        return graficos
+    if not graficos:
+        return None
+    if Figure is None:
+        log("ℹ️ matplotlib não instalado: gráficos não serão gerados.")
+        return None
+    return LimpezaCharts()
+
+# ---------------- (NOVO) métricas da execução (JSON/Parquet ao lado das saídas) ----------------
+# Cada pipeline marca o fim das suas etapas na mesma passada que gera as saídas:
+# metricas.etapa(nome, removidas=...) guarda o tempo de parede e de CPU desde a
+# marca anterior (etapas com o mesmo nome, ex. bloco a bloco, são somadas). No fim
+# sai metricas_<pipeline>.json (+ .parquet com uma linha por etapa, se houver pyarrow),
+# para comparar vazão entre versões e máquinas.
+METRICAS_FORMAT = 1
+
+def _cpu_s() -> float:
+    """CPU do processo + filhos já encerrados (no Windows os filhos não entram)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo (MB; na interface, desde que o programa abriu)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class _PMC(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                           [(f, ctypes.c_size_t) for f in ("PeakWorkingSetSize", "WorkingSetSize",
+                                                           "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                                                           "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage",
+                                                           "PagefileUsage", "PeakPagefileUsage")]
+            pmc = _PMC()
+            pmc.cb = ctypes.sizeof(pmc)
+            if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                        ctypes.byref(pmc), pmc.cb):
+                return round(pmc.PeakWorkingSetSize / 1024 ** 2, 1)
+        except Exception:
+            pass
+    return None
+
+def _motor_versao() -> Optional[str]:
+    """Impressão digital do b2bsafe_engine.py (identifica a versão nas métricas)."""
+    try:
+        with open(os.path.abspath(__file__), "rb") as fh:
+            return hashlib.sha1(fh.read()).hexdigest()[:12]
+    except OSError:
+        return None
+
+class RunMetrics:
+    """
+    Métricas de uma execução. etapa() fecha a etapa corrente; salvar() grava o
+    JSON (e o Parquet) na pasta de saída e devolve o caminho do JSON.
+    """
+
+    def __init__(self, pipeline: str, **parametros):
+        self.pipeline = pipeline
+        self.parametros = parametros
+        self.inicio = datetime.now()
+        self.etapas: Dict[str, dict] = {}
+        self._t0 = self._t = time.perf_counter()
+        self._c0 = self._c = _cpu_s()
+
+    def etapa(self, nome: str, **contagens):
+        t, c = time.perf_counter(), _cpu_s()
+        e = self.etapas.setdefault(nome, {"etapa": nome, "parede_s": 0.0, "cpu_s": 0.0})
+        e["parede_s"] += t - self._t
+        e["cpu_s"] += c - self._c
+        for k, v in contagens.items():
+            e[k] = e.get(k, 0) + v
+        self._t, self._c = t, c
+
+    def resumo(self, *, linhas_entrada: int, linhas_saida: int, removidas: Optional[Dict[str, int]] = None,
+               reason_counts: Optional[Dict[str, int]] = None, uf_counts: Optional[Dict[str, int]] = None,
+               saidas: Optional[List[str]] = None, **extra) -> dict:
+        parede = time.perf_counter() - self._t0
+        etapas = []
+        for e in self.etapas.values():
+            linhas = e.get("linhas", linhas_entrada)
+            etapas.append({**e, "parede_s": round(e["parede_s"], 4), "cpu_s": round(e["cpu_s"], 4),
+                           "linhas_por_s": round(linhas / e["parede_s"], 1) if linhas and e["parede_s"] > 0 else None})
+        return {
+            "formato": METRICAS_FORMAT,
+            "pipeline": self.pipeline,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "fim": datetime.now().isoformat(timespec="seconds"),
+            "motor": _motor_versao(),
+            "maquina": {
+                "host": platform.node(),
+                "sistema": platform.platform(),
+                "cpus": os.cpu_count(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "pyarrow": pa.__version__ if pa is not None else None,
+            },
+            "parametros": self.parametros,
+            "linhas_entrada": int(linhas_entrada),
+            "linhas_saida": int(linhas_saida),
+            "removidas": removidas or {},
+            "motivos": reason_counts or {},
+            "ufs": uf_counts or {},
+            "parede_s": round(parede, 4),
+            "cpu_s": round(_cpu_s() - self._c0, 4),
+            "linhas_por_s": round(linhas_entrada / parede, 1) if parede > 0 else None,
+            "pico_rss_mb": peak_rss_mb(),
+            "etapas": etapas,
+            "saidas": [os.path.basename(p) for p in (saidas or []) if p],
+            **extra,
+        }
+
+    def salvar(self, out_dir: str, **resumo) -> str:
+        data = self.resumo(**resumo)
+        base = os.path.join(out_dir, f"metricas_{self.pipeline}")
+        _write_json_atomic(base + ".json", data)
+        if pq is not None:
+            # uma linha por etapa, com os totais da execução repetidos (fácil de empilhar execuções)
+            run = {k: data[k] for k in ("pipeline", "inicio", "motor", "linhas_entrada", "linhas_saida",
+                                        "parede_s", "cpu_s", "linhas_por_s", "pico_rss_mb")}
+            run["host"] = data["maquina"]["host"]
+            rows = pd.DataFrame([{**{f"execucao_{k}": v for k, v in run.items()}, **e} for e in data["etapas"]])
+            tmp = f"{base}.parquet.{os.getpid()}.tmp"
+            pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), tmp)
+            os.replace(tmp, base + ".parquet")
+        return base + ".json"
+
+def _salva_metricas(metricas: RunMetrics, out_dir: str, log, **resumo) -> Optional[str]:
+    """Grava as métricas; falha aqui só vira aviso no log (as saídas já estão prontas)."""
+    try:
+        path = metricas.salvar(out_dir, **resumo)
+    except Exception as e:
+        log(f"⚠️ Não foi possível gravar as métricas: {e}")
+        return None
+    log(f"📈 Métricas: {path}")
+    return path
+
+
+
+# =======================================================================
+#           PIPELINES (SEM INTERFACE)
+# =======================================================================
+# Cada pipeline recebe só argumentos simples e dois callbacks opcionais:
+#   log(msg)        -> uma linha de log (a interface joga no Text da aba)
+#   progress(pct)   -> 0..100 (a interface joga na barra de progresso)
+# Erro de validação (coluna faltando, opção inválida...) sobe como ValueError
+# com a mensagem pronta para o usuário.
+# cancel (threading.Event, opcional): quando ligado, o pipeline para no próximo
+# ponto de checagem (cada atualização de progresso) com JobCancelled.
+
+CLEAN_MODES = ["Simples", "Lemit", "Callix", "Tallos"]
+FILTER_LABELS = ["Blocklist C6", "Não Perturbe 1", "Não Perturbe 2", "Não Perturbe 3", "Não Perturbe 4"]
+ROBO_MODOS = ["Lemit", "Simples"]
+ROBO_INTERVALO_S = 6 * 60
+ROBO_LINHAS_POR_PARTE = 5000
+RESULT_EXTS = (".xlsx", ".xls", ".csv", ".txt")
+
+class JobCancelled(Exception):
+    """Execução interrompida pelo usuário (cancel.set())."""
+
+def check_cancel(cancel: Optional[threading.Event]):
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled("Cancelado pelo usuário.")
+
+def _cancellable(progress, cancel: Optional[threading.Event]):
+    """Envolve progress(pct) para checar o cancelamento a cada atualização."""
+    if cancel is None:
+        return progress
+
+    def _progress(pct):
+        check_cancel(cancel)
+        progress(pct)
+    return _progress
+
+def _log_print(msg: str):
+    print(msg, flush=True)
+
+def _no_progress(pct: float):
+    pass
+
+def log_filter_load(log, label: str, path: str, info: Optional[dict], err: Optional[Exception], *, strip55: bool = False):
+    if err is not None:
+        if isinstance(err, FileNotFoundError):
+            log(f"⚠️ {label}: {err}")
+        else:
+            log(f"❌ {label}: erro ao ler: {err}")
+        return
+    log(f"✅ {label}: {info['descricao']} | {info['mb']:.1f} MB | {info['ms']:.0f} ms")
+    if info["strip55"] != bool(strip55):
+        log(f"⚠️ {label}: store compilado com strip55={info['strip55']} (limpeza usa {bool(strip55)})")
+
+def _registra_versoes_filtros(metricas: "RunMetrics", cargas):
+    """Versão/watermark de cada store usado vão para os parâmetros da execução (sidecar de métricas)."""
+    metricas.parametros["filtros_versao"] = {
+        label: {"version": info["version"], "watermark": info.get("watermark")}
+        for label, _, info, err in cargas if err is None and info["tipo"] == "store"
+    }
+
+def build_blooms(filtros: List[Tuple[str, object]], fp_rate: float, log) -> List[PhoneBloomFilter]:
+    """Bloom de cada lista (label, índice), com tamanho, k e tempo no log."""
+    blooms = []
+    for label, idx in filtros:
+        t0 = time.perf_counter()
+        b = bloom_for_index(idx, fp_rate)
+        log(f"🌸 Bloom {label}: {b.nbytes / 1024 ** 2:.1f} MB "
+            f"(índice exato {idx.nbytes / 1024 ** 2:.1f} MB) | k={b.k} | {(time.perf_counter() - t0) * 1000:.0f} ms")
+        blooms.append(b)
+    return blooms
+
+def log_bloom_fp(log, filtros: List[Tuple[str, object]], bloom_hits, exact_hits, tested: int, fp_rate: float):
+    """FP medido de cada Bloom: acertos do Bloom que o índice exato descartou / negativos testados."""
+    for (label, _), n_bloom, n_exato in zip(filtros, bloom_hits, exact_hits):
+        negativos = tested - n_exato
+        fp_medido = (n_bloom - n_exato) / negativos if negativos else 0.0
+        log(f"🌸 Bloom {label}: FP medido {fp_medido:.3%} "
+            f"(alvo {fp_rate:.3%}) | {n_bloom} candidatos → {n_exato} confirmados")
+
+def _historico_exclui(hist: DeliveryHistory, df: pd.DataFrame, tel_cols: List[str], excl: np.ndarray, *,
+                      janela_dias: int, cnpj: bool) -> np.ndarray:
+    """Máscara (tamanho de df) das linhas ainda não excluídas que já foram entregues na janela."""
+    cand = np.flatnonzero(~excl)
+    out = np.zeros(len(df), dtype=bool)
+    out[cand[historico_hit_mask(hist, df, tel_cols, rows=cand, janela_dias=janela_dias, cnpj=cnpj)]] = True
+    return out
+
+def _registra_historico(hist: DeliveryHistory, keys: np.ndarray, origem: str, log):
+    t0 = time.perf_counter()
+    m = hist.record(keys, origem=origem)
+    log(f"🗂️ Histórico: {len(keys)} telefones/CNPJs entregues registrados em {(time.perf_counter() - t0) * 1000:.0f} ms | {hist.describe(m)}")
+    if hist.needs_compaction(m):
+        t0 = time.perf_counter()
+        hist.compact()
+        log(f"🧱 Histórico compactado em {time.perf_counter() - t0:.1f}s: {hist.describe()}")
+
+def _run_limpeza_em_disco(in_path: str, *, col_razao: str, col_tel: str, col_email: str, col_cnpj: str,
+                          out_dir: str, clean_mode: str, strip55: bool, add9: bool, add55: bool,
+                          tel_cols: List[str], cnpj_check: bool, filter_paths, bloom: bool, bloom_fp: float,
+                          hist: Optional[DeliveryHistory], historico_dias: int, historico_cnpj: bool,
+                          historico_registrar: bool, charts: Optional[LimpezaCharts], on_chart,
+                          metricas: RunMetrics, log, progress) -> dict:
+    """
+    Mesma limpeza do run_limpeza, bloco a bloco: cada bloco é montado, validado,
+    deduplicado contra o SpillDedup (SQLite em disco), filtrado e já gravado nos
+    dois XLSX. A memória fica na ordem de um bloco (READ_CHUNK_ROWS linhas).
+    """
+    log("1) Modo em disco: lendo em blocos; duplicidade num índice SQLite temporário...")
+
+    # filtros primeiro: são consultados bloco a bloco (índices já ficam em mmap)
+    log("   Carregando filtros (Blocklist + Não Perturbe 1-4)...")
+    t0_filtros = time.perf_counter()
+    filtro_set, cargas = load_phone_filters(filter_paths or [], strip55=strip55)
+    for label, path, info, err in cargas:
+        log_filter_load(log, label, path, info, err, strip55=strip55)
+    _registra_versoes_filtros(metricas, cargas)
+    if cargas:
+        log(f"⏱️ Filtros carregados em paralelo: {(time.perf_counter() - t0_filtros) * 1000:.0f} ms no total")
+    filtros = filtro_set.members
+    blooms = build_blooms(filtros, bloom_fp, log) if bloom else [None] * len(filtros)
+    bloom_hits = [0] * len(filtros)
+    exact_hits = [0] * len(filtros)
+    tested = 0
+    if not filtros:
+        log("ℹ️ Nenhuma lista selecionada. (Nenhum filtro aplicado)")
+    metricas.etapa("carga_filtros")
+
+    cols_out_filtradas = ["Razao Social", *tel_cols, "Cnpj", "E-mail"]
+    cols_out_excluidas = ["Razao Social", *tel_cols, "Cnpj", "E-mail", "Motivo Exclusao"]
+    out_filtradas = os.path.join(out_dir, "empresas_filtradas.xlsx")
+    out_excluidas = os.path.join(out_dir, "empresas_excluidas.xlsx")
+    safe_remove_file(out_filtradas)
+    safe_remove_file(out_excluidas)
+
+    removidas = {"telefone_invalido": 0, "cnpj_invalido": 0, "duplicado": 0, "blocklist": 0, "historico": 0}
+    entregues = []
+    motivo_hist = np.zeros(MOTIVO_BINS, dtype=np.int64)
+    uf_hist = np.zeros(len(UF_CODES), dtype=np.int64)
+    offset = 0
+
+    tmp_dir = tempfile.mkdtemp(prefix="b2bsafe_spill_")
+    spill = SpillDedup(tmp_dir)
+    w_ok = StreamingExcelWriter(out_filtradas)
+    w_excl = StreamingExcelWriter(out_excluidas)
+    completed = False
+    try:
+        chunks = read_table_chunks(in_path, usecols=[col_razao, col_tel, col_email, col_cnpj],
+                                   progress=lambda lidos, total: progress(5 + int(90 * lidos / max(total, 1))))
+        for df_raw in chunks:
+            n = len(df_raw)
+            metricas.etapa("leitura", linhas=n)
+            base = pd.DataFrame(index=df_raw.index)
+            base["Razao Social"] = compact_text(df_raw[col_razao])
+            base["E-mail"] = compact_text(df_raw[col_email])
+            base["Cnpj"] = encode_cnpj_column(df_raw[col_cnpj])
+            if clean_mode == "Lemit":
+                base["Razao Social"] = compact_text(clean_razao_social_series(base["Razao Social"]))
+            tel_wide = phone_columns_from_field(df_raw[col_tel], n=len(tel_cols), strip55=strip55, add9=add9, add55=add55)
+            for c in tel_cols:
+                base[c] = tel_wide[c]
+            del tel_wide, df_raw
+            metricas.etapa("montagem", linhas=n)
+
+            motivo = np.zeros(n, dtype=np.uint8)
+            invalid = np.ones(n, dtype=bool)
+            for c in tel_cols:
+                invalid &= invalid_phone_mask(base[c]).to_numpy()
+            motivo[invalid] |= MOTIVO_TEL_INVALIDO
+            excl = invalid.copy()
+            removidas["telefone_invalido"] += int(invalid.sum())
+            metricas.etapa("telefone_invalido", linhas=n, removidas=int(invalid.sum()))
+            if cnpj_check:
+                cnpj_invalid = (base["Cnpj"].notna() & ~cnpj_valid_mask(base["Cnpj"])).to_numpy()
+                motivo[cnpj_invalid] |= MOTIVO_CNPJ_INVALIDO
+                excl |= cnpj_invalid
+                removidas["cnpj_invalido"] += int(cnpj_invalid.sum())
+                metricas.etapa("cnpj_invalido", linhas=n, removidas=int(cnpj_invalid.sum()))
+
+            # duplicidade: posição global da linha = offset + posição no bloco
+            rows, keys = phone_pairs(base, tel_cols, rows=np.flatnonzero(~excl))
+            dup = np.zeros(n, dtype=bool)
+            dup[rows[spill.mark(rows + offset, keys)]] = True
+            motivo[dup] |= MOTIVO_DUPLICADO
+            excl |= dup
+            removidas["duplicado"] += int(dup.sum())
+            metricas.etapa("duplicado", linhas=n, removidas=int(dup.sum()))
+
+            if filtros:
+                cand = np.flatnonzero(~excl)
+                hit = np.zeros(len(cand), dtype=bool)
+                for c in tel_cols:
+                    k = phone_keys(base[c])[cand]
+                    tested += int((k >= 0).sum())
+                    for i, (_, idx) in enumerate(filtros):
+                        h, n_bloom = contains_with_prefilter(idx, blooms[i], k)
+                        bloom_hits[i] += n_bloom
+                        exact_hits[i] += int(h.sum())
+                        hit |= h
+                blocked = cand[hit]
+                motivo[blocked] |= MOTIVO_BLOCKLIST
+                excl[blocked] = True
+                removidas["blocklist"] += len(blocked)
+                metricas.etapa("blocklist", linhas=n, removidas=len(blocked))
+
+            if hist:
+                ja_entregue = _historico_exclui(hist, base, tel_cols, excl, janela_dias=historico_dias, cnpj=historico_cnpj)
+                motivo[ja_entregue] |= MOTIVO_HISTORICO
+                excl |= ja_entregue
+                removidas["historico"] += int(ja_entregue.sum())
+                metricas.etapa("historico", linhas=n, removidas=int(ja_entregue.sum()))
+
+            uf_hist += np.bincount(uf_codes_from_phones(base["Telefone1"], base.get("Telefone2"))[~excl],
+                                   minlength=len(UF_CODES))
+            motivo_hist += np.bincount(motivo[excl], minlength=MOTIVO_BINS)
+
+            if (~excl).any():
+                ficaram = np.flatnonzero(~excl)
+                write_working_frame(w_ok, base, cols_out_filtradas, rows=ficaram)
+                if hist and historico_registrar:
+                    entregues.append(delivery_keys(base, tel_cols, rows=ficaram))
+            if excl.any():
+                write_working_frame(w_excl, base, cols_out_excluidas, rows=np.flatnonzero(excl), motivo=motivo)
+            metricas.etapa("gravacao", linhas=n)
+            offset += n
+            log(f"   … {offset} linhas | {spill.phones} telefones no índice ({spill.nbytes / 1024 ** 2:.0f} MB em disco)")
+            if charts is not None:
+                charts.feed(motivo_hist, uf_hist, on_png=on_chart)
+                metricas.etapa("graficos", linhas=0)
+
+        if bloom and filtros:
+            log_bloom_fp(log, filtros, bloom_hits, exact_hits, tested, bloom_fp)
+
+        # arquivo sem nenhuma linha de um dos lados: ainda sai com o cabeçalho
+        if w_ok.columns is None:
+            w_ok.write(pd.DataFrame(columns=cols_out_filtradas))
+        if w_excl.columns is None:
+            w_excl.write(pd.DataFrame(columns=cols_out_excluidas))
+        w_ok.close()
+        w_excl.close()
+        completed = True
+        metricas.etapa("gravacao", linhas=0)
+        if hist and historico_registrar:
+            _registra_historico(hist, sorted_unique(np.concatenate(entregues)) if entregues else np.array([], dtype=np.int64),
+                                os.path.basename(in_path), log)
+            metricas.etapa("historico_registro", linhas=offset - int(motivo_hist.sum()))
+        out_graficos = None
+        if charts is not None:
+            charts.feed(motivo_hist, uf_hist, on_png=on_chart, final=True)
+            out_graficos = charts.save_png(os.path.join(out_dir, GRAFICOS_PNG))
+            metricas.etapa("graficos", linhas=0)
+    finally:
+        spill.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not completed:
+            w_ok.wb.close()
+            w_excl.wb.close()
+    progress(100)
+
+    excluidas = int(motivo_hist.sum())
+    log(f"⚠️ Removidas por telefone inválido: {removidas['telefone_invalido']}")
+    if cnpj_check:
+        log(f"⚠️ Removidas por CNPJ inválido: {removidas['cnpj_invalido']}")
+    log(f"⚠️ Removidas por duplicidade: {removidas['duplicado']}")
+    if filtros:
+        log(f"⚠️ Removidas por Blocklist/Não Perturbe: {removidas['blocklist']}")
+    if hist:
+        log(f"⚠️ Removidas por histórico de entregas: {removidas['historico']}")
+    log(f"✅ Ficaram: {offset - excluidas}")
+    log(f"✅ Excluídas: {excluidas}")
+    log("\n🎉 Processo concluído!")
+    log(f"📄 Gerado: {out_filtradas}")
+    log(f"📄 Gerado: {out_excluidas}")
+    if out_graficos:
+        log(f"📊 Gerado: {out_graficos}")
+
+    res = {
+        "out_filtradas": out_filtradas,
+        "out_excluidas": out_excluidas,
+        "out_graficos": out_graficos,
+        "linhas": offset,
+        "ficaram": offset - excluidas,
+        "excluidas": excluidas,
+        "removidas": removidas,
+        "reason_counts": motivo_counts_from_bincount(motivo_hist),
+        "uf_counts": uf_counts_from_bincount(uf_hist),
+        "filtros": [(label, path, info) for label, path, info, err in cargas if err is None],
+    }
+    res["out_metricas"] = _salva_metricas(
+        metricas, out_dir, log, linhas_entrada=offset, linhas_saida=res["ficaram"], removidas=removidas,
+        reason_counts=res["reason_counts"], uf_counts=res["uf_counts"],
+        saidas=[out_filtradas, out_excluidas, out_graficos])
+    return res
+
+def run_limpeza(
+    in_path: str,
+    *,
+    col_razao: str,
+    col_tel: str,
+    col_email: str,
+    col_cnpj: str,
+    out_dir: Optional[str] = None,
+    clean_mode: str = "Simples",
+    strip55: bool = False,
+    add9: bool = False,
+    add55: bool = False,
+    max_tel: int = 2,
+    cnpj_check: bool = True,
+    filter_paths: Optional[List[Tuple[str, str]]] = None,
+    bloom: bool = False,
+    bloom_fp: float = BLOOM_DEFAULT_FP,
+    processos: Optional[int] = None,
+    em_disco: Optional[bool] = None,
+    disco_min_bytes: int = LIMPEZA_DISCO_MIN_BYTES,
+    disco_min_linhas: int = LIMPEZA_DISCO_MIN_ROWS,
+    historico: Optional[str] = None,
+    historico_dias: int = HISTORICO_JANELA_DIAS,
+    historico_cnpj: bool = True,
+    historico_registrar: bool = True,
+    graficos=True,
+    on_chart=None,
+    log=_log_print,
+    progress=_no_progress,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    Limpeza de dados (mesma regra da aba):
+    - Colunas escolhidas (Razão, Telefones, Email, CNPJ)
+    - Modo de limpeza em Razão Social
+    - Divide telefones em Telefone1..N (max_tel)
+    - Remove inválidos, CNPJ inválido (opcional), telefones duplicados
+    - Aplica filtros (filter_paths = [(rótulo, caminho)]; caminho vazio é ignorado)
+    - Duplicidade + filtros em vários processos quando processos > 1
+      (None/0 = automático, ver limpeza_processos)
+    - em_disco=True lê/grava em blocos e faz a duplicidade num SQLite temporário
+      (base maior que a RAM); None = automático (limpeza_em_disco_auto): entra
+      em disco a partir de disco_min_bytes no arquivo ou disco_min_linhas linhas
+    - historico = pasta do histórico de entregas: exclui telefones (e CNPJs, se
+      historico_cnpj) entregues nos últimos historico_dias dias e, com
+      historico_registrar, grava as linhas filtradas como entregues hoje
+    - graficos = True / LimpezaCharts (reaproveitado entre execuções) / False:
+      as barras são atualizadas a cada etapa e on_chart(png) recebe o PNG
+      desenhado nesta thread (no máximo 1 por GRAFICOS_INTERVALO_S + o final)
+    - Gera 2 arquivos: empresas_filtradas.xlsx + empresas_excluidas.xlsx
+      (+ graficos_limpeza.png, o mesmo PNG final entregue ao on_chart)
+
+    Retorna dict com os caminhos gerados, as contagens e os dados dos gráficos
+    (reason_counts / uf_counts).
+    """
+    progress = _cancellable(progress, cancel)
+    in_path = (in_path or "").strip()
+    if not in_path:
+        raise ValueError('Selecione o arquivo "empresas bruto".')
+    if not (col_razao and col_tel and col_email and col_cnpj):
+        raise ValueError("Selecione as colunas: Razão Social, Telefones, E-mail e CNPJ.")
+    if bloom and not 0 < bloom_fp < 1:
+        raise ValueError("Taxa de falso positivo do Bloom inválida (use algo como 0.01).")
+    if historico_dias < 0:
+        raise ValueError("Janela do histórico inválida (dias >= 0).")
+
+    out_dir = (out_dir or "").strip() or os.path.dirname(in_path)
+    os.makedirs(out_dir, exist_ok=True)
+    n_tel = max(1, int(max_tel))
+    tel_cols = [f"Telefone{i}" for i in range(1, n_tel + 1)]
+
+    log("=== Automação: Limpeza de dados ===")
+    log(f"📄 Arquivo: {in_path}")
+    log(f"📁 Saída: {out_dir}")
+    log(f"🧩 Colunas: Razão='{col_razao}' | Telefones='{col_tel}' | Email='{col_email}' | CNPJ='{col_cnpj}'\n")
+    hist = DeliveryHistory.open(historico.strip()) if (historico or "").strip() else None
+    if hist:
+        log(f"🗂️ Histórico de entregas: {hist.describe()} | janela {historico_dias} dias")
+    charts = _abre_graficos(graficos, log)
+    progress(5)
+
+    if em_disco is None:
+        em_disco = limpeza_em_disco_auto(in_path, min_bytes=disco_min_bytes, min_rows=disco_min_linhas)
+    metricas = RunMetrics("limpeza", arquivo=in_path, modo=clean_mode, max_tel=n_tel, cnpj_check=cnpj_check,
+                          filtros=[label for label, path in (filter_paths or []) if (path or "").strip()],
+                          bloom=bloom, em_disco=bool(em_disco), historico=bool(hist), historico_dias=historico_dias)
+    if em_disco:
+        return _run_limpeza_em_disco(
+            in_path, col_razao=col_razao, col_tel=col_tel, col_email=col_email, col_cnpj=col_cnpj,
+            out_dir=out_dir, clean_mode=clean_mode, strip55=strip55, add9=add9, add55=add55,
+            tel_cols=tel_cols, cnpj_check=cnpj_check, filter_paths=filter_paths, bloom=bloom, bloom_fp=bloom_fp,
+            hist=hist, historico_dias=historico_dias, historico_cnpj=historico_cnpj,
+            historico_registrar=historico_registrar, charts=charts, on_chart=on_chart,
+            metricas=metricas, log=log, progress=progress)
+
+    log("1) Lendo arquivo base (em blocos, só as colunas selecionadas)...")
+    df_raw = read_table_columns(in_path, [col_razao, col_tel, col_email, col_cnpj],
+                                progress=lambda lidos, total: progress(5 + int(10 * lidos / max(total, 1))))
+    log(f"✅ Lido: {len(df_raw)} linhas / {len(df_raw.columns)} colunas selecionadas.")
+    mb_lido = frame_mb(df_raw)
+    metricas.etapa("leitura")
+    progress(15)
+
+    # Monta base só com as colunas escolhidas, já compacta (ver quadro de trabalho compacto):
+    # texto livre em string[pyarrow], CNPJ em Int64; telefones entram na etapa 4
+    log("2) Montando base com as colunas selecionadas...")
+    df_base = pd.DataFrame(index=df_raw.index)
+    df_base["Razao Social"] = compact_text(df_raw[col_razao])
+    df_base["E-mail"] = compact_text(df_raw[col_email])
+    df_base["Cnpj"] = encode_cnpj_column(df_raw[col_cnpj])
+    telefones = df_raw[col_tel]
+    del df_raw
+
+    # Modo de limpeza
+    log(f"3) Aplicando modo de limpeza na Razão Social: {clean_mode}...")
+    if clean_mode == "Lemit":
+        df_base["Razao Social"] = compact_text(clean_razao_social_series(df_base["Razao Social"]))
+    metricas.etapa("montagem")
+    progress(30)
+
+    # Telefones (cada coluna vira a chave Int64 do número; texto só na gravação)
+    log("4) Separando e normalizando telefones...")
+    tel_wide = phone_columns_from_field(telefones, n=n_tel, strip55=strip55, add9=add9, add55=add55)
+    for c in tel_cols:
+        df_base[c] = tel_wide[c]
+    del tel_wide, telefones
+    log(f"🧠 Memória: {mb_lido:.1f} MB lidos (texto) → {frame_mb(df_base):.1f} MB no quadro de trabalho compacto")
+    metricas.etapa("telefones")
+    progress(45)
+
+    # Daqui pra frente o df_base não é mais copiado nem filtrado: cada etapa só
+    # liga bits no motivo (uint8 por linha) e posições na máscara de exclusão;
+    # as saídas são gravadas direto das posições (write_working_frame).
+    n_rows = len(df_base)
+    motivo = np.zeros(n_rows, dtype=np.uint8)
+    mask_excluir = np.zeros(n_rows, dtype=bool)
+
+    # UF para análise/gráfico: uma passada só na base inteira
+    uf_codes = uf_codes_from_phones(df_base["Telefone1"], df_base.get("Telefone2"))
+
+    def _graficos_parciais():
+        # agregados do gráfico no meio do caminho: excluídas até aqui / o que ainda fica
+        if charts is not None:
+            charts.feed(np.bincount(motivo[mask_excluir], minlength=MOTIVO_BINS),
+                        np.bincount(uf_codes[~mask_excluir], minlength=len(UF_CODES)), on_png=on_chart)
+            metricas.etapa("graficos", linhas=0)
+
+    # 5) Telefones inválidos
+    log("5) Removendo linhas sem nenhum telefone válido...")
+    invalid_both = np.ones(n_rows, dtype=bool)
+    for c in tel_cols:
+        invalid_both &= invalid_phone_mask(df_base[c]).to_numpy()
+    removidas_invalid = int(invalid_both.sum())
+    mask_excluir |= invalid_both
+    motivo[invalid_both] |= MOTIVO_TEL_INVALIDO
+    log(f"⚠️ Removidas por telefone inválido: {removidas_invalid}")
+    metricas.etapa("telefone_invalido", removidas=removidas_invalid)
+
+    # 5b) CNPJ inválido (dígitos verificadores); CNPJ vazio não conta
+    removidas_cnpj = 0
+    if cnpj_check:
+        log("5b) Validando dígitos verificadores do CNPJ...")
+        cnpj_invalid = (df_base["Cnpj"].notna() & ~cnpj_valid_mask(df_base["Cnpj"])).to_numpy()
+        removidas_cnpj = int(cnpj_invalid.sum())
+        mask_excluir |= cnpj_invalid
+        motivo[cnpj_invalid] |= MOTIVO_CNPJ_INVALIDO
+        log(f"⚠️ Removidas por CNPJ inválido: {removidas_cnpj}")
+        metricas.etapa("cnpj_invalido", removidas=removidas_cnpj)
+    _graficos_parciais()
+    progress(55)
+
+    n_proc = limpeza_processos(n_rows, processos)
+    if n_proc > 1:
+        # 6-8) Duplicados + filtros em vários processos (partição por hash do telefone).
+        # As listas abrem antes aqui mesmo: compila o cache que os workers vão abrir com mmap.
+        log(f"6) Duplicados + filtros em {n_proc} processos (partição por hash do telefone)...")
+        t0_filtros = time.perf_counter()
+        filtro_set, cargas = load_phone_filters(filter_paths or [], strip55=strip55)
+        for label, path, info, err in cargas:
+            log_filter_load(log, label, path, info, err, strip55=strip55)
+        _registra_versoes_filtros(metricas, cargas)
+        if cargas:
+            log(f"⏱️ Filtros carregados em paralelo: {(time.perf_counter() - t0_filtros) * 1000:.0f} ms no total")
+        if bloom and filtro_set:
+            # monta (e deixa no cache em disco) o Bloom de cada lista; os workers só leem
+            build_blooms(filtro_set.members, bloom_fp, log)
+        metricas.etapa("carga_filtros")
+        progress(60)
+
+        # duplicidade: só telefones válidos; filtros: todo telefone com chave
+        # (mesma entrada das etapas 6 e 8 da versão serial)
+        candidatas = np.flatnonzero(~mask_excluir)
+        rows, keys = phone_pairs(df_base, tel_cols, rows=candidatas)
+        sources = [(label, path) for label, path, info, err in cargas if err is None and info["telefones"]]
+        f_rows, f_keys = filter_pairs(df_base, tel_cols, rows=candidatas) if sources else (rows[:0], keys[:0])
+        del candidatas
+        t0 = time.perf_counter()
+        n_testados = len(f_keys)
+        dup_mask, block_mask, contagens = dedup_and_filter_sharded(
+            rows, keys, n_rows, filter_rows=f_rows, filter_keys=f_keys, filter_sources=sources, strip55=strip55,
+            bloom_fp=bloom_fp if bloom else None, processos=n_proc, cancel=cancel)
+        del rows, keys, f_rows, f_keys
+        if bloom and len(contagens):
+            log_bloom_fp(log, filtro_set.members, contagens[:, 0], contagens[:, 1], n_testados, bloom_fp)
+        # blocklist só conta nas linhas que sobraram da duplicidade (igual à versão serial)
+        block_mask &= ~dup_mask
+        removidas_dup = int(dup_mask.sum())
+        removidas_filtros = int(block_mask.sum())
+        mask_excluir |= dup_mask | block_mask
+        motivo[dup_mask] |= MOTIVO_DUPLICADO
+        motivo[block_mask] |= MOTIVO_BLOCKLIST
+        log(f"⚠️ Removidas por duplicidade: {removidas_dup}")
+        if filtro_set:
+            log(f"⚠️ Removidas por Blocklist/Não Perturbe: {removidas_filtros}")
+        else:
+            log("ℹ️ Nenhuma lista selecionada. (Nenhum filtro aplicado)")
+        log(f"⏱️ Processos: {(time.perf_counter() - t0) * 1000:.0f} ms")
+        metricas.etapa("duplicado_blocklist_paralelo", removidas=removidas_dup + removidas_filtros, processos=n_proc)
+        _graficos_parciais()
+    else:
+        # 6) Duplicados (após inválidos, para não “poluir” contagem)
+        log("6) Removendo telefones duplicados (mantém apenas 1 ocorrência)...")
+        # Só marca duplicados nas linhas ainda não excluídas por inválido
+        dup_mask = duplicate_rows(*phone_pairs(df_base, tel_cols, rows=np.flatnonzero(~mask_excluir)), n_rows)
+        removidas_dup = int(dup_mask.sum())
+        mask_excluir |= dup_mask
+        motivo[dup_mask] |= MOTIVO_DUPLICADO
+        log(f"⚠️ Removidas por duplicidade: {removidas_dup}")
+        metricas.etapa("duplicado", removidas=removidas_dup)
+        _graficos_parciais()
+        progress(60)
+
+        # 7) Carrega filtros (Blocklist + Não Perturbe)
+        log("\n7) Carregando filtros (Blocklist + Não Perturbe 1-4)...")
+        t0_filtros = time.perf_counter()
+        filtro_set, cargas = load_phone_filters(filter_paths or [], strip55=strip55)
+        for label, path, info, err in cargas:
+            log_filter_load(log, label, path, info, err, strip55=strip55)
+        _registra_versoes_filtros(metricas, cargas)
+        if cargas:
+            log(f"⏱️ Filtros carregados em paralelo: {(time.perf_counter() - t0_filtros) * 1000:.0f} ms no total")
+        metricas.etapa("carga_filtros")
+        progress(70)
+
+        # 8) Aplica filtros por telefone (somente em linhas ainda válidas)
+        log("8) Aplicando filtros por telefone...")
+        removidas_filtros = 0
+        if filtro_set:
+            filtros = filtro_set.members
+            blooms = build_blooms(filtros, bloom_fp, log) if bloom else [None] * len(filtros)
+            bloom_hits = [0] * len(filtros)
+            exact_hits = [0] * len(filtros)
+            tested = 0
+
+            candidate = np.flatnonzero(~mask_excluir)
+            in_filters = np.zeros(len(candidate), dtype=bool)
+            for c in tel_cols:
+                keys = phone_keys(df_base[c])[candidate]
+                tested += int((keys >= 0).sum())
+                for i, (label, idx) in enumerate(filtros):
+                    hit, n_bloom = contains_with_prefilter(idx, blooms[i], keys)
+                    bloom_hits[i] += n_bloom
+                    exact_hits[i] += int(hit.sum())
+                    in_filters |= hit
+
+            if bloom:
+                log_bloom_fp(log, filtros, bloom_hits, exact_hits, tested, bloom_fp)
+            rows_filter = candidate[in_filters]
+            removidas_filtros = len(rows_filter)
+            mask_excluir[rows_filter] = True
+            motivo[rows_filter] |= MOTIVO_BLOCKLIST
+            log(f"⚠️ Removidas por Blocklist/Não Perturbe: {removidas_filtros}")
+            metricas.etapa("blocklist", removidas=removidas_filtros)
+            _graficos_parciais()
+        else:
+            log("ℹ️ Nenhuma lista selecionada. (Nenhum filtro aplicado)")
+
+    # 8b) Histórico de entregas (contatos já entregues dentro da janela)
+    removidas_hist = 0
+    if hist:
+        log(f"8b) Excluindo contatos entregues nos últimos {historico_dias} dias (histórico)...")
+        t0 = time.perf_counter()
+        ja_entregue = _historico_exclui(hist, df_base, tel_cols, mask_excluir,
+                                        janela_dias=historico_dias, cnpj=historico_cnpj)
+        removidas_hist = int(ja_entregue.sum())
+        mask_excluir |= ja_entregue
+        motivo[ja_entregue] |= MOTIVO_HISTORICO
+        log(f"⚠️ Removidas por histórico de entregas: {removidas_hist} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        metricas.etapa("historico", removidas=removidas_hist)
+    progress(82)
+
+    # Separa finais (só as posições; as linhas saem do df_base na gravação)
+    rows_ficaram = np.flatnonzero(~mask_excluir)
+    rows_excluidas = np.flatnonzero(mask_excluir)
+    motivo_hist = np.bincount(motivo[rows_excluidas], minlength=MOTIVO_BINS)
+    uf_hist = np.bincount(uf_codes[rows_ficaram], minlength=len(UF_CODES))
+    if charts is not None:
+        charts.feed(motivo_hist, uf_hist, on_png=on_chart, final=True)
+        metricas.etapa("graficos", linhas=0)
+
+    log("\n9) Preparando arquivos finais (2 resultados)...")
+    log(f"✅ Ficaram: {len(rows_ficaram)}")
+    log(f"✅ Excluídas: {len(rows_excluidas)}")
+
+    # Colunas de saída
+    cols_out_filtradas = ["Razao Social", *tel_cols, "Cnpj", "E-mail"]
+    cols_out_excluidas = ["Razao Social", *tel_cols, "Cnpj", "E-mail", "Motivo Exclusao"]
+
+    out_filtradas = os.path.join(out_dir, "empresas_filtradas.xlsx")
+    out_excluidas = os.path.join(out_dir, "empresas_excluidas.xlsx")
+
+    safe_remove_file(out_filtradas)
+    safe_remove_file(out_excluidas)
+
+    # texto (telefone, CNPJ, motivo) só aqui, bloco a bloco
+    with StreamingExcelWriter(out_filtradas) as w:
+        write_working_frame(w, df_base, cols_out_filtradas, rows=rows_ficaram)
+    with StreamingExcelWriter(out_excluidas) as w:
+        write_working_frame(w, df_base, cols_out_excluidas, rows=rows_excluidas, motivo=motivo)
+    metricas.etapa("gravacao")
+    if hist and historico_registrar:
+        _registra_historico(hist, delivery_keys(df_base, tel_cols, rows=rows_ficaram), os.path.basename(in_path), log)
+        metricas.etapa("historico_registro", linhas=len(rows_ficaram))
+    # o PNG do disco é o mesmo bytes já desenhado no feed final
+    out_graficos = charts.save_png(os.path.join(out_dir, GRAFICOS_PNG)) if charts is not None else None
+    progress(100)
+
+    log("\n🎉 Processo concluído!")
+    log(f"📄 Gerado: {out_filtradas}")
+    log(f"📄 Gerado: {out_excluidas}")
+    if out_graficos:
+        log(f"📊 Gerado: {out_graficos}")
+
+    res = {
+        "out_filtradas": out_filtradas,
+        "out_excluidas": out_excluidas,
+        "out_graficos": out_graficos,
+        "linhas": n_rows,
+        "ficaram": len(rows_ficaram),
+        "excluidas": len(rows_excluidas),
+        "removidas": {
+            "telefone_invalido": removidas_invalid,
+            "cnpj_invalido": removidas_cnpj,
+            "duplicado": removidas_dup,
+            "blocklist": removidas_filtros,
+            "historico": removidas_hist,
+        },
+        # Excluídos por motivo (contagem direto nos bits)
+        "reason_counts": motivo_counts_from_bincount(motivo_hist),
+        # Distribuição por UF usando DDD (da base FILTRADA)
+        "uf_counts": uf_counts_from_bincount(uf_hist),
+        "filtros": [(label, path, info) for label, path, info, err in cargas if err is None],
+    }
+    res["out_metricas"] = _salva_metricas(
+        metricas, out_dir, log, linhas_entrada=n_rows, linhas_saida=res["ficaram"], removidas=res["removidas"],
+        reason_counts=res["reason_counts"], uf_counts=res["uf_counts"],
+        saidas=[out_filtradas, out_excluidas, out_graficos])
+    return res
+
+def run_limpeza_wpp(
+    in_path: str,
+    *,
+    col_tel: str,
+    out_dir: Optional[str] = None,
+    has55: bool = False,
+    has9: bool = True,
+    log=_log_print,
+    progress=_no_progress,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    Limpeza WhatsApp: normaliza (55 / dígito 9), valida com phonenumbers e
+    separa só os móveis. Gera whatsapp_validos.xlsx e whatsapp_excluidos.xlsx.
+    """
+    progress = _cancellable(progress, cancel)
+    in_path = (in_path or "").strip()
+    if not in_path:
+        raise ValueError("Selecione a planilha.")
+    if not col_tel:
+        raise ValueError("Selecione a coluna de telefone (use Escanear colunas).")
+
+    out_dir = (out_dir or "").strip() or os.path.dirname(in_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # a regra por telefone ainda fala "Sim"/"Não" (mesmas respostas da aba)
+    has55_txt = "Sim" if has55 else "Não"
+    has9_txt = "Sim" if has9 else "Não"
+
+    log("=== Limpeza WhatsApp ===")
+    log(f"📄 Arquivo: {in_path}")
+    log(f"📌 Coluna telefone: {col_tel}")
+    log(f"❓ Números têm 55? {has55_txt} (Se Sim: remove 55 no início)")
+    log(f"❓ Números têm dígito 9? {has9_txt} (Se Não: adiciona 9 em DD+8)")
+    if not phonenumbers:
+        log("⚠️ Biblioteca 'phonenumbers' não está instalada. A validação ficará indisponível.")
+        log("   Instale com: pip install phonenumbers\n")
+    progress(10)
+
+    if col_tel not in read_table_header(in_path).columns:
+        raise ValueError(f"Coluna '{col_tel}' não existe no arquivo.")
+    metricas = RunMetrics("wpp", arquivo=in_path, has55=has55, has9=has9, phonenumbers=bool(phonenumbers))
+
+    out_valid = os.path.join(out_dir, "whatsapp_validos.xlsx")
+    out_excl = os.path.join(out_dir, "whatsapp_excluidos.xlsx")
+    safe_remove_file(out_valid)
+    safe_remove_file(out_excl)
+
+    # Processa em blocos (só a coluna de telefone é lida do arquivo); cada bloco
+    # já sai nos dois XLSX, então a memória fica na ordem de um bloco
+    linhas = validos = excluidos = 0
+    motivos: Dict[str, int] = {}
+    with StreamingExcelWriter(out_valid) as w_ok, StreamingExcelWriter(out_excl) as w_excl:
+        for chunk in read_table_chunks(in_path, usecols=[col_tel],
+                                       progress=lambda lidos, total: progress(10 + int(80 * lidos / max(total, 1)))):
+            metricas.etapa("leitura", linhas=len(chunk))
+            df_out = pd.DataFrame([_wpp_processa_telefone(raw_tel, has55_txt, has9_txt)
+                                   for raw_tel in chunk[col_tel].astype(str).tolist()], columns=WPP_OUT_COLS)
+            metricas.etapa("validacao", linhas=len(chunk))
+
+            ok = (df_out["Valido"] == "Sim").to_numpy()
+            df_excluidos = df_out[~ok]
+            if ok.any():
+                w_ok.write(df_out[ok])
+            if len(df_excluidos):
+                w_excl.write(df_excluidos)
+            for k, v in df_excluidos["Motivo"].replace("", MOTIVO_SEM).value_counts().items():
+                motivos[str(k)] = motivos.get(str(k), 0) + int(v)
+            linhas += len(df_out)
+            validos += int(ok.sum())
+            excluidos += len(df_excluidos)
+            metricas.etapa("gravacao", linhas=len(chunk), removidas=len(df_excluidos))
+
+        # arquivo sem nenhuma linha: ainda sai com o cabeçalho
+        for w in (w_ok, w_excl):
+            if w.columns is None:
+                w.write(pd.DataFrame(columns=WPP_OUT_COLS))
+    metricas.etapa("gravacao", linhas=0)
+    progress(100)
+
+    log("🎉 Concluído!")
+    log(f"✅ Válidos (móvel + válido): {validos} → {out_valid}")
+    log(f"✅ Excluídos: {excluidos} → {out_excl}")
+
+    return {
+        "out_validos": out_valid,
+        "out_excluidos": out_excl,
+        "validos": validos,
+        "excluidos": excluidos,
+        "out_metricas": _salva_metricas(metricas, out_dir, log, linhas_entrada=linhas, linhas_saida=validos,
+                                        removidas={"invalido_ou_nao_movel": excluidos},
+                                        reason_counts=motivos, saidas=[out_valid, out_excl]),
+    }
+
+def _union_headers(files: List[str]) -> List[str]:
+    """União das colunas na ordem em que aparecem (mesmo resultado do pd.concat)."""
+    cols: List[str] = []
+    seen = set()
+    for f in files:
+        for c in read_table_header(f, nrows=1).columns:
+            if c not in seen:
+                seen.add(c)
+                cols.append(c)
+    return cols
+
+def run_manipulacao(
+    files: List[str],
+    out_dir: str,
+    *,
+    modo: str = "juntar",
+    linhas_por_planilha: Optional[int] = None,
+    log=_log_print,
+    progress=_no_progress,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    Junta várias planilhas em uma só (modo "juntar") ou junta e separa em
+    partes de linhas_por_planilha linhas (modo "separar").
+
+    As planilhas são lidas em blocos e escritas em streaming: nada é
+    concatenado em memória. Colunas = união na ordem de aparição.
+    """
+    progress = _cancellable(progress, cancel)
+    if not files:
+        raise ValueError("Selecione as planilhas primeiro.")
+    out_dir = (out_dir or "").strip()
+    if not out_dir:
+        raise ValueError("Selecione a pasta de saída.")
+    if modo not in ("juntar", "separar"):
+        raise ValueError(f"Modo inválido: {modo}")
+    if modo == "separar" and (linhas_por_planilha is None or int(linhas_por_planilha) <= 0):
+        raise ValueError("Quantidade de linhas por planilha inválida.")
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    log("=== Manipulação de planilhas ===")
+    log(f"Modo: {modo}")
+    log(f"Arquivos: {len(files)}")
+    log(f"Saída: {out_dir}\n")
+
+    metricas = RunMetrics("manipulacao", modo=modo, arquivos=list(files), linhas_por_planilha=linhas_por_planilha)
+    cols = _union_headers(files)
+    outputs: List[str] = []
+    total = 0
+    metricas.etapa("cabecalhos", linhas=0)
+
+    if modo == "juntar":
+        out_path = os.path.join(out_dir, "planilhas_juntas.xlsx")
+        safe_remove_file(out_path)
+        log("1) Lendo e salvando planilha única...")
+        with StreamingExcelWriter(out_path) as w:
+            for i, f in enumerate(files):
+                log(f"→ Lendo: {f}")
+                for chunk in read_table_chunks(f):
+                    check_cancel(cancel)
+                    metricas.etapa("leitura", linhas=len(chunk))
+                    w.write(chunk.reindex(columns=cols))
+                    total += len(chunk)
+                    metricas.etapa("gravacao", linhas=len(chunk))
+                progress(100 * (i + 1) / len(files))
+            if w.columns is None:
+                w.write(pd.DataFrame(columns=cols))
+        metricas.etapa("gravacao", linhas=0)
+        outputs.append(out_path)
+        log(f"✅ Total combinado: {total} linhas.")
+        log(f"✅ Gerado: {out_path}")
+        return {"modo": modo, "linhas": total, "outputs": outputs,
+                "out_metricas": _salva_metricas(metricas, out_dir, log, linhas_entrada=total, linhas_saida=total,
+                                                saidas=outputs)}
+
+    # separar: um writer por parte; a parte fecha quando chega no limite
+    chunk_size = int(linhas_por_planilha)
+    log(f"1) Lendo e separando em partes de {chunk_size} linhas...")
+    writer: Optional[StreamingExcelWriter] = None
+    try:
+        for i, f in enumerate(files):
+            log(f"→ Lendo: {f}")
+            for chunk in read_table_chunks(f):
+                check_cancel(cancel)
+                metricas.etapa("leitura", linhas=len(chunk))
+                chunk = chunk.reindex(columns=cols)
+                pos = 0
+                while pos < len(chunk):
+                    if writer is None:
+                        out_path = os.path.join(out_dir, f"separado_part{len(outputs) + 1}.xlsx")
+                        safe_remove_file(out_path)
+                        writer = StreamingExcelWriter(out_path)
+                        outputs.append(out_path)
+                    take = min(chunk_size - writer.rows, len(chunk) - pos)
+                    writer.write(chunk.iloc[pos:pos + take])
+                    pos += take
+                    total += take
+                    if writer.rows >= chunk_size:
+                        writer.close()
+                        log(f"✅ Parte {len(outputs)}: {writer.path} ({writer.rows} linhas)")
+                        writer = None
+                metricas.etapa("gravacao", linhas=len(chunk))
+            progress(100 * (i + 1) / len(files))
+        if writer is not None:
+            writer.close()
+            log(f"✅ Parte {len(outputs)}: {writer.path} ({writer.rows} linhas)")
+            writer = None
+        metricas.etapa("gravacao", linhas=0)
+    finally:
+        if writer is not None:
+            writer.wb.close()
+
+    log(f"✅ Total combinado: {total} linhas → {len(outputs)} arquivo(s).")
+    return {"modo": modo, "linhas": total, "outputs": outputs,
+            "out_metricas": _salva_metricas(metricas, out_dir, log, linhas_entrada=total, linhas_saida=total,
+                                            saidas=outputs, partes=len(outputs))}
+
+def _result_files(resultado_dir: str) -> List[str]:
+    out = []
+    for f in os.listdir(resultado_dir):
+        full = os.path.join(resultado_dir, f)
+        if os.path.isfile(full) and full.lower().endswith(RESULT_EXTS):
+            out.append(full)
+    return out
+
+def run_robo_c6(
+    arquivos: List[str],
+    bat_path: str,
+    resultado_dir: str,
+    *,
+    modo: str,
+    intervalo_s: float = ROBO_INTERVALO_S,
+    wait=None,
+    log=_log_print,
+    progress=_no_progress,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """
+    Robô C6: copia cada planilha para a pasta do .BAT, executa o .BAT, espera
+    intervalo_s entre arquivos (wait(segundos); padrão: cancel.wait, que acorda
+    na hora se o job for cancelado), junta os resultados e mantém só
+    "Novo cliente" (sem "Nao disponivel").
+
+    Retorna dict com status:
+      "ok"             -> outputs gerados
+      "sem_resultados" -> nenhum arquivo na pasta de resultados
+      "sem_leitura"    -> nenhum resultado pôde ser lido
+      "vazio"          -> nenhuma linha sobrou após o filtro
+    """
+    progress = _cancellable(progress, cancel)
+    if wait is None:
+        wait = cancel.wait if cancel is not None else time.sleep
+    if not arquivos:
+        raise ValueError("Selecione as planilhas de entrada primeiro.")
+    bat_path = (bat_path or "").strip()
+    if not bat_path or not os.path.isfile(bat_path):
+        raise ValueError("Selecione um arquivo .BAT válido.")
+    resultado_dir = (resultado_dir or "").strip()
+    if not resultado_dir or not os.path.isdir(resultado_dir):
+        raise ValueError("Selecione uma pasta de resultados válida do .BAT.")
+    if modo not in ROBO_MODOS:
+        raise ValueError("Selecione se o arquivo é para Lemit ou Simples.")
+
+    bat_dir = os.path.dirname(bat_path)
+    log("=== Robô C6 iniciado ===")
+    log(f"Arquivos selecionados: {len(arquivos)}")
+    log(f"Caminho do .BAT: {bat_path}")
+    log(f"Pasta de resultados do .BAT: {resultado_dir}")
+    log(f"Modo de tratamento final: {modo}\n")
+
+    total_arquivos = len(arquivos)
+    metricas = RunMetrics("robo", modo=modo, arquivos=list(arquivos), bat=bat_path, intervalo_s=intervalo_s)
+
+    def _metricas(status: str, linhas_entrada: int = 0, linhas_saida: int = 0, outputs=(), **removidas):
+        # o sidecar sai em todos os finais (inclusive sem resultados), na pasta de resultados
+        return _salva_metricas(metricas, resultado_dir, log, linhas_entrada=linhas_entrada, linhas_saida=linhas_saida,
+                               removidas=removidas, saidas=list(outputs), status=status,
+                               arquivos_processados=metricas.etapas.get("bat", {}).get("arquivos", 0))
+
+    log("Limpando pasta de resultados antes de iniciar...")
+    for full in _result_files(resultado_dir):
+        safe_remove_file(full)
+    log("Pasta de resultados limpa.\n")
+    metricas.etapa("limpeza_resultados", linhas=0)
+
+    for idx, arquivo in enumerate(arquivos, start=1):
+        progress((idx - 1) / total_arquivos * 40)
+
+        log(f"[{idx}/{total_arquivos}] Preparando arquivo: {arquivo}")
+        try:
+            dest_path = os.path.join(bat_dir, os.path.basename(arquivo))
+            shutil.copy2(arquivo, dest_path)
+            log(f"→ Copiado para pasta do .BAT: {dest_path}")
+            metricas.etapa("copia", linhas=0)
+        except Exception as e:
+            log(f"❌ Erro ao copiar arquivo para pasta do .BAT: {e}")
+            continue
+
+        try:
+            log("→ Executando .BAT...")
+            proc = subprocess.Popen(
+                bat_path,
+                cwd=bat_dir,
+                stdin=subprocess.PIPE,
+                shell=True
+            )
+            proc.communicate(input=b"\n")
+            log("→ Execução do .BAT concluída.")
+            metricas.etapa("bat", linhas=0, arquivos=1)
+        except Exception as e:
+            log(f"❌ Erro ao executar .BAT: {e}")
+            continue
+
+        if idx < total_arquivos:
+            log(f"⏱ Aguardando {intervalo_s / 60:g} minutos antes do próximo arquivo...")
+            wait(intervalo_s)
+            check_cancel(cancel)
+            log("✔ Intervalo concluído.\n")
+            metricas.etapa("espera", linhas=0)
+        else:
+            log("Último arquivo processado.\n")
+
+        progress(idx / total_arquivos * 60)
+
+    log("Lendo arquivos de resultados gerados pelo .BAT...")
+    result_files = _result_files(resultado_dir)
+    if not result_files:
+        log("⚠️ Nenhum arquivo de resultado encontrado na pasta informada.")
+        progress(100)
+        return {"status": "sem_resultados", "outputs": [], "out_metricas": _metricas("sem_resultados")}
+
+    log(f"Encontrados {len(result_files)} arquivo(s) de resultado.")
+    dfs = []
+    for fpath in result_files:
+        try:
+            log(f"Lendo resultado: {fpath}")
+            dfs.append(read_table(fpath))
+        except Exception as e:
+            log(f"❌ Erro ao ler resultado {fpath}: {e}")
+
+    if not dfs:
+        log("⚠️ Não foi possível ler nenhum arquivo de resultado.")
+        progress(100)
+        return {"status": "sem_leitura", "outputs": [], "out_metricas": _metricas("sem_leitura")}
+
+    df_total = pd.concat(dfs, ignore_index=True)
+    log(f"Total de linhas combinadas (antes da filtragem): {len(df_total)}")
+    metricas.etapa("leitura_resultados", linhas=len(df_total))
+
+    log("Aplicando filtro: remover linhas com 'Nao disponivel' e manter apenas 'Novo cliente'...")
+    df_str = df_total.astype(str)
+
+    mask_nao_disponivel = df_str.apply(
+        lambda col: col.str.contains("Nao disponivel", case=False, na=False)
+    ).any(axis=1)
+
+    mask_novo_cliente = df_str.apply(
+        lambda col: col.str.contains("Novo cliente", case=False, na=False)
+    ).any(axis=1)
+
+    antes = len(df_total)
+    df_filtrado = df_total[~mask_nao_disponivel & mask_novo_cliente].copy()
+    removidas = antes - len(df_filtrado)
+    log(f"Linhas removidas pelo filtro: {removidas}")
+    log(f"Linhas finais após filtro: {len(df_filtrado)}")
+    metricas.etapa("filtro", linhas=antes, removidas=removidas)
+
+    if df_filtrado.empty:
+        log("⚠️ Nenhuma linha restante após aplicar o filtro.")
+        progress(100)
+        return {"status": "vazio", "outputs": [], "out_metricas": _metricas("vazio", antes, 0, filtro=removidas)}
+
+    progress(80)
+
+    outputs = []
+    if modo == "Lemit":
+        log("Modo Lemit: gerando 1 planilha única com o resultado final...")
+        out_path = os.path.join(resultado_dir, "robo_c6_final_LEMIT.xlsx")
+        save_to_excel(df_filtrado, out_path)
+        outputs.append(out_path)
+        log(f"✅ Arquivo final gerado: {out_path}")
+    else:
+        total = len(df_filtrado)
+        chunk_size = ROBO_LINHAS_POR_PARTE
+        log(f"Modo Simples: separando resultado em planilhas de {chunk_size} linhas...")
+        parts = math.ceil(total / chunk_size)
+        log(f"Total de linhas: {total} → {parts} arquivo(s) de até {chunk_size} linhas.")
+
+        for i in range(parts):
+            start = i * chunk_size
+            end = min(start + chunk_size, total)
+            part = df_filtrado.iloc[start:end]
+            out_path = os.path.join(resultado_dir, f"robo_c6_SIMPLES_part{i+1}.xlsx")
+            save_to_excel(part, out_path)
+            outputs.append(out_path)
+            log(f"✅ Parte {i+1} salva: {out_path} ({len(part)} linhas)")
+
+    metricas.etapa("gravacao", linhas=len(df_filtrado))
+    progress(100)
+    log("\n🎉 Robô C6 concluído com sucesso!")
+    return {"status": "ok", "outputs": outputs, "linhas": len(df_filtrado),
+            "out_metricas": _metricas("ok", antes, len(df_filtrado), outputs, filtro=removidas)}
+
+
+# =======================================================================
+#           LINHA DE COMANDO
+# =======================================================================
+# Exemplos:
+#   python b2bsafe_engine.py limpeza base.xlsx --razao "Razao Social" --telefones Telefones \
+#       --email Email --cnpj CNPJ --modo Lemit --blocklist-c6 c6.csv --nao-perturbe np1.csv
+#   python b2bsafe_engine.py wpp contatos.csv --telefone Celular --tem-55
+#   python b2bsafe_engine.py juntar a.xlsx b.csv --saida saida/
+#   python b2bsafe_engine.py separar base.xlsx --saida saida/ --linhas 5000
+#   python b2bsafe_engine.py robo p1.xlsx p2.xlsx --bat robo.bat --resultado resultado/ --modo Simples
+#   python b2bsafe_engine.py blocklist add ~/listas/c6 novos.csv
+#   python b2bsafe_engine.py historico importar ~/historico entregues_maio.xlsx --data 2024-05-31
+
+def _cli_blocklist(args) -> int:
+    if args.op == "criar" or (args.op == "base" and not BlocklistStore.locate(args.store)):
+        store = BlocklistStore.create(args.store, strip55=args.tem_55)
+    else:
+        store = BlocklistStore(args.store)
+    t0 = time.perf_counter()
+    m = None
+    if args.op == "base":
+        m = store.set_base(args.arquivo)
+    elif args.op == "add":
+        m = store.add(args.arquivo)
+    elif args.op == "remove":
+        m = store.remove(args.arquivo)
+    elif args.op == "compactar":
+        print("✅ Store compactado" if store.compact() else "ℹ️ Nada para compactar")
+    if m is not None:
+        print(f"✅ Store atualizado ({args.op}, {os.path.basename(args.arquivo)}) em {time.perf_counter() - t0:.1f}s")
+        if store.needs_compaction(m):
+            print("ℹ️ Store pede compactação (rode: blocklist compactar)")
+    print(store.describe())
+    return 0
+
+def _cli_historico(args) -> int:
+    hist = DeliveryHistory.open(args.historico) if args.op == "importar" else DeliveryHistory(args.historico)
+    t0 = time.perf_counter()
+    if args.op == "importar":
+        m = hist.importar(args.arquivo, dia=args.data or None, strip55=args.tem_55)
+        print(f"✅ Histórico atualizado ({os.path.basename(args.arquivo)}) em {time.perf_counter() - t0:.1f}s")
+        if hist.needs_compaction(m):
+            print("ℹ️ Histórico pede compactação (rode: historico compactar)")
+    elif args.op == "compactar":
+        ok = hist.compact(max_idade_dias=args.max_idade)
+        print(f"✅ Histórico compactado em {time.perf_counter() - t0:.1f}s" if ok else "ℹ️ Nada para compactar")
+    print(hist.describe())
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="b2bsafe_engine", description="B2BSAFE sem interface (limpeza, WhatsApp, manipulação, robô C6, blocklists, histórico).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("limpeza", help="Limpeza de dados (filtradas + excluídas)")
+    p.add_argument("entrada")
+    p.add_argument("--razao", required=True, help="coluna Razão Social")
+    p.add_argument("--telefones", required=True, help="coluna Telefones")
+    p.add_argument("--email", required=True, help="coluna E-mail")
+    p.add_argument("--cnpj", required=True, help="coluna CNPJ")
+    p.add_argument("--saida", default="", help="pasta de saída (padrão: pasta da entrada)")
+    p.add_argument("--modo", choices=CLEAN_MODES, default="Simples")
+    p.add_argument("--tem-55", action="store_true", help="telefones já vêm com 55 (remove)")
+    p.add_argument("--add9", action="store_true", help="adiciona o dígito 9 em celulares DD+8")
+    p.add_argument("--add55", action="store_true", help="adiciona 55 na saída")
+    p.add_argument("--max-telefones", type=int, default=2, help="quantos telefones viram colunas (Telefone1..N)")
+    p.add_argument("--sem-cnpj-check", action="store_true", help="não valida dígitos verificadores do CNPJ")
+    p.add_argument("--blocklist-c6", default="", help="lista/índice/store da Blocklist C6")
+    p.add_argument("--nao-perturbe", action="append", default=[], help="lista Não Perturbe (até 4, repita a opção)")
+    p.add_argument("--bloom", action="store_true", help="usa pré-filtro Bloom nas listas")
+    p.add_argument("--bloom-fp", type=float, default=BLOOM_DEFAULT_FP)
+    p.add_argument("--processos", type=int, default=0, help="processos para duplicidade + filtros (0 = automático)")
+    p.add_argument("--em-disco", choices=["auto", "sim", "nao"], default="auto",
+                   help="duplicidade em disco, lendo em blocos (bases maiores que a RAM)")
+    p.add_argument("--disco-min-mb", type=float, default=LIMPEZA_DISCO_MIN_BYTES / 1024 ** 2,
+                   help="em disco automático a partir deste tamanho de arquivo (MB)")
+    p.add_argument("--disco-min-linhas", type=int, default=LIMPEZA_DISCO_MIN_ROWS,
+                   help="em disco automático a partir destas linhas (se o cache Parquet já sabe)")
+    p.add_argument("--historico", default="", help="pasta do histórico de entregas (exclui e registra entregues)")
+    p.add_argument("--historico-dias", type=int, default=HISTORICO_JANELA_DIAS, help="janela do histórico em dias")
+    p.add_argument("--historico-sem-cnpj", action="store_true", help="histórico só por telefone (ignora o CNPJ)")
+    p.add_argument("--nao-registrar", action="store_true", help="consulta o histórico sem registrar esta entrega")
+    p.add_argument("--sem-graficos", action="store_true", help=f"não gera o {GRAFICOS_PNG}")
+
+    p = sub.add_parser("wpp", help="Limpeza WhatsApp")
+    p.add_argument("entrada")
+    p.add_argument("--telefone", required=True, help="coluna de telefone")
+    p.add_argument("--saida", default="")
+    p.add_argument("--tem-55", action="store_true", help="números já têm 55")
+    p.add_argument("--sem-9", action="store_true", help="números ainda não têm o dígito 9")
+
+    p = sub.add_parser("juntar", help="Junta planilhas em uma só")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--saida", required=True)
+
+    p = sub.add_parser("separar", help="Junta e separa planilhas em partes")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--saida", required=True)
+    p.add_argument("--linhas", type=int, required=True, help="linhas por planilha")
+
+    p = sub.add_parser("robo", help="Robô C6 (.BAT)")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--bat", required=True)
+    p.add_argument("--resultado", required=True, help="pasta de resultados do .BAT")
+    p.add_argument("--modo", choices=ROBO_MODOS, required=True)
+    p.add_argument("--intervalo", type=float, default=ROBO_INTERVALO_S, help="segundos entre arquivos")
+
+    p = sub.add_parser("blocklist", help="Store incremental de blocklist")
+    p.add_argument("op", choices=["criar", "base", "add", "remove", "compactar", "info"])
+    p.add_argument("store", help="pasta do store")
+    p.add_argument("arquivo", nargs="?", default="")
+    p.add_argument("--tem-55", action="store_true", help="(criar) telefones das listas vêm com 55")
+
+    p = sub.add_parser("historico", help="Histórico de entregas (contatos já entregues)")
+    p.add_argument("op", choices=["importar", "compactar", "info"])
+    p.add_argument("historico", help="pasta do histórico")
+    p.add_argument("arquivo", nargs="?", default="")
+    p.add_argument("--data", default="", help="(importar) dia da entrega, AAAA-MM-DD (padrão: hoje)")
+    p.add_argument("--tem-55", action="store_true", help="(importar) telefones vêm com 55")
+    p.add_argument("--max-idade", type=int, default=None, help="(compactar) descarta entregas mais antigas que N dias")
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.cmd == "limpeza":
+            if len(args.nao_perturbe) > 4:
+                parser.error("no máximo 4 listas --nao-perturbe")
+            paths = [args.blocklist_c6, *args.nao_perturbe]
+            res = run_limpeza(
+                args.entrada,
+                col_razao=args.razao, col_tel=args.telefones, col_email=args.email, col_cnpj=args.cnpj,
+                out_dir=args.saida, clean_mode=args.modo,
+                strip55=args.tem_55, add9=args.add9, add55=args.add55,
+                max_tel=args.max_telefones, cnpj_check=not args.sem_cnpj_check,
+                filter_paths=list(zip(FILTER_LABELS, paths)),
+                bloom=args.bloom, bloom_fp=args.bloom_fp, processos=args.processos,
+                em_disco={"auto": None, "sim": True, "nao": False}[args.em_disco],
+                disco_min_bytes=int(args.disco_min_mb * 1024 ** 2), disco_min_linhas=args.disco_min_linhas,
+                historico=args.historico, historico_dias=args.historico_dias,
+                historico_cnpj=not args.historico_sem_cnpj, historico_registrar=not args.nao_registrar,
+                graficos=not args.sem_graficos,
+            )
+            for motivo, n in res["reason_counts"].items():
+                print(f"   {motivo}: {n}")
+        elif args.cmd == "wpp":
+            run_limpeza_wpp(args.entrada, col_tel=args.telefone, out_dir=args.saida,
+                            has55=args.tem_55, has9=not args.sem_9)
+        elif args.cmd in ("juntar", "separar"):
+            run_manipulacao(args.arquivos, args.saida, modo=args.cmd,
+                            linhas_por_planilha=getattr(args, "linhas", None))
+        elif args.cmd == "robo":
+            res = run_robo_c6(args.arquivos, args.bat, args.resultado, modo=args.modo,
+                              intervalo_s=args.intervalo)
+            if res["status"] != "ok":
+                return 1
+        elif args.cmd == "blocklist":
+            if args.op in ("base", "add", "remove") and not args.arquivo:
+                parser.error(f"blocklist {args.op} precisa do arquivo")
+            return _cli_blocklist(args)
+        elif args.cmd == "historico":
+            if args.op == "importar" and not args.arquivo:
+                parser.error("historico importar precisa do arquivo")
+            return _cli_historico(args)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
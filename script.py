@@ -1,18 +1,23 @@
 import os
 import sys
-import re
-import math
 import subprocess
 import json
 import time
-import shutil
+import queue
+import base64
+import threading
 
 import pandas as pd
-from typing import List, Set, Tuple, Optional, Dict
+from typing import List, Optional, Dict
 
-from openpyxl import load_workbook, Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import PatternFill, Font
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
+
+import multiprocessing
+
+# (NOVO) no executável empacotado, os processos da limpeza paralela sobem o próprio
+# .exe; freeze_support faz esse processo filho rodar só o worker (sem abrir a janela).
+multiprocessing.freeze_support()
 
 
 # ===================== FIX DE FONTE =====================
@@ -35,15 +40,42 @@ fonte_checkbox = ("Segoe UI", 10)
 # ========================================================
 # O restante do código permanece igual, apenas garantindo
 # que fonte_label exista antes de ser usada no ttk.Style
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+from tkinter import filedialog, messagebox
 
 from sqlalchemy import create_engine, text as sql_text
 from sqlalchemy.engine import URL
 
-# (NOVO) gráficos embutidos no Tkinter
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+# (NOVO) toda a lógica das automações fica no motor sem interface (b2bsafe_engine.py)
+from b2bsafe_engine import (
+    BLOOM_DEFAULT_FP,
+    BlocklistStore,
+    CLEAN_MODES,
+    DeliveryHistory,
+    FILTER_LABELS,
+    HISTORICO_JANELA_DIAS,
+    HISTORICO_MANIFEST,
+    JobCancelled,
+    LIMPEZA_DISCO_MIN_BYTES,
+    LIMPEZA_DISCO_MIN_ROWS,
+    LimpezaCharts,
+    ROBO_MODOS,
+    STORE_MANIFEST,
+    check_cancel,
+    cnpj_valid_mask,
+    normalize_cnpj_series,
+    normalize_col_name,
+    normalize_phone_series,
+    pick_col,
+    read_table,
+    read_table_columns,
+    read_table_header,
+    run_limpeza,
+    run_limpeza_wpp,
+    run_manipulacao,
+    run_robo_c6,
+    split_telefones_wide,
+    suggest_col,
+)
 
 # -------------------- CORES E ESTILO ------------------------
 BG_PRINCIPAL = "#111827"   # fundo geral
@@ -57,44 +89,6 @@ BORDER_COR = "#374151"     # bordas / contornos
 INPUT_BG = "#020617"       # campos de texto
 INPUT_FG = "#F9FAFB"       # texto dos campos
 
-# -------------------- CONSTANTES LIMPEZA --------------------
-PHONE_MIN_LEN = 8
-
-# (NOVO) DDD por Estado (map invertido para lookup rápido)
-DDD_ESTADOS: Dict[str, List[str]] = {
-    "AC": ["68"],
-    "AL": ["82"],
-    "AP": ["96"],
-    "AM": ["92", "97"],
-    "BA": ["71", "73", "74", "75", "77"],
-    "CE": ["85", "88"],
-    "DF": ["61"],
-    "ES": ["27", "28"],
-    "GO": ["62", "64"],
-    "MA": ["98", "99"],
-    "MT": ["65", "66"],
-    "MS": ["67"],
-    "MG": ["31", "32", "33", "34", "35", "37", "38"],
-    "PA": ["91", "93", "94"],
-    "PB": ["83"],
-    "PR": ["41", "42", "43", "44", "45", "46"],
-    "PE": ["81", "87"],
-    "PI": ["86", "89"],
-    "RJ": ["21", "22", "24"],
-    "RN": ["84"],
-    "RS": ["51", "53", "54", "55"],
-    "RO": ["69"],
-    "RR": ["95"],
-    "SC": ["47", "48", "49"],
-    "SP": ["11", "12", "13", "14", "15", "16", "17", "18", "19"],
-    "SE": ["79"],
-    "TO": ["63"],
-}
-DDD_TO_UF: Dict[str, str] = {}
-for uf, ddds in DDD_ESTADOS.items():
-    for ddd in ddds:
-        DDD_TO_UF[ddd] = uf
-
 # -------------------- CONFIG BANCO -------------------------
 DB_CONFIG_FILE = "db_config.json"
 db_engine = None
@@ -102,143 +96,155 @@ db_connected = False
 
 
 # =======================================================================
-#           FUNÇÕES COMPARTILHADAS / UTILITÁRIOS (LÓGICA)
+#           (NOVO) EXECUÇÃO EM SEGUNDO PLANO (JOBS)
 # =======================================================================
-
-def normalize_col_name(name: str) -> str:
-    return re.sub(r"[^0-9a-zA-Z]+", "", str(name)).strip().lower()
-
-def read_table(path: str) -> pd.DataFrame:
-    ext = os.path.splitext(path)[1].lower()
-    if ext in ['.xls', '.xlsx']:
-        return pd.read_excel(path, dtype=str)
-    elif ext in ['.csv', '.txt']:
-        return pd.read_csv(path, dtype=str, sep=None, engine='python')
-    else:
-        raise ValueError('Formato não suportado: ' + ext)
-
-def save_to_excel(df: pd.DataFrame, path: str):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Dados'
-    for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        ws.append(row)
-        if r_idx == 1:
-            for cell in ws[r_idx]:
-                cell.font = Font(bold=True)
-    for col in ws.columns:
-        max_len = max(len(str(cell.value or '')) for cell in col)
-        ws.column_dimensions[col[0].column_letter].width = min(max_len + 2, 60)
-    wb.save(path)
-
-def normalize_cnpj(c):
-    digits = re.sub(r'\D', '', str(c or ''))
-    if len(digits) > 14:
-        digits = digits[-14:]
-    return digits.zfill(14) if digits else None
-
-def split_telefones_field(field: str) -> Tuple[Optional[str], Optional[str]]:
-    if pd.isna(field):
-        return (None, None)
-    s = str(field)
-    parts = re.split(r'[;,/\|\s]+', s)
-    phones = [re.sub(r'\D', '', p) for p in parts if re.sub(r'\D', '', p)]
-    return (phones + [None, None])[:2]
-
-def normalize_phone(num: str, *, strip55: bool = False, add9: bool = False, add55: bool = False) -> str:
+# Os pipelines rodam numa thread; log/progresso/fim voltam por uma fila que o
+# mainloop esvazia com janela.after. Nenhum widget é tocado fora da thread do Tk,
+# e a janela continua respondendo durante a execução. Canais extras (ex.: o PNG
+# dos gráficos) passam pela mesma fila; como o progresso, só o último vale.
+
+JOB_POLL_MS = 100
+
+class Job:
+    def __init__(self, name: str, out_dir: str, *, log, progress, on_done, on_error, channels=None):
+        self.name = name
+        self.out_dir = out_dir
+        self.log = log
+        self.progress = progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.channels: Dict[str, object] = dict(channels or {})
+        self.cancel = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+class JobExecutor:
     """
-    Normaliza telefone para somente dígitos e aplica regras opcionais:
-
-    - strip55=True: se começar com '55' (código país), remove.
-    - add9=True: se tiver 10 dígitos (DD + 8), insere '9' após o DDD -> 11 dígitos.
-      (Ex.: 1999659233 -> 19999659233)
-    - add55=True: se NÃO começar com '55', adiciona '55' no início.
+    Um job por nome (aba). Dois jobs não podem gravar na mesma pasta de saída:
+    o segundo é recusado até o primeiro terminar.
     """
-    digits = re.sub(r'\D', '', str(num or ''))
-
-    if strip55 and digits.startswith('55') and len(digits) >= 12:
-        digits = digits[2:]
 
-    # adiciona 9 após DDD quando formato for DD + 8
-    if add9 and len(digits) == 10:
-        digits = digits[:2] + '9' + digits[2:]
+    def __init__(self):
+        self.events: "queue.Queue[tuple]" = queue.Queue()
+        self.jobs: Dict[str, Job] = {}
+        self._polling = False
 
-    if add55 and digits and not digits.startswith('55'):
-        digits = '55' + digits
+    @staticmethod
+    def _dir_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
 
-    return digits
+    def running(self, name: str) -> bool:
+        return name in self.jobs
 
+    def busy_dir(self, out_dir: str) -> Optional[str]:
+        """Nome do job que está usando a pasta (ou None)."""
+        key = self._dir_key(out_dir)
+        for job in self.jobs.values():
+            if self._dir_key(job.out_dir) == key:
+                return job.name
+        return None
 
-def is_invalid_phone(num: str) -> bool:
-    if not num:
-        return True
-    digits = re.sub(r'\D', '', str(num))
-    if len(digits) < PHONE_MIN_LEN:
-        return True
-    if len(set(digits)) == 1:
+    def submit(self, name: str, fn, *, out_dir: str, log, progress, on_done, on_error, channels=None) -> bool:
+        """
+        fn(log=..., progress=..., cancel=...) roda na thread do job.
+        on_done(resultado) / on_error(exc) rodam na thread do Tk.
+        channels = {nome: callback}: fn recebe também nome=(payload) e o
+        callback roda na thread do Tk com o último payload de cada ciclo.
+        """
+        if name in self.jobs:
+            messagebox.showwarning("Aviso", f"'{name}' já está em execução.")
+            return False
+        dono = self.busy_dir(out_dir)
+        if dono:
+            messagebox.showwarning("Aviso", f"A pasta de saída já está sendo usada por '{dono}'.\n\n{out_dir}\n\nAguarde terminar ou escolha outra pasta.")
+            return False
+
+        job = Job(name, out_dir, log=log, progress=progress, on_done=on_done, on_error=on_error, channels=channels)
+        ev = self.events
+        extras = {kind: (lambda payload, kind=kind: ev.put((name, kind, payload))) for kind in job.channels}
+
+        def _run():
+            try:
+                res = fn(log=lambda msg: ev.put((name, "log", msg)),
+                         progress=lambda pct: ev.put((name, "progress", pct)),
+                         cancel=job.cancel, **extras)
+                ev.put((name, "done", res))
+            except BaseException as e:
+                ev.put((name, "error", e))
+
+        self.jobs[name] = job
+        job.thread = threading.Thread(target=_run, name=f"job:{name}", daemon=True)
+        job.thread.start()
+        set_status(f"Executando: {name}...")
+        if not self._polling:
+            self._polling = True
+            janela.after(JOB_POLL_MS, self._poll)
         return True
-    return False
-
-def clean_razao_social(s: str) -> str:
-    """
-    Remove da Razao Social:
-    0-9 - = ' " , . ; [ ] : { } ! @ # $ % & ( ) _ +
-    Mantém letras e espaços.
-    """
-    if pd.isna(s):
-        return ''
-    pattern = r"[0-9\-\=\'\",.;\[\]:\{\}!@#$%&\(\)_\+]"
-    return re.sub(pattern, "", str(s))
-
-def pick_col(normals: dict, candidates: list):
-    for cand in candidates:
-        key = normalize_col_name(cand)
-        if key in normals:
-            return normals[key]
-        for norm, orig in normals.items():
-            if key in norm:
-                return orig
-    return None
-
-def safe_remove_file(path: str):
-    try:
-        if os.path.isfile(path):
-            os.remove(path)
-    except:
-        pass
 
-def _extract_ddd_from_phone(phone: str) -> Optional[str]:
-    """
-    Regra: DDD são os 2 primeiros dígitos do telefone (conforme seu pedido).
-    """
-    p = normalize_phone(phone)
-    if p.startswith('55') and len(p) >= 4:
-        p = p[2:]
-    if not p or len(p) < 2:
-        return None
-    return p[:2]
-
-def uf_from_phone(tel1: str, tel2: str) -> str:
-    """
-    Define UF usando primeiro DDD disponível (Telefone1, senão Telefone2).
-    Se não achar, retorna "??".
-    """
-    ddd = _extract_ddd_from_phone(tel1) or _extract_ddd_from_phone(tel2)
-    if not ddd:
-        return "??"
-    return DDD_TO_UF.get(ddd, "??")
-
-def _append_reason(reason_str: str, reason: str) -> str:
-    reason = (reason or "").strip()
-    if not reason:
-        return reason_str or ""
-    if not reason_str:
-        return reason
-    # evita duplicar
-    parts = [p.strip() for p in reason_str.split(" | ") if p.strip()]
-    if reason not in parts:
-        parts.append(reason)
-    return " | ".join(parts)
+    def cancel(self, name: str):
+        job = self.jobs.get(name)
+        if job is not None and not job.cancel.is_set():
+            job.cancel.set()
+            job.log("⏹ Cancelamento solicitado (para no próximo ponto seguro)...")
+
+    def _poll(self):
+        # só a última atualização de progresso (e de cada canal) de cada job interessa
+        last_progress: Dict[str, float] = {}
+        last_channel: Dict[tuple, object] = {}
+        finished = []
+        while True:
+            try:
+                name, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            job = self.jobs.get(name)
+            if job is None:
+                continue
+            if kind == "log":
+                job.log(payload)
+            elif kind == "progress":
+                last_progress[name] = payload
+            elif kind in job.channels:
+                last_channel[(name, kind)] = payload
+            else:
+                finished.append((job, kind, payload))
+        for name, pct in last_progress.items():
+            if name in self.jobs:
+                self.jobs[name].progress(pct)
+        for (name, kind), payload in last_channel.items():
+            if name in self.jobs:
+                self.jobs[name].channels[kind](payload)
+        for job, kind, payload in finished:
+            del self.jobs[job.name]
+            set_status("Pronto." if not self.jobs else f"Executando: {', '.join(self.jobs)}...")
+            if kind == "done":
+                job.on_done(payload)
+            else:
+                job.on_error(payload)
+        if self.jobs:
+            janela.after(JOB_POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+jobs = JobExecutor()
+
+JOB_LIMPEZA = "Limpeza de dados"
+JOB_WPP = "Limpeza WhatsApp"
+JOB_ROBO = "Robô C6"
+JOB_MANIP = "Manipulação"
+JOB_STORE = "Store de blocklist"
+JOB_COMPARACAO = "Comparação PROCV"
+JOB_IMPORTACAO = "Importação BD"
+JOB_HISTORICO = "Histórico de entregas"
+
+def job_error_handler(log, prefixo: str, mensagem: str):
+    """on_error padrão: cancelamento só vai pro log; erro vai pro log + messagebox."""
+    def _on_error(e: BaseException):
+        if isinstance(e, JobCancelled):
+            log("\n⏹ Cancelado pelo usuário.")
+            return
+        log(f"\n{prefixo}: {e}")
+        messagebox.showerror("Erro", f"{mensagem}\n\n{e}")
+    return _on_error
 
 
 # =======================================================================
@@ -274,13 +280,10 @@ def carregar_colunas():
             messagebox.showwarning("Aviso", "Selecione um arquivo primeiro.")
             return
 
-        if arquivo.endswith(".xlsx"):
-            df = pd.read_excel(arquivo)
-        elif arquivo.endswith(".csv"):
-            df = pd.read_csv(arquivo, sep=";", encoding="utf-8")
-        else:
+        if not arquivo.lower().endswith((".xlsx", ".csv")):
             messagebox.showerror("Erro", "Selecione um arquivo CSV ou XLSX.")
             return
+        df = read_table_header(arquivo)
 
         colunas = list(df.columns)
         combo_colA["values"] = colunas
@@ -290,69 +293,62 @@ def carregar_colunas():
         messagebox.showerror("Erro", f"Não foi possível carregar colunas.\n\n{e}")
 
 def executar_comparacao():
-    try:
-        progress["value"] = 0
-        janela.update_idletasks()
+    """
+    Valida as opções na thread do Tk; leitura, comparação e gravação do
+    resultado (com o destaque em amarelo) rodam como job em segundo plano.
+    """
+    progress["value"] = 0
 
-        opcao = combo_opcao.get()
-        if opcao == "":
-            messagebox.showwarning("Aviso", "Selecione o tipo de comparação.")
-            return
+    opcao = combo_opcao.get()
+    if opcao == "":
+        messagebox.showwarning("Aviso", "Selecione o tipo de comparação.")
+        return
 
-        if caminho_arquivo.get() == "":
-            messagebox.showwarning("Aviso", "Selecione um arquivo.")
-            return
+    if caminho_arquivo.get() == "":
+        messagebox.showwarning("Aviso", "Selecione um arquivo.")
+        return
 
-        if pasta_saida.get() == "":
-            messagebox.showwarning("Aviso", "Selecione onde salvar o arquivo final.")
-            return
+    if pasta_saida.get() == "":
+        messagebox.showwarning("Aviso", "Selecione onde salvar o arquivo final.")
+        return
 
-        arquivo = caminho_arquivo.get()
-        pasta_destino = pasta_saida.get()
-        ext = arquivo.split(".")[-1].lower()
-        progress["value"] = 10
-        janela.update_idletasks()
-
-        if ext == "xlsx":
-            df = pd.read_excel(arquivo)
-        elif ext == "csv":
-            df = pd.read_csv(arquivo, sep=";", encoding="utf-8")
-        else:
-            messagebox.showerror("Erro", "Formato não suportado. Use CSV ou XLSX.")
-            return
+    arquivo = caminho_arquivo.get()
+    pasta_destino = pasta_saida.get()
+    ext = arquivo.split(".")[-1].lower()
 
-        progress["value"] = 30
-        janela.update_idletasks()
+    if ext not in ("xlsx", "csv"):
+        messagebox.showerror("Erro", "Formato não suportado. Use CSV ou XLSX.")
+        return
 
-        colA = combo_colA.get()
-        colB = combo_colB.get()
-        if colA == "" or colB == "":
-            messagebox.showerror("Erro", "Selecione as colunas para comparação.")
-            return
+    colA = combo_colA.get()
+    colB = combo_colB.get()
+    if colA == "" or colB == "":
+        messagebox.showerror("Erro", "Selecione as colunas para comparação.")
+        return
 
-        if opcao == "O que tem na A e não tem na B":
-            resultado = df[~df[colA].isin(df[colB])][colA]
-            tipo = f"{colA}NAO_ESTA_EM{colB}"
-            coluna_base = colA
-            outra_coluna = colB
-        else:
-            resultado = df[~df[colB].isin(df[colA])][colB]
-            tipo = f"{colB}NAO_ESTA_EM{colA}"
-            coluna_base = colB
-            outra_coluna = colA
+    if opcao == "O que tem na A e não tem na B":
+        coluna_base, outra_coluna = colA, colB
+    else:
+        coluna_base, outra_coluna = colB, colA
+    tipo = f"{coluna_base}NAO_ESTA_EM{outra_coluna}"
+    arquivo_saida = os.path.join(pasta_destino, f"resultado_{tipo}.xlsx")
 
-        progress["value"] = 50
-        janela.update_idletasks()
+    def _comparar(log, progress, cancel):
+        progress(10)
+        # mesmo leitor das outras abas (dialeto detectado + cache)
+        df = read_table(arquivo)
+        progress(30)
+        check_cancel(cancel)
 
-        df[tipo] = ""
-        df.loc[~df[coluna_base].isin(df[outra_coluna]), tipo] = df[coluna_base]
+        mask = ~df[coluna_base].isin(df[outra_coluna])
+        resultado = df[mask][coluna_base]
+        progress(50)
 
-        nome_arquivo_saida = f"resultado_{tipo}.xlsx"
-        arquivo_saida = os.path.join(pasta_destino, nome_arquivo_saida)
+        df[tipo] = ""
+        df.loc[mask, tipo] = df[coluna_base]
         df.to_excel(arquivo_saida, index=False)
-        caminho_arquivo_saida.set(arquivo_saida)
-        progress["value"] = 70
-        janela.update_idletasks()
+        progress(70)
+        check_cancel(cancel)
 
         wb = load_workbook(arquivo_saida)
         ws = wb.active
@@ -368,9 +364,11 @@ def executar_comparacao():
                 cell_res.fill = fill_amarelo
 
         wb.save(arquivo_saida)
-        progress["value"] = 90
-        janela.update_idletasks()
+        progress(90)
+        return {"linhas": len(df), "itens": resultado.to_list()}
 
+    def _fim(res: dict):
+        caminho_arquivo_saida.set(arquivo_saida)
         relatorio = f"""
 PROCESSO COMPLETO
 
@@ -379,20 +377,30 @@ Arquivo gerado em: {arquivo_saida}
 
 Tipo de comparação: {tipo}
 
-Linhas analisadas: {len(df)}
-Itens encontrados: {len(resultado)}
+Linhas analisadas: {res['linhas']}
+Itens encontrados: {len(res['itens'])}
 
 Lista dos itens encontrados:
-{resultado.to_list()}
+{res['itens']}
 """
         txt_relatorio.delete("1.0", tk.END)
         txt_relatorio.insert(tk.END, relatorio)
         progress["value"] = 100
-        janela.update_idletasks()
         messagebox.showinfo("Concluído", "Comparação finalizada com sucesso!")
 
-    except Exception as e:
-        messagebox.showerror("Erro", str(e))
+    def _log(msg: str):
+        txt_relatorio.insert(tk.END, msg + "\n")
+        txt_relatorio.see(tk.END)
+
+    jobs.submit(
+        JOB_COMPARACAO,
+        _comparar,
+        out_dir=pasta_destino,
+        log=_log,
+        progress=lambda pct: progress.configure(value=pct),
+        on_done=_fim,
+        on_error=job_error_handler(_log, "❌ Erro", "Falha na comparação."),
+    )
 
 
 # =======================================================================
@@ -402,7 +410,6 @@ Lista dos itens encontrados:
 def log_limpeza(msg: str):
     txt_log_limpeza.insert(tk.END, msg + "\n")
     txt_log_limpeza.see(tk.END)
-    janela.update_idletasks()
 
 def abrir_pasta_limpeza():
     pasta = out_dir_limpeza.get()
@@ -419,27 +426,6 @@ def abrir_pasta_limpeza():
     except Exception as e:
         messagebox.showerror("Erro", f"Não foi possível abrir a pasta.\n\n{e}")
 
-def _load_phone_set(path: str, label: str, *, strip55: bool = False) -> Set[str]:
-    path = (path or "").strip()
-    if not path:
-        return set()
-    if not os.path.isfile(path):
-        log_limpeza(f"⚠️ {label}: arquivo não encontrado: {path}")
-        return set()
-
-    try:
-        tdf = read_table(path)
-        tel_col = next((c for c in tdf.columns if "tel" in normalize_col_name(c)), None)
-        if not tel_col:
-            tel_col = tdf.columns[0]
-        s = set(tdf[tel_col].astype(str).map(lambda x: normalize_phone(x, strip55=strip55)))
-        s = {x for x in s if x}
-        log_limpeza(f"✅ {label}: {len(s)} telefones carregados ({os.path.basename(path)})")
-        return s
-    except Exception as e:
-        log_limpeza(f"❌ {label}: erro ao ler: {e}")
-        return set()
-
 def escanear_colunas_limpeza():
     try:
         in_path = base_empresas_path.get().strip()
@@ -447,8 +433,8 @@ def escanear_colunas_limpeza():
             messagebox.showwarning("Aviso", 'Selecione o arquivo "empresas bruto" primeiro.')
             return
 
-        log_limpeza("🔎 Escaneando colunas do arquivo...")
-        df = read_table(in_path)
+        log_limpeza("🔎 Escaneando colunas do arquivo (prévia)...")
+        df = read_table_header(in_path)
         cols = list(df.columns)
         if not cols:
             messagebox.showerror("Erro", "Não foi possível identificar colunas no arquivo.")
@@ -459,23 +445,10 @@ def escanear_colunas_limpeza():
         combo_limpeza_email["values"] = cols
         combo_limpeza_cnpj["values"] = cols
 
-        normals = {normalize_col_name(c): c for c in cols}
-
-        def suggest(keys):
-            for k in keys:
-                kk = normalize_col_name(k)
-                if kk in normals:
-                    return normals[kk]
-            for c in cols:
-                cn = normalize_col_name(c)
-                if any(normalize_col_name(k) in cn for k in keys):
-                    return c
-            return ""
-
-        limpeza_col_razao.set(suggest(["razao social", "razao", "nome empresa", "empresa"]))
-        limpeza_col_tel.set(suggest(["telefones", "telefone", "tel", "fone", "celular"]))
-        limpeza_col_email.set(suggest(["email", "e-mail", "mail"]))
-        limpeza_col_cnpj.set(suggest(["cnpj"]))
+        limpeza_col_razao.set(suggest_col(cols, ["razao social", "razao", "nome empresa", "empresa"]))
+        limpeza_col_tel.set(suggest_col(cols, ["telefones", "telefone", "tel", "fone", "celular"]))
+        limpeza_col_email.set(suggest_col(cols, ["email", "e-mail", "mail"]))
+        limpeza_col_cnpj.set(suggest_col(cols, ["cnpj"]))
 
         log_limpeza(f"✅ Colunas carregadas: {len(cols)}")
         messagebox.showinfo("OK", "Colunas carregadas! Agora selecione Razão/Telefones/E-mail/CNPJ.")
@@ -484,339 +457,150 @@ def escanear_colunas_limpeza():
         messagebox.showerror("Erro", f"Falha ao escanear colunas.\n\n{e}")
 
 # ---------------- (NOVO) gráfico embutido na aba limpeza ----------------
+# A Figure é uma só (LimpezaCharts do motor, reaproveitada entre execuções) e é
+# desenhada na thread do job; aqui só chega o PNG pronto, que vira PhotoImage.
 
-graf_canvas = None
-graf_fig = None
+graf_charts = None
+graf_img = None
 
-def _clear_graph():
-    global graf_canvas, graf_fig
-    if graf_canvas is not None:
+def _graficos_limpeza():
+    """LimpezaCharts persistente; True se o matplotlib faltar (o motor avisa no log)."""
+    global graf_charts
+    if graf_charts is None:
         try:
-            graf_canvas.get_tk_widget().destroy()
-        except:
-            pass
-    graf_canvas = None
-    graf_fig = None
-
-def render_graphs_in_limpeza(counts_reasons: Dict[str, int], counts_uf: Dict[str, int]):
-    """
-    Desenha 2 gráficos na área direita da aba:
-      - Exclusões por motivo
-      - Distribuição por UF (derivada do DDD)
-    """
-    global graf_canvas, graf_fig
-    _clear_graph()
-
-    graf_fig = Figure(figsize=(7.5, 5.2), dpi=100)
-    ax1 = graf_fig.add_subplot(211)
-    ax2 = graf_fig.add_subplot(212)
-
-    # Exclusões por motivo
-    if counts_reasons:
-        labels = list(counts_reasons.keys())
-        values = [counts_reasons[k] for k in labels]
-        ax1.bar(labels, values)
-        ax1.set_title("Excluídos por motivo")
-        ax1.set_ylabel("Qtd")
-        ax1.tick_params(axis="x", rotation=25)
-    else:
-        ax1.text(0.5, 0.5, "Sem exclusões (motivos)", ha="center", va="center")
-        ax1.set_axis_off()
-
-    # Por UF (a partir do DDD)
-    if counts_uf:
-        labels2 = list(counts_uf.keys())
-        values2 = [counts_uf[k] for k in labels2]
-        ax2.bar(labels2, values2)
-        ax2.set_title("Distribuição por UF (via DDD)")
-        ax2.set_ylabel("Qtd")
-        ax2.tick_params(axis="x", rotation=0)
-    else:
-        ax2.text(0.5, 0.5, "Sem dados de UF", ha="center", va="center")
-        ax2.set_axis_off()
-
-    graf_fig.tight_layout()
+            graf_charts = LimpezaCharts()
+        except RuntimeError:
+            return True
+    return graf_charts
 
-    graf_canvas = FigureCanvasTkAgg(graf_fig, master=frame_graficos_limpeza)
-    graf_canvas.draw()
-    graf_canvas.get_tk_widget().pack(fill="both", expand=True)
-
-# ---------------- (NOVO) deduplicação robusta ----------------
-
-def mark_and_exclude_duplicate_phones(df_base: pd.DataFrame, *, strip55: bool = False, add9: bool = False, add55: bool = False, reason_col: str = "Motivo Exclusao") -> pd.Series:
-    """
-    Regra (conforme pedido): se um número aparecer mais de uma vez na planilha,
-    excluir TODAS as ocorrências, mantendo apenas 1 (a primeira).
-    Considera Telefone1 e Telefone2 juntos (como um universo único).
-    Retorna máscara booleana de exclusão por duplicidade e preenche o reason_col.
-    """
-    df = df_base
-
-    # lista "long" com (row_index, phone)
-    rows = []
-    for idx, (t1, t2) in enumerate(zip(df["Telefone1"].astype(str), df["Telefone2"].astype(str))):
-        i = df.index[idx]
-        p1 = normalize_phone(t1, strip55=strip55, add9=add9, add55=add55)
-        p2 = normalize_phone(t2, strip55=strip55, add9=add9, add55=add55)
-        if p1 and not is_invalid_phone(p1):
-            rows.append((i, p1))
-        if p2 and not is_invalid_phone(p2):
-            rows.append((i, p2))
-
-    if not rows:
-        return pd.Series(False, index=df.index)
-
-    long = pd.DataFrame(rows, columns=["row", "phone"])
-    counts = long["phone"].value_counts()
-
-    # phones duplicados: count > 1
-    dup_phones = set(counts[counts > 1].index.tolist())
-    if not dup_phones:
-        return pd.Series(False, index=df.index)
-
-    # manter a primeira ocorrência global por phone (na ordem em que aparece)
-    long["is_dup_phone"] = long["phone"].isin(dup_phones)
-    dup_long = long[long["is_dup_phone"]].copy()
-
-    # first occurrence row per phone:
-    first_rows = dup_long.drop_duplicates(subset=["phone"], keep="first")[["phone", "row"]]
-    keep_pairs = set(zip(first_rows["row"], first_rows["phone"]))
-
-    # tudo que é duplicado e NÃO é a primeira ocorrência -> excluir
-    def should_exclude(row, phone):
-        return (row, phone) not in keep_pairs
-
-    dup_long["exclude"] = dup_long.apply(lambda r: should_exclude(r["row"], r["phone"]), axis=1)
-    rows_to_exclude = set(dup_long.loc[dup_long["exclude"], "row"].tolist())
-
-    mask_dup = df.index.isin(rows_to_exclude)
-    if reason_col in df.columns:
-        for ridx in df.index[mask_dup]:
-            df.at[ridx, reason_col] = _append_reason(df.at[ridx, reason_col], "Telefone duplicado")
-    return pd.Series(mask_dup, index=df.index)
+def mostrar_graficos_limpeza(png: bytes):
+    """Troca a imagem da área de gráficos (Tk 8.6 lê PNG direto)."""
+    global graf_img
+    graf_img = tk.PhotoImage(data=base64.b64encode(png))
+    lbl_graf_info.configure(image=graf_img)
 
 def executar_limpeza_dados():
     """
-    Nova lógica:
-    - Usuário escolhe colunas (Razão, Telefones, Email, CNPJ)
-    - Aplica modo de limpeza em Razão Social
-    - Divide telefones em Telefone1/Telefone2
-    - Remove inválidos (mantém a regra de qualidade)
-    - Remove telefones duplicados (mantém apenas 1 ocorrência)
-    - Aplica filtros (blocklist c6 + nao perturbe 1..4)
-    - Motivo de exclusão por linha (arquivo excluídas)
-    - Gráficos embutidos na aba
-    - Gera 2 arquivos: filtradas + excluídas
+    Lê as opções da aba e roda run_limpeza (b2bsafe_engine) como job em
+    segundo plano; aqui só ficam as mensagens, o log, a barra e os gráficos.
     """
     try:
         txt_log_limpeza.delete("1.0", tk.END)
         progress_limpeza["value"] = 0
-        janela.update_idletasks()
 
         in_path = base_empresas_path.get().strip()
         if not in_path:
             messagebox.showwarning("Aviso", 'Selecione o arquivo "empresas bruto".')
             return
 
-        out_dir = out_dir_limpeza.get().strip() or os.path.dirname(in_path)
-        os.makedirs(out_dir, exist_ok=True)
-
         col_razao = limpeza_col_razao.get().strip()
         col_tel = limpeza_col_tel.get().strip()
         col_email = limpeza_col_email.get().strip()
         col_cnpj = limpeza_col_cnpj.get().strip()
-
-        # Opções de tratamento de telefone (55 / dígito 9 / prefixo 55)
-        telefones_tem_55 = (tel_has55_var.get().strip().lower() == "sim")
-        opt_strip55 = bool(telefones_tem_55)
-        opt_add9 = bool(add9_var.get())
-        opt_add55 = bool(add55_var.get())
-
         if not (col_razao and col_tel and col_email and col_cnpj):
             messagebox.showwarning("Aviso", "Selecione as colunas: Razão Social, Telefones, E-mail e CNPJ.\n\nUse 'Escanear colunas' primeiro.")
             return
 
-        set_status("Executando limpeza de dados...")
-        log_limpeza("=== Automação: Limpeza de dados ===")
-        log_limpeza(f"📄 Arquivo: {in_path}")
-        log_limpeza(f"📁 Saída: {out_dir}")
-        log_limpeza(f"🧩 Colunas: Razão='{col_razao}' | Telefones='{col_tel}' | Email='{col_email}' | CNPJ='{col_cnpj}'\n")
-
-        progress_limpeza["value"] = 5
-        janela.update_idletasks()
-
-        log_limpeza("1) Lendo arquivo base...")
-        df_raw = read_table(in_path)
-        log_limpeza(f"✅ Lido: {len(df_raw)} linhas / {len(df_raw.columns)} colunas.")
-        progress_limpeza["value"] = 15
-        janela.update_idletasks()
-
-        # Monta base só com as colunas escolhidas
-        log_limpeza("2) Montando base com as colunas selecionadas...")
-        df_base = pd.DataFrame(index=df_raw.index)
-        df_base["Razao Social"] = df_raw[col_razao].astype(str)
-        df_base["Telefones"] = df_raw[col_tel].astype(str)
-        df_base["E-mail"] = df_raw[col_email].astype(str)
-        df_base["Cnpj"] = df_raw[col_cnpj].apply(normalize_cnpj)
-
-        # Motivo de exclusão por linha
-        df_base["Motivo Exclusao"] = ""
-
-        # Modo de limpeza
-        modo = clean_mode_var.get()
-        log_limpeza(f"3) Aplicando modo de limpeza na Razão Social: {modo}...")
-        if modo == "Lemit":
-            df_base["Razao Social"] = df_base["Razao Social"].apply(clean_razao_social)
-        else:
-            df_base["Razao Social"] = df_base["Razao Social"].astype(str)
-
-        progress_limpeza["value"] = 30
-        janela.update_idletasks()
-
-        # Telefones
-        log_limpeza("4) Separando e normalizando telefones...")
-        t1, t2 = zip(*df_base["Telefones"].map(split_telefones_field))
-        df_base["Telefone1"] = pd.Series(t1, index=df_base.index).apply(lambda x: normalize_phone(x, strip55=opt_strip55, add9=opt_add9, add55=opt_add55))
-        df_base["Telefone2"] = pd.Series(t2, index=df_base.index).apply(lambda x: normalize_phone(x, strip55=opt_strip55, add9=opt_add9, add55=opt_add55))
-
-        progress_limpeza["value"] = 45
-        janela.update_idletasks()
-
-        # Máscara de exclusão
-        mask_excluir = pd.Series(False, index=df_base.index)
-
-        # 5) Telefones inválidos
-        log_limpeza("5) Removendo linhas sem nenhum telefone válido...")
-        invalid_both = df_base["Telefone1"].apply(is_invalid_phone) & df_base["Telefone2"].apply(is_invalid_phone)
-        removidas_invalid = int(invalid_both.sum())
-        mask_excluir = mask_excluir | invalid_both
-        if removidas_invalid:
-            df_base.loc[invalid_both, "Motivo Exclusao"] = df_base.loc[invalid_both, "Motivo Exclusao"].apply(lambda s: _append_reason(s, "Telefone inválido"))
-        log_limpeza(f"⚠️ Removidas por telefone inválido: {removidas_invalid}")
-
-        progress_limpeza["value"] = 55
-        janela.update_idletasks()
-
-        # 6) Duplicados (após inválidos, para não “poluir” contagem)
-        log_limpeza("6) Removendo telefones duplicados (mantém apenas 1 ocorrência)...")
-        # Só marca duplicados nas linhas ainda não excluídas por inválido
-        df_work = df_base[~mask_excluir].copy()
-        dup_mask_work = mark_and_exclude_duplicate_phones(df_work, strip55=opt_strip55, add9=opt_add9, add55=opt_add55, reason_col="Motivo Exclusao")
-        # mapear de volta pro df_base
-        rows_dup = df_work.index[dup_mask_work].tolist()
-        dup_mask = df_base.index.isin(rows_dup)
-        removidas_dup = int(dup_mask.sum())
-        mask_excluir = mask_excluir | dup_mask
-        if removidas_dup:
-            # df_work já escreveu Motivo Exclusao; precisamos sincronizar
-            df_base.loc[rows_dup, "Motivo Exclusao"] = df_work.loc[rows_dup, "Motivo Exclusao"].values
-        log_limpeza(f"⚠️ Removidas por duplicidade: {removidas_dup}")
-
-        progress_limpeza["value"] = 60
-        janela.update_idletasks()
-
-        # 7) Carrega filtros (Blocklist + Não Perturbe)
-        log_limpeza("\n7) Carregando filtros (Blocklist + Não Perturbe 1-4)...")
-        filtro_set = set()
-        filtro_set |= _load_phone_set(blocklist_c6_path.get(), "Blocklist C6", strip55=opt_strip55)
-        filtro_set |= _load_phone_set(nao_perturbe_1_path.get(), "Não Perturbe 1", strip55=opt_strip55)
-        filtro_set |= _load_phone_set(nao_perturbe_2_path.get(), "Não Perturbe 2", strip55=opt_strip55)
-        filtro_set |= _load_phone_set(nao_perturbe_3_path.get(), "Não Perturbe 3", strip55=opt_strip55)
-        filtro_set |= _load_phone_set(nao_perturbe_4_path.get(), "Não Perturbe 4", strip55=opt_strip55)
-
-        progress_limpeza["value"] = 70
-        janela.update_idletasks()
-
-        # 8) Aplica filtros por telefone (somente em linhas ainda válidas)
-        log_limpeza("8) Aplicando filtros por telefone...")
-        if filtro_set:
-            candidate = df_base[~mask_excluir]
-            in_filters = candidate["Telefone1"].isin(list(filtro_set)) | candidate["Telefone2"].isin(list(filtro_set))
-            rows_filter = candidate.index[in_filters].tolist()
-            removidas_filtros = len(rows_filter)
-            mask_excluir = mask_excluir | df_base.index.isin(rows_filter)
-            if removidas_filtros:
-                df_base.loc[rows_filter, "Motivo Exclusao"] = df_base.loc[rows_filter, "Motivo Exclusao"].apply(lambda s: _append_reason(s, "Blocklist/Não Perturbe"))
-            log_limpeza(f"⚠️ Removidas por Blocklist/Não Perturbe: {removidas_filtros}")
-        else:
-            log_limpeza("ℹ️ Nenhuma lista selecionada. (Nenhum filtro aplicado)")
-
-        progress_limpeza["value"] = 82
-        janela.update_idletasks()
-
-        # Separa finais
-        df_excluidas = df_base[mask_excluir].copy()
-        df_ficaram = df_base[~mask_excluir].copy()
-
-        # (NOVO) adiciona UF para análise/gráfico (não precisa sair nos arquivos se você não quiser)
-        df_ficaram["UF (DDD)"] = df_ficaram.apply(lambda r: uf_from_phone(r.get("Telefone1", ""), r.get("Telefone2", "")), axis=1)
-        df_excluidas["UF (DDD)"] = df_excluidas.apply(lambda r: uf_from_phone(r.get("Telefone1", ""), r.get("Telefone2", "")), axis=1)
-
-        log_limpeza("\n9) Preparando arquivos finais (2 resultados)...")
-        log_limpeza(f"✅ Ficaram: {len(df_ficaram)}")
-        log_limpeza(f"✅ Excluídas: {len(df_excluidas)}")
-
-        # Colunas de saída
-        cols_out_filtradas = ["Razao Social", "Telefone1", "Telefone2", "Cnpj", "E-mail"]
-        cols_out_excluidas = ["Razao Social", "Telefone1", "Telefone2", "Cnpj", "E-mail", "Motivo Exclusao"]
-
-        for c in cols_out_filtradas:
-            if c not in df_ficaram.columns:
-                df_ficaram[c] = ""
-        for c in cols_out_excluidas:
-            if c not in df_excluidas.columns:
-                df_excluidas[c] = ""
-
-        df_ficaram_out = df_ficaram[cols_out_filtradas].copy()
-        df_excluidas_out = df_excluidas[cols_out_excluidas].copy()
-
-        out_filtradas = os.path.join(out_dir, "empresas_filtradas.xlsx")
-        out_excluidas = os.path.join(out_dir, "empresas_excluidas.xlsx")
-
-        safe_remove_file(out_filtradas)
-        safe_remove_file(out_excluidas)
-
-        save_to_excel(df_ficaram_out, out_filtradas)
-        save_to_excel(df_excluidas_out, out_excluidas)
-
-        progress_limpeza["value"] = 100
-        janela.update_idletasks()
-
-        # ----------------- (NOVO) preparar dados dos gráficos -----------------
-        # Excluídos por motivo (explode no separador " | ")
-        reasons = df_excluidas["Motivo Exclusao"].fillna("").astype(str)
-        reason_counts: Dict[str, int] = {}
-        for s in reasons.tolist():
-            parts = [p.strip() for p in s.split(" | ") if p.strip()]
-            if not parts:
-                parts = ["(sem motivo)"]
-            for p in parts:
-                reason_counts[p] = reason_counts.get(p, 0) + 1
-
-        # Distribuição por UF usando DDD (de preferência da base FILTRADA)
-        uf_counts_series = df_ficaram["UF (DDD)"].value_counts()
-        uf_counts: Dict[str, int] = uf_counts_series.to_dict()
-
-        # Renderiza os gráficos na aba
-        render_graphs_in_limpeza(reason_counts, uf_counts)
-
-        log_limpeza("\n🎉 Processo concluído!")
-        log_limpeza(f"📄 Gerado: {out_filtradas}")
-        log_limpeza(f"📄 Gerado: {out_excluidas}")
-
-        messagebox.showinfo(
-            "Concluído",
-            "Limpeza finalizada!\n\n"
-            f"Filtradas: {os.path.basename(out_filtradas)}\n"
-            f"Excluídas: {os.path.basename(out_excluidas)}\n\n"
-            "Obs: O arquivo de excluídas contém a coluna 'Motivo Exclusao'."
+        opt_bloom = bool(bloom_var.get())
+        opt_bloom_fp = BLOOM_DEFAULT_FP
+        if opt_bloom:
+            try:
+                opt_bloom_fp = float(str(bloom_fp_var.get()).replace(",", ".").strip())
+                if not 0 < opt_bloom_fp < 1:
+                    raise ValueError
+            except ValueError:
+                messagebox.showwarning("Aviso", "Taxa de falso positivo do Bloom inválida (use algo como 0.01).")
+                return
+
+        # Quantos números do campo Telefones viram colunas (Telefone1..N)
+        try:
+            n_tel = max(1, int(str(max_tel_var.get()).strip()))
+        except ValueError:
+            n_tel = 2
+
+        try:
+            n_procs = max(0, int(str(procs_var.get()).strip()))
+        except ValueError:
+            n_procs = 0
+
+        try:
+            disco_min_mb = float(str(disco_min_mb_var.get()).replace(",", ".").strip())
+            disco_min_linhas = int(str(disco_min_linhas_var.get()).strip())
+            if disco_min_mb <= 0 or disco_min_linhas <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("Aviso", "Limites do modo em disco inválidos (MB e linhas > 0).")
+            return
+
+        try:
+            hist_dias = int(str(historico_dias_var.get()).strip())
+            if hist_dias < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("Aviso", "Janela do histórico inválida (dias >= 0).")
+            return
+
+        out_dir = out_dir_limpeza.get().strip() or os.path.dirname(in_path)
+        opts = dict(
+            col_razao=col_razao,
+            col_tel=col_tel,
+            col_email=col_email,
+            col_cnpj=col_cnpj,
+            out_dir=out_dir,
+            clean_mode=clean_mode_var.get(),
+            strip55=(tel_has55_var.get().strip().lower() == "sim"),
+            add9=bool(add9_var.get()),
+            add55=bool(add55_var.get()),
+            max_tel=n_tel,
+            cnpj_check=bool(cnpj_check_var.get()),
+            filter_paths=list(zip(FILTER_LABELS, [
+                blocklist_c6_path.get(),
+                nao_perturbe_1_path.get(),
+                nao_perturbe_2_path.get(),
+                nao_perturbe_3_path.get(),
+                nao_perturbe_4_path.get(),
+            ])),
+            bloom=opt_bloom,
+            bloom_fp=opt_bloom_fp,
+            processos=n_procs,
+            em_disco={"Em memória": False, "Em disco": True}.get(memoria_var.get()),
+            disco_min_bytes=int(disco_min_mb * 1024 ** 2),
+            disco_min_linhas=disco_min_linhas,
+            historico=historico_dir_var.get().strip() or None,
+            historico_dias=hist_dias,
+            historico_cnpj=bool(historico_cnpj_var.get()),
+            historico_registrar=bool(historico_registrar_var.get()),
+            graficos=_graficos_limpeza(),
+        )
+
+        def _fim(res: dict):
+            # os gráficos já chegaram pelo canal "grafico" (o último é o final)
+            _historico_atualiza_info()
+            graficos = f"Gráficos: {os.path.basename(res['out_graficos'])}\n" if res.get("out_graficos") else ""
+            messagebox.showinfo(
+                "Concluído",
+                "Limpeza finalizada!\n\n"
+                f"Filtradas: {os.path.basename(res['out_filtradas'])}\n"
+                f"Excluídas: {os.path.basename(res['out_excluidas'])}\n"
+                f"{graficos}\n"
+                "Obs: O arquivo de excluídas contém a coluna 'Motivo Exclusao'."
+            )
+
+        jobs.submit(
+            JOB_LIMPEZA,
+            lambda grafico, **cb: run_limpeza(in_path, **opts, on_chart=grafico, **cb),
+            out_dir=out_dir,
+            log=log_limpeza,
+            progress=lambda pct: progress_limpeza.configure(value=pct),
+            channels={"grafico": mostrar_graficos_limpeza},
+            on_done=_fim,
+            on_error=job_error_handler(log_limpeza, "❌ Erro fatal", "Ocorreu um erro durante a execução."),
         )
 
     except Exception as e:
         log_limpeza(f"\n❌ Erro fatal: {e}")
         messagebox.showerror("Erro", f"Ocorreu um erro durante a execução.\n\n{e}")
 
-
 # =======================================================================
 #           FUNÇÕES ROBÔ C6
 # =======================================================================
@@ -824,7 +608,6 @@ def executar_limpeza_dados():
 def log_robo(msg: str):
     txt_log_robo.insert(tk.END, msg + "\n")
     txt_log_robo.see(tk.END)
-    janela.update_idletasks()
 
 def selecionar_arquivos_robo():
     paths = filedialog.askopenfilenames(
@@ -860,7 +643,6 @@ def executar_robo_c6():
     try:
         txt_log_robo.delete("1.0", tk.END)
         progress_robo["value"] = 0
-        janela.update_idletasks()
 
         if not robo_arquivos:
             messagebox.showwarning("Aviso", "Selecione as planilhas de entrada primeiro.")
@@ -877,145 +659,29 @@ def executar_robo_c6():
             return
 
         modo = robo_modo_var.get()
-        if modo not in ["Lemit", "Simples"]:
+        if modo not in ROBO_MODOS:
             messagebox.showwarning("Aviso", "Selecione se o arquivo é para Lemit ou Simples.")
             return
 
-        bat_dir = os.path.dirname(bat_path)
-        log_robo("=== Robô C6 iniciado ===")
-        log_robo(f"Arquivos selecionados: {len(robo_arquivos)}")
-        log_robo(f"Caminho do .BAT: {bat_path}")
-        log_robo(f"Pasta de resultados do .BAT: {resultado_dir}")
-        log_robo(f"Modo de tratamento final: {modo}\n")
-
-        total_arquivos = len(robo_arquivos)
-
-        log_robo("Limpando pasta de resultados antes de iniciar...")
-        for f in os.listdir(resultado_dir):
-            full = os.path.join(resultado_dir, f)
-            if os.path.isfile(full) and any(full.lower().endswith(ext) for ext in [".xlsx", ".xls", ".csv", ".txt"]):
-                safe_remove_file(full)
-        log_robo("Pasta de resultados limpa.\n")
-
-        for idx, arquivo in enumerate(robo_arquivos, start=1):
-            progress_robo["value"] = (idx - 1) / total_arquivos * 40
-            janela.update_idletasks()
-
-            log_robo(f"[{idx}/{total_arquivos}] Preparando arquivo: {arquivo}")
-            try:
-                base_name = os.path.basename(arquivo)
-                dest_path = os.path.join(bat_dir, base_name)
-                shutil.copy2(arquivo, dest_path)
-                log_robo(f"→ Copiado para pasta do .BAT: {dest_path}")
-            except Exception as e:
-                log_robo(f"❌ Erro ao copiar arquivo para pasta do .BAT: {e}")
-                continue
-
-            try:
-                log_robo("→ Executando .BAT...")
-                proc = subprocess.Popen(
-                    bat_path,
-                    cwd=bat_dir,
-                    stdin=subprocess.PIPE,
-                    shell=True
-                )
-                proc.communicate(input=b"\n")
-                log_robo("→ Execução do .BAT concluída.")
-            except Exception as e:
-                log_robo(f"❌ Erro ao executar .BAT: {e}")
-                continue
-
-            if idx < total_arquivos:
-                log_robo("⏱ Aguardando 6 minutos antes do próximo arquivo...")
-                janela.update_idletasks()
-                time.sleep(6 * 60)
-                log_robo("✔ Intervalo concluído.\n")
-            else:
-                log_robo("Último arquivo processado.\n")
-
-            progress_robo["value"] = idx / total_arquivos * 60
-            janela.update_idletasks()
-
-        log_robo("Lendo arquivos de resultados gerados pelo .BAT...")
-        result_files = []
-        for f in os.listdir(resultado_dir):
-            full = os.path.join(resultado_dir, f)
-            if os.path.isfile(full) and full.lower().endswith((".xlsx", ".xls", ".csv", ".txt")):
-                result_files.append(full)
-
-        if not result_files:
-            log_robo("⚠️ Nenhum arquivo de resultado encontrado na pasta informada.")
-            messagebox.showwarning("Aviso", "Nenhum arquivo de resultado foi encontrado na pasta de resultados.")
-            progress_robo["value"] = 100
-            return
-
-        log_robo(f"Encontrados {len(result_files)} arquivo(s) de resultado.")
-        dfs = []
-        for fpath in result_files:
-            try:
-                log_robo(f"Lendo resultado: {fpath}")
-                dfs.append(read_table(fpath))
-            except Exception as e:
-                log_robo(f"❌ Erro ao ler resultado {fpath}: {e}")
-
-        if not dfs:
-            log_robo("⚠️ Não foi possível ler nenhum arquivo de resultado.")
-            progress_robo["value"] = 100
-            return
-
-        df_total = pd.concat(dfs, ignore_index=True)
-        log_robo(f"Total de linhas combinadas (antes da filtragem): {len(df_total)}")
-
-        log_robo("Aplicando filtro: remover linhas com 'Nao disponivel' e manter apenas 'Novo cliente'...")
-        df_str = df_total.astype(str)
-
-        mask_nao_disponivel = df_str.apply(
-            lambda col: col.str.contains("Nao disponivel", case=False, na=False)
-        ).any(axis=1)
-
-        mask_novo_cliente = df_str.apply(
-            lambda col: col.str.contains("Novo cliente", case=False, na=False)
-        ).any(axis=1)
-
-        antes = len(df_total)
-        df_filtrado = df_total[~mask_nao_disponivel & mask_novo_cliente].copy()
-        removidas = antes - len(df_filtrado)
-        log_robo(f"Linhas removidas pelo filtro: {removidas}")
-        log_robo(f"Linhas finais após filtro: {len(df_filtrado)}")
-
-        if df_filtrado.empty:
-            log_robo("⚠️ Nenhuma linha restante após aplicar o filtro.")
-            messagebox.showinfo("Concluído", "Robô C6 finalizado, mas nenhuma linha restou após o filtro.")
-            progress_robo["value"] = 100
-            return
-
-        progress_robo["value"] = 80
-        janela.update_idletasks()
-
-        if modo == "Lemit":
-            log_robo("Modo Lemit: gerando 1 planilha única com o resultado final...")
-            out_path = os.path.join(resultado_dir, "robo_c6_final_LEMIT.xlsx")
-            save_to_excel(df_filtrado, out_path)
-            log_robo(f"✅ Arquivo final gerado: {out_path}")
-        else:
-            log_robo("Modo Simples: separando resultado em planilhas de 5.000 linhas...")
-            total = len(df_filtrado)
-            chunk_size = 5000
-            parts = math.ceil(total / chunk_size)
-            log_robo(f"Total de linhas: {total} → {parts} arquivo(s) de até {chunk_size} linhas.")
-
-            for i in range(parts):
-                start = i * chunk_size
-                end = min(start + chunk_size, total)
-                part = df_filtrado.iloc[start:end]
-                out_path = os.path.join(resultado_dir, f"robo_c6_SIMPLES_part{i+1}.xlsx")
-                save_to_excel(part, out_path)
-                log_robo(f"✅ Parte {i+1} salva: {out_path} ({len(part)} linhas)")
-
-        progress_robo["value"] = 100
-        janela.update_idletasks()
-        log_robo("\n🎉 Robô C6 concluído com sucesso!")
-        messagebox.showinfo("Concluído", "Robô C6 finalizado com sucesso!")
+        arquivos = list(robo_arquivos)
+
+        def _fim(res: dict):
+            if res["status"] == "sem_resultados":
+                messagebox.showwarning("Aviso", "Nenhum arquivo de resultado foi encontrado na pasta de resultados.")
+            elif res["status"] == "vazio":
+                messagebox.showinfo("Concluído", "Robô C6 finalizado, mas nenhuma linha restou após o filtro.")
+            elif res["status"] == "ok":
+                messagebox.showinfo("Concluído", "Robô C6 finalizado com sucesso!")
+
+        jobs.submit(
+            JOB_ROBO,
+            lambda **cb: run_robo_c6(arquivos, bat_path, resultado_dir, modo=modo, **cb),
+            out_dir=resultado_dir,
+            log=log_robo,
+            progress=lambda pct: progress_robo.configure(value=pct),
+            on_done=_fim,
+            on_error=job_error_handler(log_robo, "❌ Erro fatal no Robô C6", "Ocorreu um erro durante o Robô C6."),
+        )
 
     except Exception as e:
         log_robo(f"\n❌ Erro fatal no Robô C6: {e}")
@@ -1029,7 +695,6 @@ def executar_robo_c6():
 def log_manip(msg: str):
     txt_log_manip.insert(tk.END, msg + "\n")
     txt_log_manip.see(tk.END)
-    janela.update_idletasks()
 
 def selecionar_arquivos_manip():
     paths = filedialog.askopenfilenames(
@@ -1060,61 +725,39 @@ def executar_manipulacao():
             messagebox.showwarning("Aviso", "Selecione a pasta de saída.")
             return
 
-        os.makedirs(out_dir, exist_ok=True)
-
         modo = manip_modo_var.get()
-        log_manip("=== Manipulação de planilhas ===")
-        log_manip(f"Modo: {modo}")
-        log_manip(f"Arquivos: {len(manip_arquivos)}")
-        log_manip(f"Saída: {out_dir}\n")
-
-        log_manip("1) Lendo planilhas...")
-        dfs = []
-        for f in manip_arquivos:
-            log_manip(f"→ Lendo: {f}")
-            dfs.append(read_table(f))
-
-        df_all = pd.concat(dfs, ignore_index=True)
-        log_manip(f"✅ Total combinado: {len(df_all)} linhas.\n")
-
-        if modo == "juntar":
-            out_path = os.path.join(out_dir, "planilhas_juntas.xlsx")
-            safe_remove_file(out_path)
-            log_manip("2) Salvando planilha única...")
-            save_to_excel(df_all, out_path)
-            log_manip(f"✅ Gerado: {out_path}")
-            messagebox.showinfo("Concluído", f"Planilhas juntadas com sucesso!\n\n{out_path}")
-            return
-
-        # separar
-        try:
-            chunk = int(manip_linhas_por_planilha.get().strip())
-            if chunk <= 0:
-                raise ValueError()
-        except:
-            messagebox.showerror("Erro", "Quantidade de linhas por planilha inválida.")
-            return
-
-        total = len(df_all)
-        parts = math.ceil(total / chunk)
-        log_manip(f"2) Separando em partes de {chunk} linhas → {parts} arquivos...")
-
-        for i in range(parts):
-            start = i * chunk
-            end = min(start + chunk, total)
-            part = df_all.iloc[start:end]
-            out_path = os.path.join(out_dir, f"separado_part{i+1}.xlsx")
-            safe_remove_file(out_path)
-            save_to_excel(part, out_path)
-            log_manip(f"✅ Parte {i+1}: {out_path} ({len(part)} linhas)")
-
-        messagebox.showinfo("Concluído", f"Separação concluída! Gerados {parts} arquivo(s) em:\n\n{out_dir}")
+        chunk = None
+        if modo != "juntar":
+            try:
+                chunk = int(manip_linhas_por_planilha.get().strip())
+                if chunk <= 0:
+                    raise ValueError()
+            except:
+                messagebox.showerror("Erro", "Quantidade de linhas por planilha inválida.")
+                return
+
+        arquivos = list(manip_arquivos)
+
+        def _fim(res: dict):
+            if modo == "juntar":
+                messagebox.showinfo("Concluído", f"Planilhas juntadas com sucesso!\n\n{res['outputs'][0]}")
+            else:
+                messagebox.showinfo("Concluído", f"Separação concluída! Gerados {len(res['outputs'])} arquivo(s) em:\n\n{out_dir}")
+
+        jobs.submit(
+            JOB_MANIP,
+            lambda **cb: run_manipulacao(arquivos, out_dir, modo=modo, linhas_por_planilha=chunk, **cb),
+            out_dir=out_dir,
+            log=log_manip,
+            progress=lambda pct: None,
+            on_done=_fim,
+            on_error=job_error_handler(log_manip, "❌ Erro", "Ocorreu um erro na manipulação."),
+        )
 
     except Exception as e:
         log_manip(f"\n❌ Erro: {e}")
         messagebox.showerror("Erro", f"Ocorreu um erro na manipulação.\n\n{e}")
 
-
 # =======================================================================
 #           INTERFACE GRÁFICA (TKINTER)
 # =======================================================================
@@ -1613,7 +1256,6 @@ frames_map = {
 def set_status(msg: str):
     try:
         sidebar_status_label.config(text=msg)
-        janela.update_idletasks()
     except Exception:
         pass
 
@@ -1799,6 +1441,26 @@ limpeza_col_cnpj = tk.StringVar()
 tel_has55_var = tk.StringVar(value="Não")
 add9_var = tk.BooleanVar(value=False)
 add55_var = tk.BooleanVar(value=False)
+# - max_tel_var: quantos números do campo Telefones viram colunas (Telefone1..N)
+max_tel_var = tk.StringVar(value="2")
+# - bloom_var / bloom_fp_var: pré-filtro Bloom na frente das listas (taxa de falso positivo alvo)
+bloom_var = tk.BooleanVar(value=False)
+bloom_fp_var = tk.StringVar(value=str(BLOOM_DEFAULT_FP))
+# - cnpj_check_var: exclui linhas cujo CNPJ não passa nos dígitos verificadores
+cnpj_check_var = tk.BooleanVar(value=True)
+# - procs_var: processos para duplicidade + filtros (0 = automático, 1 = sem paralelismo)
+procs_var = tk.StringVar(value="0")
+# - memoria_var: "Automático" / "Em memória" / "Em disco" (duplicidade num SQLite temporário, bases maiores que a RAM)
+memoria_var = tk.StringVar(value="Automático")
+# - disco_min_*: no "Automático", entra em disco a partir deste tamanho de arquivo (MB) ou nº de linhas
+disco_min_mb_var = tk.StringVar(value=f"{LIMPEZA_DISCO_MIN_BYTES / 1024 ** 2:g}")
+disco_min_linhas_var = tk.StringVar(value=str(LIMPEZA_DISCO_MIN_ROWS))
+# - historico_*: histórico de entregas (pasta, janela em dias, checar CNPJ, registrar as filtradas)
+historico_dir_var = tk.StringVar()
+historico_dias_var = tk.StringVar(value=str(HISTORICO_JANELA_DIAS))
+historico_cnpj_var = tk.BooleanVar(value=True)
+historico_registrar_var = tk.BooleanVar(value=True)
+historico_info_var = tk.StringVar(value="Nenhum histórico selecionado.")
 
 
 lbl_limpeza_title = tk.Label(frame_limpeza, text="Limpeza de dados", bg=BG_PRINCIPAL, fg=FG_TEXTO, font=fonte_titulo)
@@ -1849,14 +1511,17 @@ frame_limpeza_left.pack(side=tk.LEFT, fill="both", expand=True, padx=(0, 6))
 frame_limpeza_right = tk.Frame(frame_limpeza_main, bg=BG_PRINCIPAL)
 frame_limpeza_right.pack(side=tk.LEFT, fill="both", expand=True, padx=(6, 0))
 
-ttk.Button(frame_limpeza_left, text="Iniciar automação de limpeza", style="Accent.TButton", command=executar_limpeza_dados).pack(pady=(0, 10), anchor="w")
+frame_limpeza_run = tk.Frame(frame_limpeza_left, bg=BG_PRINCIPAL)
+frame_limpeza_run.pack(pady=(0, 10), anchor="w")
+ttk.Button(frame_limpeza_run, text="Iniciar automação de limpeza", style="Accent.TButton", command=executar_limpeza_dados).pack(side=tk.LEFT)
+ttk.Button(frame_limpeza_run, text="Cancelar", style="Warn.TButton", command=lambda: jobs.cancel(JOB_LIMPEZA)).pack(side=tk.LEFT, padx=(8, 0))
 
 frame_modo = ttk.Labelframe(frame_limpeza_left, text="Modo de limpeza da Razão Social", style="Frame.TLabelframe", padding=10)
 frame_modo.pack(padx=0, pady=6, fill="x")
 
 tk.Label(frame_modo, text="Selecione o modo:", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).pack(side=tk.LEFT, padx=(5, 5))
 combo_modo = ttk.Combobox(frame_modo, textvariable=clean_mode_var, state="readonly", width=20,
-                          values=["Simples", "Lemit", "Callix", "Tallos"])
+                          values=CLEAN_MODES)
 combo_modo.pack(side=tk.LEFT, padx=5)
 combo_modo.current(0)
 
@@ -1875,6 +1540,31 @@ chk_add9.grid(row=1, column=0, columnspan=2, padx=5, pady=4, sticky="w")
 chk_add55 = ttk.Checkbutton(frame_tel_opts, text="Adicionar 55 na frente (código país)", variable=add55_var)
 chk_add55.grid(row=2, column=0, columnspan=2, padx=5, pady=4, sticky="w")
 
+tk.Label(frame_tel_opts, text="Telefones por linha:", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).grid(row=3, column=0, padx=5, pady=5, sticky="w")
+spin_max_tel = ttk.Spinbox(frame_tel_opts, textvariable=max_tel_var, from_=1, to=10, width=8)
+spin_max_tel.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
+tk.Label(frame_tel_opts, text="Processos (0 = automático):", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).grid(row=4, column=0, padx=5, pady=5, sticky="w")
+spin_procs = ttk.Spinbox(frame_tel_opts, textvariable=procs_var, from_=0, to=64, width=8)
+spin_procs.grid(row=4, column=1, padx=5, pady=5, sticky="w")
+
+tk.Label(frame_tel_opts, text="Processamento:", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).grid(row=5, column=0, padx=5, pady=5, sticky="w")
+combo_memoria = ttk.Combobox(frame_tel_opts, textvariable=memoria_var, state="readonly", width=14,
+                             values=["Automático", "Em memória", "Em disco"])
+combo_memoria.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+
+tk.Label(frame_tel_opts, text="Em disco a partir de (MB):", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).grid(row=6, column=0, padx=5, pady=5, sticky="w")
+tk.Entry(frame_tel_opts, textvariable=disco_min_mb_var, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=10).grid(row=6, column=1, padx=5, pady=5, sticky="w")
+tk.Label(frame_tel_opts, text="ou a partir de (linhas):", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).grid(row=7, column=0, padx=5, pady=5, sticky="w")
+tk.Entry(frame_tel_opts, textvariable=disco_min_linhas_var, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=12).grid(row=7, column=1, padx=5, pady=5, sticky="w")
+
+# (NOVO) Opções de CNPJ
+frame_cnpj_opts = ttk.Labelframe(frame_limpeza_left, text="Opções de CNPJ", style="Frame.TLabelframe", padding=10)
+frame_cnpj_opts.pack(padx=0, pady=6, fill="x")
+
+chk_cnpj_check = ttk.Checkbutton(frame_cnpj_opts, text="Excluir CNPJ inválido (dígitos verificadores)", variable=cnpj_check_var)
+chk_cnpj_check.grid(row=0, column=0, columnspan=2, padx=5, pady=4, sticky="w")
+
 # Arquivo base
 frame_base = ttk.Labelframe(frame_limpeza_left, text='1) Arquivo "empresas bruto"', style="Frame.TLabelframe", padding=10)
 frame_base.pack(padx=0, pady=6, fill="x")
@@ -1918,7 +1608,7 @@ combo_limpeza_cnpj.pack(fill="x", pady=2)
 def _selecionar_arquivo_em_var(var: tk.StringVar, titulo: str):
     path = filedialog.askopenfilename(
         title=titulo,
-        filetypes=[("Excel/CSV/TXT", "*.xlsx *.xls *.csv *.txt"), ("Todos os arquivos", "*.*")]
+        filetypes=[("Excel/CSV/TXT", "*.xlsx *.xls *.csv *.txt"), ("Store de blocklist", STORE_MANIFEST), ("Todos os arquivos", "*.*")]
     )
     if path:
         var.set(path)
@@ -1949,6 +1639,184 @@ frame_f5.pack(padx=0, pady=6, fill="x")
 tk.Entry(frame_f5, textvariable=nao_perturbe_4_path, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=50).pack(side=tk.LEFT, padx=5, pady=3)
 ttk.Button(frame_f5, text="Selecionar", style="Primary.TButton", command=lambda: _selecionar_arquivo_em_var(nao_perturbe_4_path, "Selecione Não Perturbe 4")).pack(side=tk.LEFT, padx=5)
 
+# (NOVO) Store de blocklist incremental (base + deltas diários)
+# Os campos 3..7 aceitam a pasta do store (ou o manifest.json dele) no lugar do arquivo.
+store_dir_var = tk.StringVar()
+store_info_var = tk.StringVar(value="Nenhum store selecionado.")
+
+def _store_atual(criar: bool = False) -> Optional[BlocklistStore]:
+    d = store_dir_var.get().strip()
+    if not d:
+        messagebox.showwarning("Aviso", "Selecione a pasta do store.")
+        return None
+    if BlocklistStore.locate(d):
+        return BlocklistStore(d)
+    if criar:
+        return BlocklistStore.create(d, strip55=(tel_has55_var.get() == "Sim"))
+    messagebox.showwarning("Aviso", "A pasta não contém um store. Use 'Base completa' para criar.")
+    return None
+
+def _store_atualiza_info():
+    d = store_dir_var.get().strip()
+    if d and BlocklistStore.locate(d):
+        store_info_var.set(BlocklistStore(d).describe())
+    else:
+        store_info_var.set("Nenhum store selecionado.")
+
+def selecionar_store_dir():
+    path = filedialog.askdirectory(title="Selecione (ou crie) a pasta do store de blocklist")
+    if path:
+        store_dir_var.set(path)
+        _store_atualiza_info()
+
+def _store_compactar_se_preciso(store: BlocklistStore, forcar: bool = False):
+    if not (forcar or store.needs_compaction()):
+        return
+    log_limpeza("🧱 Compactando store em segundo plano...")
+
+    def _fim(_compactou):
+        _store_atualiza_info()
+        log_limpeza(f"✅ Store compactado: {store.describe()}")
+
+    jobs.submit(
+        JOB_STORE,
+        lambda **cb: store.compact(),
+        out_dir=store.directory,
+        log=log_limpeza,
+        progress=lambda pct: None,
+        on_done=_fim,
+        on_error=job_error_handler(log_limpeza, "❌ Store", "Falha ao compactar o store."),
+    )
+
+def _store_operacao(op: str):
+    """Base completa / deltas: leitura + compilação da lista rodam como job (a janela não trava)."""
+    try:
+        store = _store_atual(criar=(op == "base"))
+        if not store:
+            return
+        path = filedialog.askopenfilename(
+            title={"base": "Exportação completa", "add": "Delta: telefones incluídos", "remove": "Delta: telefones removidos"}[op],
+            filetypes=[("Excel/CSV/TXT", "*.xlsx *.xls *.csv *.txt"), ("Todos os arquivos", "*.*")]
+        )
+        if not path:
+            return
+    except Exception as e:
+        log_limpeza(f"❌ Store: {e}")
+        messagebox.showerror("Erro", f"Falha ao atualizar o store.\n\n{e}")
+        return
+
+    aplica = {"base": store.set_base, "add": store.add, "remove": store.remove}[op]
+    t0 = time.perf_counter()
+
+    def _fim(m: dict):
+        log_limpeza(f"✅ Store atualizado ({op}, {os.path.basename(path)}) em {time.perf_counter() - t0:.1f}s: {store.describe(m)}")
+        _store_atualiza_info()
+        _store_compactar_se_preciso(store)
+
+    if jobs.submit(
+        JOB_STORE,
+        lambda **cb: aplica(path),
+        out_dir=store.directory,
+        log=log_limpeza,
+        progress=lambda pct: None,
+        on_done=_fim,
+        on_error=job_error_handler(log_limpeza, "❌ Store", "Falha ao atualizar o store."),
+    ):
+        log_limpeza(f"⏳ Store: {op} ({os.path.basename(path)}) em segundo plano...")
+
+def compactar_store():
+    store = _store_atual()
+    if store:
+        _store_compactar_se_preciso(store, forcar=True)
+
+frame_store = ttk.Labelframe(frame_limpeza_left, text="Store de blocklist (deltas diários, opcional)", style="Frame.TLabelframe", padding=10)
+frame_store.pack(padx=0, pady=6, fill="x")
+frame_store_dir = tk.Frame(frame_store, bg=BG_FRAME)
+frame_store_dir.pack(fill="x")
+tk.Entry(frame_store_dir, textvariable=store_dir_var, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=50).pack(side=tk.LEFT, padx=5, pady=3)
+ttk.Button(frame_store_dir, text="Pasta", style="Warn.TButton", command=selecionar_store_dir).pack(side=tk.LEFT, padx=5)
+frame_store_btns = tk.Frame(frame_store, bg=BG_FRAME)
+frame_store_btns.pack(fill="x", pady=(4, 0))
+ttk.Button(frame_store_btns, text="Base completa", style="Primary.TButton", command=lambda: _store_operacao("base")).pack(side=tk.LEFT, padx=5)
+ttk.Button(frame_store_btns, text="+ Delta", style="Primary.TButton", command=lambda: _store_operacao("add")).pack(side=tk.LEFT, padx=5)
+ttk.Button(frame_store_btns, text="− Delta", style="Primary.TButton", command=lambda: _store_operacao("remove")).pack(side=tk.LEFT, padx=5)
+ttk.Button(frame_store_btns, text="Compactar", style="Primary.TButton", command=compactar_store).pack(side=tk.LEFT, padx=5)
+tk.Label(frame_store, textvariable=store_info_var, bg=BG_FRAME, fg=FG_SECUNDARIO, font=("Segoe UI", 9)).pack(anchor="w", padx=5, pady=(4, 0))
+
+# (NOVO) Histórico de entregas (não entregar de novo o que já saiu nos últimos N dias)
+def _historico_atualiza_info():
+    d = historico_dir_var.get().strip()
+    if d and os.path.isfile(os.path.join(d, HISTORICO_MANIFEST)):
+        historico_info_var.set(DeliveryHistory(d).describe())
+    elif d:
+        historico_info_var.set("Pasta nova: o histórico é criado na primeira limpeza.")
+    else:
+        historico_info_var.set("Nenhum histórico selecionado.")
+
+def selecionar_historico_dir():
+    path = filedialog.askdirectory(title="Selecione (ou crie) a pasta do histórico de entregas")
+    if path:
+        historico_dir_var.set(path)
+        _historico_atualiza_info()
+
+def importar_historico():
+    d = historico_dir_var.get().strip()
+    if not d:
+        messagebox.showwarning("Aviso", "Selecione a pasta do histórico.")
+        return
+    path = filedialog.askopenfilename(
+        title="Planilha já entregue (telefones + CNPJ)",
+        filetypes=[("Excel/CSV/TXT", "*.xlsx *.xls *.csv *.txt"), ("Todos os arquivos", "*.*")]
+    )
+    if not path:
+        return
+    t0 = time.perf_counter()
+    strip55 = (tel_has55_var.get() == "Sim")
+
+    def _importar(log, progress, cancel):
+        # importação + compactação rodam na thread do job (a janela não trava)
+        hist = DeliveryHistory.open(d)
+        m = hist.importar(path, strip55=strip55)
+        log(f"✅ Histórico atualizado ({os.path.basename(path)}) em {time.perf_counter() - t0:.1f}s: {hist.describe(m)}")
+        if hist.needs_compaction(m):
+            check_cancel(cancel)
+            hist.compact()
+            log(f"🧱 Histórico compactado: {hist.describe()}")
+        return m
+
+    if jobs.submit(
+        JOB_HISTORICO,
+        _importar,
+        out_dir=d,
+        log=log_limpeza,
+        progress=lambda pct: None,
+        on_done=lambda _m: _historico_atualiza_info(),
+        on_error=job_error_handler(log_limpeza, "❌ Histórico", "Falha ao importar para o histórico."),
+    ):
+        log_limpeza(f"⏳ Histórico: importando {os.path.basename(path)} em segundo plano...")
+
+frame_hist = ttk.Labelframe(frame_limpeza_left, text="Histórico de entregas (opcional)", style="Frame.TLabelframe", padding=10)
+frame_hist.pack(padx=0, pady=6, fill="x")
+frame_hist_dir = tk.Frame(frame_hist, bg=BG_FRAME)
+frame_hist_dir.pack(fill="x")
+tk.Entry(frame_hist_dir, textvariable=historico_dir_var, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=50).pack(side=tk.LEFT, padx=5, pady=3)
+ttk.Button(frame_hist_dir, text="Pasta", style="Warn.TButton", command=selecionar_historico_dir).pack(side=tk.LEFT, padx=5)
+ttk.Button(frame_hist_dir, text="Importar entregues", style="Primary.TButton", command=importar_historico).pack(side=tk.LEFT, padx=5)
+frame_hist_opts = tk.Frame(frame_hist, bg=BG_FRAME)
+frame_hist_opts.pack(fill="x", pady=(4, 0))
+tk.Label(frame_hist_opts, text="Janela (dias):", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).pack(side=tk.LEFT, padx=5)
+ttk.Spinbox(frame_hist_opts, textvariable=historico_dias_var, from_=0, to=3650, width=6).pack(side=tk.LEFT, padx=5)
+ttk.Checkbutton(frame_hist_opts, text="Também por CNPJ", variable=historico_cnpj_var).pack(side=tk.LEFT, padx=5)
+ttk.Checkbutton(frame_hist_opts, text="Registrar filtradas como entregues", variable=historico_registrar_var).pack(side=tk.LEFT, padx=5)
+tk.Label(frame_hist, textvariable=historico_info_var, bg=BG_FRAME, fg=FG_SECUNDARIO, font=("Segoe UI", 9)).pack(anchor="w", padx=5, pady=(4, 0))
+
+# (NOVO) Pré-filtro Bloom (listas muito grandes)
+frame_bloom = ttk.Labelframe(frame_limpeza_left, text="Pré-filtro Bloom (listas muito grandes, opcional)", style="Frame.TLabelframe", padding=10)
+frame_bloom.pack(padx=0, pady=6, fill="x")
+ttk.Checkbutton(frame_bloom, text="Usar Bloom antes do índice exato", variable=bloom_var).grid(row=0, column=0, columnspan=2, padx=5, pady=4, sticky="w")
+tk.Label(frame_bloom, text="Falso positivo alvo:", bg=BG_FRAME, fg=FG_TEXTO, font=fonte_label).grid(row=1, column=0, padx=5, pady=5, sticky="w")
+tk.Entry(frame_bloom, textvariable=bloom_fp_var, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=10).grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
 # Pasta saída
 frame_out = ttk.Labelframe(frame_limpeza_left, text='8) Diretório de saída (onde salvar os 2 arquivos)', style="Frame.TLabelframe", padding=10)
 frame_out.pack(padx=0, pady=6, fill="x")
@@ -1972,7 +1840,7 @@ progress_limpeza = ttk.Progressbar(frame_limpeza_right, length=400, mode="determ
 progress_limpeza.pack(pady=(0, 8), padx=4, fill="x")
 
 # (NOVO) área de gráficos
-frame_graficos_limpeza = ttk.Labelframe(frame_limpeza_right, text="Gráficos (após execução)", style="Frame.TLabelframe", padding=10)
+frame_graficos_limpeza = ttk.Labelframe(frame_limpeza_right, text="Gráficos (atualizados durante a execução)", style="Frame.TLabelframe", padding=10)
 frame_graficos_limpeza.pack(padx=4, pady=4, fill="both", expand=False)
 lbl_graf_info = tk.Label(frame_graficos_limpeza, text="Execute a limpeza para gerar os gráficos.",
                          bg=BG_FRAME, fg=FG_SECUNDARIO, font=("Segoe UI", 10))
@@ -2035,7 +1903,6 @@ frame_wpp_right.pack(side=tk.LEFT, fill="both", expand=True, padx=(6, 0))
 def log_wpp(msg: str):
     txt_log_wpp.insert(tk.END, msg + "\n")
     txt_log_wpp.see(tk.END)
-    janela.update_idletasks()
 
 def selecionar_base_wpp():
     path = filedialog.askopenfilename(
@@ -2056,24 +1923,14 @@ def escanear_colunas_wpp():
         if not in_path:
             messagebox.showwarning("Aviso", "Selecione a planilha primeiro.")
             return
-        log_wpp("🔎 Escaneando colunas...")
-        df = read_table(in_path)
+        log_wpp("🔎 Escaneando colunas (prévia)...")
+        df = read_table_header(in_path)
         cols = list(df.columns)
         combo_wpp_tel["values"] = cols
 
         # sugestão
-        normals = {normalize_col_name(c): c for c in cols}
-        sug = ""
-        for key in ["telefone", "telefones", "tel", "fone", "celular", "whatsapp", "wpp"]:
-            kk = normalize_col_name(key)
-            if kk in normals:
-                sug = normals[kk]
-                break
-        if not sug:
-            for c in cols:
-                if any(k in normalize_col_name(c) for k in ["tel", "fone", "cel", "wpp", "whats"]):
-                    sug = c
-                    break
+        sug = suggest_col(cols, ["telefone", "telefones", "tel", "fone", "celular", "whatsapp", "wpp"],
+                          contains=["tel", "fone", "cel", "wpp", "whats"])
         if sug:
             wpp_col_tel.set(sug)
 
@@ -2097,76 +1954,10 @@ def abrir_pasta_wpp():
     except Exception as e:
         messagebox.showerror("Erro", f"Não foi possível abrir a pasta.\n\n{e}")
 
-# --- Helpers WhatsApp ---
-try:
-    import phonenumbers
-    from phonenumbers import PhoneNumberType
-except Exception:
-    phonenumbers = None
-    PhoneNumberType = None
-
-def _digits_only(s: str) -> str:
-    return re.sub(r"\D", "", str(s or ""))
-
-def _apply_has55_rule(digits: str, has55: str) -> str:
-    # Se usuário disse "Sim", removemos 55 somente se estiver no começo.
-    if has55 == "Sim" and digits.startswith("55"):
-        return digits[2:]
-    return digits
-
-def _ensure_add55(digits_local: str) -> str:
-    # Adiciona 55 se estiver ausente e parecer BR (10 ou 11 dígitos)
-    if digits_local.startswith("55"):
-        return digits_local
-    if len(digits_local) in (10, 11):
-        return "55" + digits_local
-    return digits_local
-
-def _ensure_add9_local(digits_local: str, has9: str) -> str:
-    # has9 == "Não" => se for 10 dígitos (DD + 8), vira 11 (DD + 9 + 8)
-    if has9 == "Não" and len(digits_local) == 10:
-        ddd = digits_local[:2]
-        rest = digits_local[2:]
-        return ddd + "9" + rest
-    return digits_local
-
-def _format_e164(digits: str) -> str:
-    # Retorna no formato +5511999999999 quando possível
-    digits = _digits_only(digits)
-    if digits.startswith("55") and len(digits) in (12, 13):
-        return "+" + digits
-    if len(digits) in (10, 11):
-        return "+55" + digits
-    if digits.startswith("+"):
-        return digits
-    return "+" + digits if digits else ""
-
-def _phonenumbers_validate_br(digits_e164: str):
-    """
-    Retorna: (is_valid, is_mobile, tipo_str, motivo)
-    """
-    if not phonenumbers:
-        return (False, False, "Indisponível", "Biblioteca phonenumbers não instalada")
-    if not digits_e164:
-        return (False, False, "Inválido", "Telefone vazio")
-    try:
-        # parse aceita +E164
-        p = phonenumbers.parse(digits_e164, None)
-        if not phonenumbers.is_valid_number(p):
-            return (False, False, "Inválido", "Número inválido (phonenumbers)")
-        t = phonenumbers.number_type(p)
-        # Para evitar falsos negativos: BR às vezes vem como FIXED_LINE_OR_MOBILE
-        is_mobile = t in (PhoneNumberType.MOBILE, PhoneNumberType.FIXED_LINE_OR_MOBILE)
-        tipo_str = "Móvel" if is_mobile else "Não móvel"
-        return (True, is_mobile, tipo_str, "" if is_mobile else "Não é móvel")
-    except Exception as e:
-        return (False, False, "Inválido", f"Erro ao validar: {e}")
-
 def executar_limpeza_wpp():
     try:
         txt_log_wpp.delete("1.0", tk.END)
         progress_wpp["value"] = 0
-        janela.update_idletasks()
 
         in_path = wpp_base_path.get().strip()
         if not in_path:
@@ -2179,104 +1970,21 @@ def executar_limpeza_wpp():
             return
 
         out_dir = wpp_out_dir.get().strip() or os.path.dirname(in_path)
-        os.makedirs(out_dir, exist_ok=True)
-
-        has55 = wpp_has55_var.get()
-        has9 = wpp_has9_var.get()
-
-        log_wpp("=== Limpeza WhatsApp ===")
-        log_wpp(f"📄 Arquivo: {in_path}")
-        log_wpp(f"📌 Coluna telefone: {col_tel}")
-        log_wpp(f"❓ Números têm 55? {has55} (Se Sim: remove 55 no início)")
-        log_wpp(f"❓ Números têm dígito 9? {has9} (Se Não: adiciona 9 em DD+8)")
-        if not phonenumbers:
-            log_wpp("⚠️ Biblioteca 'phonenumbers' não está instalada. A validação ficará indisponível.")
-            log_wpp("   Instale com: pip install phonenumbers\n")
-
-        progress_wpp["value"] = 10
-        janela.update_idletasks()
-
-        df_raw = read_table(in_path)
-        if col_tel not in df_raw.columns:
-            messagebox.showerror("Erro", f"Coluna '{col_tel}' não existe no arquivo.")
-            return
-
-        progress_wpp["value"] = 25
-        janela.update_idletasks()
-
-        # Processa
-        out_rows = []
-        total = len(df_raw)
-        for i, raw_tel in enumerate(df_raw[col_tel].astype(str).tolist(), start=1):
-            digits = _digits_only(raw_tel)
-            motivo = ""
-
-            if not digits:
-                out_rows.append({
-                    "Telefone_original": raw_tel,
-                    "Telefone_normalizado": "",
-                    "Telefone_E164": "",
-                    "Valido": "Não",
-                    "Tipo": "Inválido",
-                    "Motivo": "Telefone vazio"
-                })
-                continue
-
-            # 1) remove 55 se usuário disse que já tem
-            local = _apply_has55_rule(digits, has55)
-
-            # 2) adiciona 9 se necessário
-            local = _ensure_add9_local(local, has9)
-
-            # 3) garante 55 (para E.164) — aqui sempre padronizamos em +55...
-            full = _ensure_add55(local)
-            e164 = _format_e164(full)
-
-            # 4) valida e filtra móvel
-            is_valid, is_mobile, tipo_str, motivo_v = _phonenumbers_validate_br(e164)
-            if not is_valid:
-                motivo = motivo_v or "Inválido"
-            elif not is_mobile:
-                motivo = motivo_v or "Não é móvel"
-
-            out_rows.append({
-                "Telefone_original": raw_tel,
-                "Telefone_normalizado": full,
-                "Telefone_E164": e164,
-                "Valido": "Sim" if (is_valid and is_mobile) else "Não",
-                "Tipo": tipo_str,
-                "Motivo": motivo
-            })
-
-            if i % 500 == 0:
-                progress_wpp["value"] = 25 + int((i / max(total, 1)) * 55)
-                janela.update_idletasks()
-
-        df_out = pd.DataFrame(out_rows)
-
-        # separa
-        df_validos = df_out[df_out["Valido"] == "Sim"].copy()
-        df_excluidos = df_out[df_out["Valido"] != "Sim"].copy()
-
-        progress_wpp["value"] = 85
-        janela.update_idletasks()
-
-        out_valid = os.path.join(out_dir, "whatsapp_validos.xlsx")
-        out_excl = os.path.join(out_dir, "whatsapp_excluidos.xlsx")
-        safe_remove_file(out_valid)
-        safe_remove_file(out_excl)
-
-        save_to_excel(df_validos, out_valid)
-        save_to_excel(df_excluidos, out_excl)
-
-        progress_wpp["value"] = 100
-        janela.update_idletasks()
-
-        log_wpp("🎉 Concluído!")
-        log_wpp(f"✅ Válidos (móvel + válido): {len(df_validos)} → {out_valid}")
-        log_wpp(f"✅ Excluídos: {len(df_excluidos)} → {out_excl}")
-
-        messagebox.showinfo("Concluído", f"Limpeza WhatsApp finalizada!\n\nVálidos: {len(df_validos)}\nExcluídos: {len(df_excluidos)}\n\nSaída: {out_dir}")
+        has55 = (wpp_has55_var.get() == "Sim")
+        has9 = (wpp_has9_var.get() == "Sim")
+
+        def _fim(res: dict):
+            messagebox.showinfo("Concluído", f"Limpeza WhatsApp finalizada!\n\nVálidos: {res['validos']}\nExcluídos: {res['excluidos']}\n\nSaída: {out_dir}")
+
+        jobs.submit(
+            JOB_WPP,
+            lambda **cb: run_limpeza_wpp(in_path, col_tel=col_tel, out_dir=out_dir, has55=has55, has9=has9, **cb),
+            out_dir=out_dir,
+            log=log_wpp,
+            progress=lambda pct: progress_wpp.configure(value=pct),
+            on_done=_fim,
+            on_error=job_error_handler(log_wpp, "❌ Erro fatal", "Ocorreu um erro."),
+        )
 
     except Exception as e:
         log_wpp(f"\n❌ Erro fatal: {e}")
@@ -2316,7 +2024,10 @@ frame_wpp_out.pack(fill="x", pady=6)
 tk.Entry(frame_wpp_out, textvariable=wpp_out_dir, bg=INPUT_BG, fg=INPUT_FG, insertbackground=INPUT_FG, width=55).pack(side=tk.LEFT, padx=5, pady=3)
 ttk.Button(frame_wpp_out, text="Selecionar pasta", style="Warn.TButton", command=selecionar_out_dir_wpp).pack(side=tk.LEFT, padx=5)
 
-ttk.Button(frame_wpp_left, text="Executar limpeza WhatsApp", style="Accent.TButton", command=executar_limpeza_wpp).pack(pady=(10, 5), anchor="w")
+frame_wpp_run = tk.Frame(frame_wpp_left, bg=BG_PRINCIPAL)
+frame_wpp_run.pack(pady=(10, 5), anchor="w")
+ttk.Button(frame_wpp_run, text="Executar limpeza WhatsApp", style="Accent.TButton", command=executar_limpeza_wpp).pack(side=tk.LEFT)
+ttk.Button(frame_wpp_run, text="Cancelar", style="Warn.TButton", command=lambda: jobs.cancel(JOB_WPP)).pack(side=tk.LEFT, padx=(8, 0))
 ttk.Button(frame_wpp_left, text="Abrir pasta de saída", style="Primary.TButton", command=abrir_pasta_wpp).pack(pady=(0, 5), anchor="w")
 
 progress_wpp = ttk.Progressbar(frame_wpp_right, length=400, mode="determinate", style="Custom.Horizontal.TProgressbar")
@@ -2407,7 +2118,10 @@ combo_robo_modo = ttk.Combobox(frame_robo_modo, textvariable=robo_modo_var, stat
 combo_robo_modo.pack(side=tk.LEFT, padx=5)
 combo_robo_modo.current(1)
 
-ttk.Button(frame_robo_left, text="Executar Robô C6", style="Accent.TButton", command=executar_robo_c6).pack(pady=(10, 5), anchor="w")
+frame_robo_run = tk.Frame(frame_robo_left, bg=BG_PRINCIPAL)
+frame_robo_run.pack(pady=(10, 5), anchor="w")
+ttk.Button(frame_robo_run, text="Executar Robô C6", style="Accent.TButton", command=executar_robo_c6).pack(side=tk.LEFT)
+ttk.Button(frame_robo_run, text="Cancelar", style="Warn.TButton", command=lambda: jobs.cancel(JOB_ROBO)).pack(side=tk.LEFT, padx=(8, 0))
 
 progress_robo = ttk.Progressbar(frame_robo_right, length=400, mode="determinate", style="Custom.Horizontal.TProgressbar")
 progress_robo.pack(pady=(0, 8), padx=4, fill="x")
@@ -2472,7 +2186,10 @@ lbl_manip_saida.pack(anchor="w", pady=(0, 5))
 
 ttk.Button(frame_manip_out, text="Selecionar pasta", style="Warn.TButton", command=selecionar_out_dir_manip).pack(anchor="w", pady=3)
 
-ttk.Button(frame_manip_left, text="Executar", style="Accent.TButton", command=executar_manipulacao).pack(pady=(10, 0), anchor="w")
+frame_manip_run = tk.Frame(frame_manip_left, bg=BG_PRINCIPAL)
+frame_manip_run.pack(pady=(10, 0), anchor="w")
+ttk.Button(frame_manip_run, text="Executar", style="Accent.TButton", command=executar_manipulacao).pack(side=tk.LEFT)
+ttk.Button(frame_manip_run, text="Cancelar", style="Warn.TButton", command=lambda: jobs.cancel(JOB_MANIP)).pack(side=tk.LEFT, padx=(8, 0))
 
 frame_log_manip = ttk.Labelframe(frame_manip_right, text="Log", style="Frame.TLabelframe", padding=10)
 frame_log_manip.pack(fill="both", expand=True)
@@ -2495,7 +2212,6 @@ view_tabela_var = tk.StringVar(value="empresas")
 def log_bd(msg: str):
     txt_log_bd.insert(tk.END, msg + "\n")
     txt_log_bd.see(tk.END)
-    janela.update_idletasks()
 
 frame_bd_main = tk.Frame(frame_bd, bg=BG_PRINCIPAL)
 frame_bd_main.pack(fill="both", expand=True, padx=8, pady=8)
@@ -2557,20 +2273,24 @@ def importar_arquivo_para_tabela():
         messagebox.showwarning("Aviso", "Selecione um arquivo bruto para importar.")
         return
 
-    try:
-        log_bd(f"📂 Lendo arquivo bruto: {path}")
-        df_raw = read_table(path)
-        log_bd(f"✅ Arquivo lido com {len(df_raw)} linhas e {len(df_raw.columns)} colunas.")
-    except Exception as e:
-        messagebox.showerror("Erro", f"Erro ao ler arquivo.\n\n{e}")
-        log_bd(f"❌ Erro ao ler arquivo: {e}")
-        return
+    engine = db_engine
 
-    normals = {normalize_col_name(c): c for c in df_raw.columns}
+    def _importar(log, progress, cancel):
+        # leitura, preparo e INSERT rodam na thread do job; o log volta pela fila
+        log(f"📂 Lendo cabeçalho do arquivo bruto: {path}")
+        cols = list(read_table_header(path).columns)
+        log(f"✅ Cabeçalho lido: {len(cols)} colunas.")
+        normals = {normalize_col_name(c): c for c in cols}
+
+        def _ler_colunas(usecols):
+            # lê do arquivo só as colunas que o mapeamento escolheu
+            df = read_table_columns(path, [c for c in usecols if c])
+            log(f"✅ Arquivo lido com {len(df)} linhas ({len(df.columns)} colunas usadas).")
+            check_cancel(cancel)
+            return df
 
-    try:
         if tabela == "empresas":
-            log_bd("🧩 Preparando dados para tabela EMPRESAS...")
+            log("🧩 Preparando dados para tabela EMPRESAS...")
 
             cnpj_col = pick_col(normals, ["cnpj"])
             razao_col = pick_col(normals, ["razao social", "razao_social", "razao"])
@@ -2586,9 +2306,11 @@ def importar_arquivo_para_tabela():
             ultimo_uso_col = pick_col(normals, ["ultimo uso", "ultimo_uso", "ultimo contato"])
             plataforma_col = pick_col(normals, ["plataforma usada", "plataforma", "origem"])
 
+            df_raw = _ler_colunas([cnpj_col, razao_col, situacao_col, uf_col, data_abertura_col, telefones_col,
+                                   tel1_col, tel2_col, email_col, capital_col, socios_col, ultimo_uso_col, plataforma_col])
             df_emp = pd.DataFrame()
 
-            df_emp["cnpj"] = df_raw[cnpj_col].apply(normalize_cnpj) if cnpj_col else None
+            df_emp["cnpj"] = normalize_cnpj_series(df_raw[cnpj_col]) if cnpj_col else None
             df_emp["razao_social"] = df_raw[razao_col].astype(str) if razao_col else None
             df_emp["situacao_cadastral"] = df_raw[situacao_col].astype(str) if situacao_col else None
             df_emp["uf"] = df_raw[uf_col].astype(str).str[:2].str.upper() if uf_col else None
@@ -2602,13 +2324,13 @@ def importar_arquivo_para_tabela():
             tel1 = None
             tel2 = None
             if telefones_col:
-                t1, t2 = zip(*df_raw[telefones_col].map(split_telefones_field))
-                tel1 = pd.Series(t1).apply(normalize_phone)
-                tel2 = pd.Series(t2).apply(normalize_phone)
+                tel_wide = split_telefones_wide(df_raw[telefones_col], n=2)
+                tel1 = normalize_phone_series(tel_wide["Telefone1"])
+                tel2 = normalize_phone_series(tel_wide["Telefone2"])
             if tel1_col and tel1 is None:
-                tel1 = df_raw[tel1_col].apply(normalize_phone)
+                tel1 = normalize_phone_series(df_raw[tel1_col])
             if tel2_col and tel2 is None:
-                tel2 = df_raw[tel2_col].apply(normalize_phone)
+                tel2 = normalize_phone_series(df_raw[tel2_col])
 
             df_emp["telefone1"] = tel1 if tel1 is not None else None
             df_emp["telefone2"] = tel2 if tel2 is not None else None
@@ -2632,37 +2354,42 @@ def importar_arquivo_para_tabela():
 
             before = len(df_emp)
             df_emp = df_emp[df_emp["cnpj"].notna() & (df_emp["cnpj"] != "")]
-            log_bd(f"➡️ Removidas {before - len(df_emp)} linhas sem CNPJ.")
-            log_bd(f"📥 Preparado {len(df_emp)} registros para INSERT em 'empresas'.")
+            log(f"➡️ Removidas {before - len(df_emp)} linhas sem CNPJ.")
+
+            before = len(df_emp)
+            df_emp = df_emp[cnpj_valid_mask(df_emp["cnpj"])]
+            log(f"➡️ Removidas {before - len(df_emp)} linhas com CNPJ inválido (dígitos verificadores).")
+            log(f"📥 Preparado {len(df_emp)} registros para INSERT em 'empresas'.")
 
-            df_emp.to_sql("empresas", db_engine, if_exists="append", index=False, chunksize=5000, method="multi")
-            log_bd("✅ Importação para 'empresas' concluída.")
+            df_emp.to_sql("empresas", engine, if_exists="append", index=False, chunksize=5000, method="multi")
+            log("✅ Importação para 'empresas' concluída.")
 
         elif tabela in ["block_list_c6", "block_list_b2b", "nao_perturbe"]:
-            log_bd(f"🧩 Preparando dados para tabela {tabela.upper()}...")
+            log(f"🧩 Preparando dados para tabela {tabela.upper()}...")
 
             tel_col = None
-            for c in df_raw.columns:
+            for c in cols:
                 if "tel" in normalize_col_name(c):
                     tel_col = c
                     break
             if not tel_col:
                 raise ValueError("Não foi encontrada nenhuma coluna de telefone no arquivo.")
 
+            df_raw = _ler_colunas([tel_col])
             df_tel = pd.DataFrame()
-            df_tel["telefone"] = df_raw[tel_col].apply(normalize_phone)
+            df_tel["telefone"] = normalize_phone_series(df_raw[tel_col])
             before = len(df_tel)
             df_tel = df_tel[df_tel["telefone"] != ""].drop_duplicates()
-            log_bd(f"➡️ {before - len(df_tel)} linhas removidas (vazias/duplicadas).")
+            log(f"➡️ {before - len(df_tel)} linhas removidas (vazias/duplicadas).")
 
-            df_tel.to_sql(tabela, db_engine, if_exists="append", index=False, chunksize=10000, method="multi")
-            log_bd(f"✅ Importação para '{tabela}' concluída ({len(df_tel)} registros).")
+            df_tel.to_sql(tabela, engine, if_exists="append", index=False, chunksize=10000, method="multi")
+            log(f"✅ Importação para '{tabela}' concluída ({len(df_tel)} registros).")
 
         elif tabela == "cnais_aceitos":
-            log_bd("🧩 Preparando dados para tabela CNAIS_ACEITOS...")
+            log("🧩 Preparando dados para tabela CNAIS_ACEITOS...")
 
             cnai_col = None
-            for c in df_raw.columns:
+            for c in cols:
                 norm = normalize_col_name(c)
                 if any(k in norm for k in ["cnae", "cnai", "codigo"]):
                     cnai_col = c
@@ -2670,17 +2397,18 @@ def importar_arquivo_para_tabela():
             if not cnai_col:
                 raise ValueError("Não foi encontrada nenhuma coluna de CNAI/CNAE no arquivo.")
 
+            df_raw = _ler_colunas([cnai_col])
             df_cnai = pd.DataFrame()
             df_cnai["cnai"] = df_raw[cnai_col].astype(str).str.strip()
             before = len(df_cnai)
             df_cnai = df_cnai[df_cnai["cnai"] != ""].drop_duplicates()
-            log_bd(f"➡️ {before - len(df_cnai)} linhas removidas (vazias/duplicadas).")
+            log(f"➡️ {before - len(df_cnai)} linhas removidas (vazias/duplicadas).")
 
-            df_cnai.to_sql("cnais_aceitos", db_engine, if_exists="append", index=False, chunksize=10000, method="multi")
-            log_bd(f"✅ Importação para 'cnais_aceitos' concluída ({len(df_cnai)} registros).")
+            df_cnai.to_sql("cnais_aceitos", engine, if_exists="append", index=False, chunksize=10000, method="multi")
+            log(f"✅ Importação para 'cnais_aceitos' concluída ({len(df_cnai)} registros).")
 
         elif tabela == "lemit_relatorio":
-            log_bd("🧩 Preparando dados para tabela LEMIT_RELATORIO...")
+            log("🧩 Preparando dados para tabela LEMIT_RELATORIO...")
 
             contato_col = pick_col(normals, ["contato", "nome contato", "responsavel"])
             telefone_col = pick_col(normals, ["telefone", "tel", "telefone contato"])
@@ -2690,11 +2418,20 @@ def importar_arquivo_para_tabela():
             data_abertura_col = pick_col(normals, ["data abertura", "dt abertura", "abertura"])
             uf_col = pick_col(normals, ["uf", "estado"])
 
+            df_raw = _ler_colunas([contato_col, telefone_col, desc_col, cnpj_col, email_col, data_abertura_col, uf_col])
             df_lr = pd.DataFrame()
             df_lr["contato"] = df_raw[contato_col].astype(str) if contato_col else None
-            df_lr["telefone"] = df_raw[telefone_col].apply(normalize_phone) if telefone_col else None
+            df_lr["telefone"] = normalize_phone_series(df_raw[telefone_col]) if telefone_col else None
             df_lr["descricao_interacao"] = df_raw[desc_col].astype(str) if desc_col else None
-            df_lr["cnpj"] = df_raw[cnpj_col].apply(normalize_cnpj) if cnpj_col else None
+            if cnpj_col:
+                cnpj_lr = normalize_cnpj_series(df_raw[cnpj_col])
+                cnpj_bad = cnpj_lr.notna() & ~cnpj_valid_mask(cnpj_lr)
+                # CNPJ inválido não vai pro banco; a linha segue se tiver telefone
+                df_lr["cnpj"] = cnpj_lr.where(~cnpj_bad, None)
+                if cnpj_bad.any():
+                    log(f"➡️ {int(cnpj_bad.sum())} CNPJs inválidos (dígitos verificadores) descartados.")
+            else:
+                df_lr["cnpj"] = None
             df_lr["email"] = df_raw[email_col].astype(str) if email_col else None
 
             if data_abertura_col:
@@ -2707,19 +2444,23 @@ def importar_arquivo_para_tabela():
 
             before = len(df_lr)
             df_lr = df_lr[df_lr["cnpj"].notna() | df_lr["telefone"].notna()]
-            log_bd(f"➡️ {before - len(df_lr)} linhas removidas (sem CNPJ e sem telefone).")
+            log(f"➡️ {before - len(df_lr)} linhas removidas (sem CNPJ e sem telefone).")
 
-            df_lr.to_sql("lemit_relatorio", db_engine, if_exists="append", index=False, chunksize=5000, method="multi")
-            log_bd(f"✅ Importação para 'lemit_relatorio' concluída ({len(df_lr)} registros).")
+            df_lr.to_sql("lemit_relatorio", engine, if_exists="append", index=False, chunksize=5000, method="multi")
+            log(f"✅ Importação para 'lemit_relatorio' concluída ({len(df_lr)} registros).")
 
         else:
             raise ValueError(f"Tabela '{tabela}' não tratada na importação.")
 
-        messagebox.showinfo("Concluído", f"Importação para '{tabela}' finalizada com sucesso.")
-
-    except Exception as e:
-        log_bd(f"❌ Erro durante importação: {e}")
-        messagebox.showerror("Erro", f"Erro durante importação.\n\n{e}")
+    jobs.submit(
+        JOB_IMPORTACAO,
+        _importar,
+        out_dir=os.path.dirname(os.path.abspath(path)),
+        log=log_bd,
+        progress=lambda pct: None,
+        on_done=lambda _res: messagebox.showinfo("Concluído", f"Importação para '{tabela}' finalizada com sucesso."),
+        on_error=job_error_handler(log_bd, "❌ Erro durante importação", "Erro durante importação."),
+    )
 
 ttk.Button(frame_bd_left, text="Importar arquivo para tabela", style="Accent.TButton", command=importar_arquivo_para_tabela).pack(pady=(10, 5))
 
@@ -0,0 +1,53 @@
+"""Pré-filtro Bloom de um store de blocklist com deltas de inclusão acumulados."""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from b2bsafe_engine import BlocklistStore, bloom_for_index, phone_keys, run_limpeza
+
+def _csv(tmp_path, name, numbers):
+    path = tmp_path / f"{name}.csv"
+    pd.DataFrame({"telefone": numbers.astype(str)}).to_csv(path, index=False)
+    return str(path)
+
+def test_store_bloom_keeps_fp_rate_with_add_deltas(tmp_path):
+    rng = np.random.default_rng(0)
+    numbers = rng.choice(np.arange(11_900_000_000, 11_999_999_999), 30_000, replace=False)
+    store = BlocklistStore.create(str(tmp_path / "store"))
+    store.set_base(_csv(tmp_path, "base", numbers[:2_000]))
+    for i in range(7):
+        store.add(_csv(tmp_path, f"delta{i}", numbers[2_000 + i * 4_000: 6_000 + i * 4_000]))
+    idx, _ = store.load()
+
+    bloom = bloom_for_index(idx, 0.01)
+    assert bloom.contains_keys(phone_keys(pd.Series(numbers.astype(str)))).all()
+    # DDD 21 nunca entrou na lista: tudo que passar é falso positivo
+    negatives = phone_keys(pd.Series(rng.integers(21_900_000_000, 21_999_999_999, 50_000).astype(str)))
+    assert bloom.contains_keys(negatives).mean() < 0.02
+
+    # mesmo resultado lido do cache; só o Bloom do conjunto atual fica no disco
+    again = bloom_for_index(idx, 0.01)
+    assert np.array_equal(again.bits, bloom.bits)
+    blooms = [f for f in os.listdir(tmp_path / "store") if f.endswith(".bloom")]
+    assert len(blooms) == 1
+
+    store.compact()
+    assert not [f for f in os.listdir(tmp_path / "store") if f.endswith(".bloom")]
+
+def test_run_limpeza_records_store_version_in_metrics(tmp_path):
+    store = BlocklistStore.create(str(tmp_path / "store"))
+    store.set_base(_csv(tmp_path, "base", np.array([11987654321])))
+    m = store.add(_csv(tmp_path, "delta", np.array([21987654321])))
+    base = tmp_path / "entrada.csv"
+    pd.DataFrame({"Razao": ["A", "B"], "Tel": ["11987654321", "31987654321"], "Email": "a@x.com", "CNPJ": ""}
+                 ).to_csv(base, sep=";", index=False)
+
+    res = run_limpeza(str(base), col_razao="Razao", col_tel="Tel", col_email="Email", col_cnpj="CNPJ",
+                      out_dir=str(tmp_path), filter_paths=[("Blocklist", store.directory)], bloom=True,
+                      em_disco=False, processos=1, graficos=False, log=lambda msg: None)
+    with open(res["out_metricas"], encoding="utf-8") as fh:
+        parametros = json.load(fh)["parametros"]
+    assert parametros["filtros_versao"] == {"Blocklist": {"version": m["version"], "watermark": m["watermark"]}}
@@ -0,0 +1,93 @@
+"""Duplicidade: versão serial, em shards (processos) e em disco dão o mesmo resultado."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from b2bsafe_engine import SpillDedup, dedup_and_filter_sharded, duplicate_rows, phone_keys, run_limpeza
+
+def _pares(seed=0, n_rows=3_000):
+    # 2 telefones por linha, poucos números distintos (muita repetição, inclusive na mesma linha)
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(n_rows, dtype=np.int64), 2)
+    keys = phone_keys(pd.Series(rng.integers(11_900_000_000, 11_900_001_500, len(rows)).astype(str)))
+    return rows, keys, n_rows
+
+def test_duplicate_rows_keeps_first_row_and_ignores_same_row():
+    rows = np.array([0, 0, 1, 2, 2, 3], dtype=np.int64)
+    keys = np.array([5, 5, 7, 7, 9, 5], dtype=np.int64)
+    assert duplicate_rows(rows, keys, 4).tolist() == [False, False, True, True]
+
+def test_spill_dedup_matches_serial(tmp_path):
+    rows, keys, n_rows = _pares()
+    esperado = duplicate_rows(rows, keys, n_rows)
+
+    spill = SpillDedup(str(tmp_path))
+    got = np.zeros(n_rows, dtype=bool)
+    for ini in range(0, len(rows), 700):   # blocos de 350 linhas (2 pares por linha)
+        r, k = rows[ini:ini + 700], keys[ini:ini + 700]
+        got[r[spill.mark(r, k)]] = True
+    spill.close()
+    assert np.array_equal(got, esperado)
+    assert spill.phones == len(np.unique(keys))
+
+def test_sharded_matches_serial_and_loads_filters(tmp_path):
+    rows, keys, n_rows = _pares(seed=1)
+    lista = tmp_path / "blocklist.csv"
+    bloqueados = pd.Series(keys[:50]).map(lambda k: str(k)[1:])   # chave = 10**len + número
+    pd.DataFrame({"telefone": bloqueados}).to_csv(lista, index=False)
+
+    dup, block, _ = dedup_and_filter_sharded(rows, keys, n_rows, filter_sources=[("Blocklist", str(lista))], processos=2)
+    assert np.array_equal(dup, duplicate_rows(rows, keys, n_rows))
+    assert block[rows[:50]].all()
+
+    # com o Bloom nos workers o resultado é o mesmo; contagens = [acertos do Bloom, exatos]
+    dup_b, block_b, contagens = dedup_and_filter_sharded(rows, keys, n_rows, filter_sources=[("Blocklist", str(lista))],
+                                                         bloom_fp=0.01, processos=2)
+    assert np.array_equal(dup_b, dup) and np.array_equal(block_b, block)
+    assert contagens.shape == (1, 2)
+    assert contagens[0, 0] >= contagens[0, 1] == np.isin(keys, keys[:50]).sum()
+
+def test_sharded_fails_when_a_worker_cannot_open_a_filter(tmp_path):
+    rows, keys, n_rows = _pares(seed=2, n_rows=200)
+    with pytest.raises(RuntimeError, match="Blocklist"):
+        dedup_and_filter_sharded(rows, keys, n_rows, filter_sources=[("Blocklist", str(tmp_path / "sumiu.csv"))], processos=2)
+
+def test_run_limpeza_parallel_matches_serial_on_invalid_blocked_phone(tmp_path):
+    # 1111111111 é inválido (dígitos iguais), mas está na blocklist: a linha sai nos dois modos
+    base = tmp_path / "base.csv"
+    pd.DataFrame({
+        "Razao": ["A", "B", "C"],
+        "Tel": ["1111111111;11987654321", "21987654321", "31987654321"],
+        "Email": ["a@x.com", "b@x.com", "c@x.com"],
+        "CNPJ": "",
+    }).to_csv(base, sep=";", index=False)
+    lista = tmp_path / "blocklist.csv"
+    pd.DataFrame({"telefone": ["1111111111"]}).to_csv(lista, index=False)
+
+    res = {}
+    for processos in (1, 2):
+        out = tmp_path / f"p{processos}"
+        out.mkdir()
+        res[processos] = run_limpeza(str(base), col_razao="Razao", col_tel="Tel", col_email="Email", col_cnpj="CNPJ",
+                                     out_dir=str(out), filter_paths=[("Blocklist", str(lista))], processos=processos,
+                                     em_disco=False, graficos=False, log=lambda msg: None)
+    assert res[1]["removidas"] == res[2]["removidas"]
+    assert res[1]["ficaram"] == res[2]["ficaram"] == 2
+
+def test_run_limpeza_auto_disk_mode_uses_given_thresholds(tmp_path):
+    base = tmp_path / "base.csv"
+    pd.DataFrame({"Razao": ["A", "B"], "Tel": ["11987654321", "11987654321"], "Email": "a@x.com", "CNPJ": ""}
+                 ).to_csv(base, sep=";", index=False)
+    modos = {}
+    for min_bytes in (1, 1024 ** 3):
+        out = tmp_path / str(min_bytes)
+        out.mkdir()
+        res = run_limpeza(str(base), col_razao="Razao", col_tel="Tel", col_email="Email", col_cnpj="CNPJ",
+                          out_dir=str(out), processos=1, disco_min_bytes=min_bytes, graficos=False, log=lambda msg: None)
+        with open(res["out_metricas"], encoding="utf-8") as fh:
+            modos[min_bytes] = json.load(fh)["parametros"]["em_disco"]
+        assert res["ficaram"] == 1
+    assert modos == {1: True, 1024 ** 3: False}
@@ -0,0 +1,50 @@
+"""Pico de memória da limpeza em memória (um quadro de trabalho + máscaras, sem cópias por etapa)."""
+
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import b2bsafe_engine
+from b2bsafe_engine import run_limpeza
+
+pa = pytest.importorskip("pyarrow")
+
+# pico (objetos Python/NumPy pelo tracemalloc + buffers Arrow do texto) / tamanho
+# do CSV de entrada. Hoje fica em ~2.4x; cópias do quadro filtrado nas etapas de
+# saída (como antes do quadro único) passam de 2.8x.
+PICO_MAX_X_ENTRADA = 2.75
+
+def test_run_limpeza_em_memoria_sem_copias_do_quadro(tmp_path, monkeypatch):
+    monkeypatch.setattr(b2bsafe_engine, "CACHE_DIR", str(tmp_path / "cache"))
+    # poucas linhas com texto largo: o quadro domina a memória, não os temporários por telefone
+    n = 4_000
+    rng = np.random.default_rng(0)
+    tel = rng.integers(11_900_000_000, 11_900_000_000 + n, n).astype(str).astype(object)
+    tel[::7] = "123"
+    pad = "x" * 1_000
+    base = tmp_path / "base.csv"
+    pd.DataFrame({
+        "Razao": [f"Empresa {i} LTDA {pad}" for i in range(n)],
+        "Tel": tel,
+        "Email": [f"contato{i}.{pad}@b.com" for i in range(n)],
+        "CNPJ": "",
+    }).to_csv(base, sep=";", index=False)
+    entrada = base.stat().st_size
+
+    anterior = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(anterior)
+    pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        res = run_limpeza(str(base), col_razao="Razao", col_tel="Tel", col_email="Email", col_cnpj="CNPJ",
+                          out_dir=str(tmp_path), em_disco=False, processos=1, graficos=False, log=lambda msg: None)
+        pico_py = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(anterior)
+
+    assert res["linhas"] == n
+    pico = pico_py + pool.max_memory()
+    assert pico <= PICO_MAX_X_ENTRADA * entrada, f"pico {pico / 1e6:.1f} MB para {entrada / 1e6:.1f} MB de entrada"
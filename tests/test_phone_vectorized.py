@@ -0,0 +1,108 @@
+"""
+Paridade entre as versões em coluna (normalize_phone_series, invalid_phone_mask,
+split_telefones_wide) e as escalares (normalize_phone, is_invalid_phone,
+split_telefones_field), valor a valor.
+"""
+
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from b2bsafe_engine import (
+    decode_phone_column, encode_phone_column, invalid_phone_mask, is_invalid_phone, normalize_cnpj,
+    normalize_cnpj_series, normalize_phone, normalize_phone_series, split_telefones_field, split_telefones_wide,
+)
+
+FLAGS = list(itertools.product([False, True], repeat=3))
+
+VALUES = [
+    # formatos comuns
+    "11987654321", "(11) 98765-4321", "+55 11 98765-4321", "5511987654321", "551187654321",
+    "1187654321", "87654321", "011 98765 4321", "55", "5", "551", "1133334444", "55 1133334444",
+    # inválidos
+    "", " ", "-", "123", "1111111111", "00000000", "abc",
+    # vazios e tipos não texto
+    None, np.nan, pd.NA, 0, 11987654321, 5511987654321, 11987654321.0, 1187654321.5, True, False,
+    # dígitos Unicode (o re do Python trata como dígito; o RE2 do Arrow não)
+    "١١٩٨٧٦٥٤٣٢١",            # árabe-índico
+    "۱۱۹۸۷۶۵۴۳۲۱",            # árabe-índico estendido
+    "１１９８７６５４３２１",  # largura total
+    "११९८७६५४३२१",            # devanágari
+    "(１１) ９８７６５-４３２１", "55١١٩٨٧٦٥٤٣٢١", "١٢٣",
+    # não são dígitos decimais (categoria No): descartados nos dois caminhos
+    "11²98765432¹", "①②③④⑤⑥⑦⑧",
+]
+
+SPLIT_VALUES = VALUES + [
+    "11987654321;21987654321", "11987654321, 21987654321 / 31987654321", "11987654321|21987654321",
+    "11987654321\xa021987654321", "11987654321 21987654321", "11987654321\t\n21987654321",
+    ";;11987654321;;", "١١٩٨٧٦٥٤٣٢١;２１９８７６５４３２１", "x;y;z",
+]
+
+def _series(values):
+    return pd.Series(values, dtype=object)
+
+def _fuzz(n=2000, seed=7):
+    rng = random.Random(seed)
+    alphabet = "0123456789" * 4 + "55" * 3 + " ()-+./;,|\xa0" + "١٢٣۴５６७８" + "a²"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(n)]
+
+@pytest.mark.parametrize("strip55,add9,add55", FLAGS)
+def test_normalize_phone_series_matches_scalar(strip55, add9, add55):
+    values = VALUES + _fuzz()
+    got = normalize_phone_series(_series(values), strip55=strip55, add9=add9, add55=add55).tolist()
+    expected = [normalize_phone(v, strip55=strip55, add9=add9, add55=add55) for v in values]
+    assert got == expected
+
+def test_invalid_phone_mask_matches_scalar():
+    values = VALUES + _fuzz()
+    got = invalid_phone_mask(_series(values)).tolist()
+    assert got == [is_invalid_phone(v) for v in values]
+
+@pytest.mark.parametrize("strip55,add9,add55", FLAGS)
+def test_invalid_phone_mask_on_keys_matches_text(strip55, add9, add55):
+    norm = normalize_phone_series(_series(VALUES + _fuzz()), strip55=strip55, add9=add9, add55=add55)
+    keys = encode_phone_column(norm)
+    assert invalid_phone_mask(keys).tolist() == invalid_phone_mask(norm).tolist()
+    assert decode_phone_column(keys).tolist() == norm.tolist()
+
+def test_split_telefones_wide_matches_field():
+    values = SPLIT_VALUES + [";".join(p) for p in zip(_fuzz(500, 1), _fuzz(500, 2))]
+    wide = split_telefones_wide(_series(values), n=2)
+    got = list(zip(wide["Telefone1"].tolist(), wide["Telefone2"].tolist()))
+    assert got == [tuple(split_telefones_field(v)) for v in values]
+
+def test_split_telefones_wide_keeps_index():
+    s = pd.Series(["11987654321;21987654321", None, "31987654321"], index=[10, 20, 30])
+    wide = split_telefones_wide(s, n=3)
+    assert wide.index.tolist() == [10, 20, 30]
+    assert wide.loc[10].tolist() == ["11987654321", "21987654321", None]
+    assert wide.loc[20].tolist() == [None, None, None]
+
+def test_normalize_cnpj_series_matches_scalar():
+    values = ["11.222.333/0001-81", "", None, np.nan, 0, 11222333000181, "١١٢٢٢٣٣٣٠٠٠١٨١", "123"] + _fuzz(300)
+    assert normalize_cnpj_series(_series(values)).tolist() == [normalize_cnpj(v) for v in values]
+
+# regras fixadas (as duas versões seguem a mesma; ver _scalar_text / _digits no motor)
+
+def test_unicode_digits_become_ascii():
+    for raw in ("١١٩٨٧٦٥٤٣٢١", "１１９８７６５４３２１", "११९८७६५४३२१"):
+        assert normalize_phone(raw) == "11987654321"
+        assert normalize_phone_series(_series([raw])).tolist() == ["11987654321"]
+        assert not is_invalid_phone(raw)
+
+def test_missing_values_are_empty_and_zero_is_kept():
+    for v in (None, np.nan, pd.NA):
+        assert normalize_phone(v) == ""
+        assert is_invalid_phone(v)
+        assert split_telefones_field(v) == (None, None)
+    assert normalize_phone(0) == "0"
+    assert normalize_phone_series(_series([0])).tolist() == ["0"]
+
+def test_float_input_keeps_decimal_digits():
+    # float vira texto com ".0" (str(11987654321.0)); igual nos dois caminhos
+    assert normalize_phone(11987654321.0) == "119876543210"
+    assert normalize_phone_series(_series([11987654321.0])).tolist() == ["119876543210"]